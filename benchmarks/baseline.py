@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Saving the results of a benchmark and comparing them with a baseline, shared by the benchmark scripts.
+
+The results are lists of dicts, saved as JSON with `--save FILE`. With `--baseline FILE` the results are compared
+with those saved in FILE and the script exits with status 1 if any measure regressed by more than `--tolerance`.
+
+"""
+import sys
+import json
+
+
+def add_arguments(parser):
+    """Add the `--save`, `--baseline` and `--tolerance` options to the argument parser of a benchmark."""
+    parser.add_argument('--save', metavar='FILE', help='Save the results as JSON to FILE.')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare the results with those saved in FILE.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Maximum slowdown with respect to the baseline, as a fraction.')
+
+
+def _describe(result, key):
+    return ' '.join([str(result[key[0]])] + ['{}={}'.format(field, result[field]) for field in key[1:]])
+
+
+def compare(results, baseline, key, measures, tolerance, higher_is_better=()):
+    """Return a description of the measures of `results` that regressed with respect to `baseline`.
+
+    The results are matched by the values of the fields in `key`. A measure regressed if it grew by more than
+    `tolerance` (as a fraction), or if it dropped by more than that for the measures in `higher_is_better`, like
+    throughputs.
+
+    """
+    previous = {tuple(result[field] for field in key): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(tuple(result[field] for field in key))
+        if old is None:
+            continue
+        for measure in measures:
+            if measure in higher_is_better:
+                regressed = result[measure] < old[measure] * (1 - tolerance)
+            else:
+                regressed = result[measure] > old[measure] * (1 + tolerance)
+            if regressed:
+                regressions.append('{} {}: {:.6g} -> {:.6g} ({:+.1%})'.format(
+                    _describe(result, key), measure, old[measure], result[measure], result[measure] / old[measure] - 1
+                ))
+    return regressions
+
+
+def save_and_compare(args, results, key, measures, higher_is_better=()):
+    """Handle the options added by `add_arguments`, exiting with status 1 if the results regressed."""
+    if args.save:
+        with open(args.save, 'w') as save_file:
+            json.dump(results, save_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), key, measures, args.tolerance, higher_is_better)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
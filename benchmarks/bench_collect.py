@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Measure the throughput of `heimdallr collect` receiving the samples of many agents on localhost.
+
+A collector is started in a subprocess, listening on a local TCP port or Unix domain socket, and `--agents`
+simulated agents (`heimdallr.agent.AgentSink`, all in this process) each send `--samples` samples of a resource
+with `--rows` rows of `--columns` columns, like a `disk_usage` resource on a host with many filesystems. The
+benchmark reports the time until every row was acknowledged by the collector, the rows per second, the MiB per
+second sent over the socket (compressed) and the compression ratio, and checks that every row was written to the
+per-host logs. The agents share a single process, so the time includes encoding and compressing the frames of
+all of them.
+
+Like `bench_parsers.py`, results can be saved with `--save` and compared with `--baseline`.
+
+    $ python benchmarks/bench_collect.py --agents 100 --samples 100 --rows 20
+
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+
+import curio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+import baseline  # noqa: E402
+from heimdallr.agent import AgentSink  # noqa: E402
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_sample(rows, columns, index):
+    """Return the rows of a sample, with a `datetime`, a label column and `columns - 2` numeric columns."""
+    return [
+        dict(
+            {'datetime': '2024-01-01T00:{:02}:{:02}UTC'.format(index // 60 % 60, index % 60),
+             'mount': '/mnt/{}'.format(row)},
+            **{'value_{}'.format(column): (index * 7 + row * 13 + column) % 1000 for column in range(columns - 2)}
+        )
+        for row in range(rows)
+    ]
+
+
+def start_collector(address, directory):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get('PYTHONPATH')])))
+    collector = subprocess.Popen(
+        [sys.executable, '-m', 'heimdallr.main', 'collect', address, '-d', directory, '-q'], env=env
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            if address.startswith('unix:'):
+                with socket.socket(socket.AF_UNIX) as sock:
+                    sock.connect(address[len('unix:'):])
+            else:
+                socket.create_connection(address.rsplit(':', 1)).close()
+            return collector
+        except OSError:
+            time.sleep(0.05)
+    collector.kill()
+    raise RuntimeError('The collector did not start')
+
+
+async def _send(address, agents, samples, rows, columns):
+    sinks = []
+    for agent in range(agents):
+        sink = AgentSink(address, host='agent-{}'.format(agent), flush_interval=0.01, spool_rows=samples * rows)
+        observer = sink.observer('disk_usage')
+        sample_columns = list(make_sample(1, columns, 0)[0])
+        for index in range(samples):
+            observer.add_sample(sample_columns, make_sample(rows, columns, index))
+        sinks.append(sink)
+    start = time.perf_counter()
+    for sink in sinks:
+        await sink.start()
+    async with curio.TaskGroup() as group:
+        for sink in sinks:
+            await group.spawn(sink.aclose, 600)
+    elapsed = time.perf_counter() - start
+    return elapsed, sinks
+
+
+def run_benchmark(address, agents, samples, rows, columns):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if address == 'unix':
+            address = 'unix:' + os.path.join(tmp_dir, 'collect.sock')
+        elif address == 'tcp':
+            address = '127.0.0.1:{}'.format(_free_port())
+        logs_dir = os.path.join(tmp_dir, 'logs')
+        collector = start_collector(address, logs_dir)
+        try:
+            elapsed, sinks = curio.run(_send, address, agents, samples, rows, columns)
+        finally:
+            collector.terminate()
+            collector.wait()
+        sent_rows = sum(sink.sent_rows for sink in sinks)
+        if sent_rows != agents * samples * rows:
+            raise AssertionError('Sent {} rows instead of {}'.format(sent_rows, agents * samples * rows))
+        written_rows = 0
+        for host in os.listdir(logs_dir):
+            with open(os.path.join(logs_dir, host, 'disk_usage.csv')) as log_file:
+                written_rows += sum(1 for _ in log_file) - 1
+        if written_rows != sent_rows:
+            raise AssertionError('The collector wrote {} rows instead of {}'.format(written_rows, sent_rows))
+    sent_bytes = sum(sink.sent_bytes for sink in sinks)
+    sample_columns = list(make_sample(1, columns, 0)[0])
+    sample = ['disk_usage', sample_columns, [list(row.values()) for row in make_sample(rows, columns, 0)]]
+    uncompressed = len(json.dumps(sample, separators=(',', ':'))) * samples * agents
+    return {
+        'transport': address.split(':')[0] if address.startswith('unix:') else 'tcp',
+        'agents': agents,
+        'rows': sent_rows,
+        'time': elapsed,
+        'rows_per_second': sent_rows / elapsed,
+        'mib_per_second': sent_bytes / elapsed / 2 ** 20,
+        'compression': uncompressed / sent_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transports', nargs='+', choices=['tcp', 'unix'], default=['tcp', 'unix'],
+                        help='Sockets used between the agents and the collector.')
+    parser.add_argument('--agents', type=int, default=100, help='Number of simulated agents.')
+    parser.add_argument('--samples', type=int, default=100, help='Number of samples sent by each agent.')
+    parser.add_argument('--rows', type=int, default=20, help='Number of rows of each sample.')
+    parser.add_argument('--columns', type=int, default=10, help='Number of columns of each row.')
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    results = []
+    print('{:<10}{:>8}{:>10}{:>10}{:>12}{:>10}{:>13}'.format(
+        'transport', 'agents', 'rows', 'time s', 'rows/s', 'MiB/s', 'compression'
+    ))
+    for transport in args.transports:
+        result = run_benchmark(transport, args.agents, args.samples, args.rows, args.columns)
+        results.append(result)
+        print('{:<10}{:>8}{:>10}{:>10.2f}{:>12.0f}{:>10.2f}{:>12.1f}x'.format(
+            result['transport'], result['agents'], result['rows'], result['time'], result['rows_per_second'],
+            result['mib_per_second'], result['compression']
+        ))
+
+    baseline.save_and_compare(
+        args, results, ('transport', 'agents'), ('rows_per_second',), higher_is_better=('rows_per_second',)
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compare the executors that parse the outputs of the commands: inline, in a worker thread or in a worker process.
+
+The recorded `top` output is scaled up to the requested numbers of processes, as in `bench_parsers.py`, and parsed
+repeatedly with each executor (the `parse_executor` option, with `parse_threshold` set to 0 so that every output is
+offloaded). While parsing, a ticker coroutine wakes up every millisecond and records how late it is, i.e. for how long
+the event loop was blocked. For each executor and size the benchmark reports:
+
+ - the median time of parsing a sample.
+ - the maximum and the 99th percentile of the stalls of the event loop.
+
+Parsing inline is the fastest, but it blocks the event loop for the whole parse. Worker threads still hold the GIL
+while parsing, so they mostly split the stall into shorter ones, while worker processes keep the event loop free at
+the cost of pickling the output and the rows.
+
+Like `bench_parsers.py`, results can be saved with `--save` and compared with `--baseline`.
+
+    $ python benchmarks/bench_parse_executor.py --sizes 1000 10000 50000
+
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import curio
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+import baseline  # noqa: E402
+from bench_parsers import scale_top, parse  # noqa: E402
+from heimdallr.parsing import PARSE_EXECUTORS  # noqa: E402
+from heimdallr.plugins import top  # noqa: E402
+
+DEFAULT_SIZES = (1000, 10000, 50000)
+TICK = 0.001
+
+
+async def _ticker(stalls):
+    """Sleep `TICK` seconds at a time, appending to `stalls` how much later than that each sleep ended."""
+    while True:
+        start = time.perf_counter()
+        await curio.sleep(TICK)
+        stalls.append(time.perf_counter() - start - TICK)
+
+
+async def _time_executor(resource, outputs, config, samples):
+    # the first sample starts the worker, which is not part of the steady state.
+    await parse(resource, outputs, config)
+    stalls = []
+    ticker = await curio.spawn(_ticker, stalls)
+    times = []
+    try:
+        for _ in range(samples):
+            start = time.perf_counter()
+            await parse(resource, outputs, config)
+            times.append(time.perf_counter() - start)
+            # let the ticker wake up and record the stall, which it cannot do while an inline parse blocks it.
+            await curio.sleep(2 * TICK)
+    finally:
+        await ticker.cancel()
+    return times, sorted(stalls)
+
+
+def run_benchmark(executor, size, samples):
+    outputs = [scale_top(size)]
+    config = {'parse_executor': executor, 'parse_threshold': 0}
+    resource = top.create_resource(os.devnull)
+    times, stalls = curio.run(_time_executor, resource, outputs, config, samples)
+    return {
+        'executor': executor,
+        'size': size,
+        'parse_time': statistics.median(times),
+        'max_stall': stalls[-1] if stalls else 0,
+        'p99_stall': stalls[int(len(stalls) * 0.99)] if stalls else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--executors', nargs='+', choices=PARSE_EXECUTORS, default=list(PARSE_EXECUTORS),
+                        help='Executors to benchmark.')
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES),
+                        help='Numbers of processes in the parsed outputs.')
+    parser.add_argument('--samples', type=int, default=20, help='Number of samples parsed for each measure.')
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    results = []
+    print('{:<10}{:>8}{:>12}{:>14}{:>14}'.format('executor', 'size', 'parse ms', 'max stall ms', 'p99 stall ms'))
+    for size in args.sizes:
+        for executor in args.executors:
+            result = run_benchmark(executor, size, args.samples)
+            results.append(result)
+            print('{:<10}{:>8}{:>12.2f}{:>14.2f}{:>14.2f}'.format(
+                executor, size, result['parse_time'] * 1000, result['max_stall'] * 1000, result['p99_stall'] * 1000
+            ))
+
+    baseline.save_and_compare(args, results, ('executor', 'size'), ('parse_time',))
+
+
+if __name__ == '__main__':
+    main()
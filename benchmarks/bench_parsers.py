@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Measure the cost of parsing the output of the commands run by the builtin resources.
+
+The outputs recorded in `benchmarks/outputs` are scaled up to the requested number of entries (processes for
+`top` and `nvidia-smi`, filesystems for `df` and cores for `sensors`) by repeating their rows. For each resource
+and size the benchmark reports:
+
+ - the parse throughput, i.e. samples per second and MiB of output per second going through `_generic_parse`,
+   `clean_output` and `clean_data`.
+ - the peak memory allocated while parsing a single sample, measured with `tracemalloc`.
+ - the end-to-end cost of a tick: `Resource.monitor` running a stub command that prints the recorded output,
+   parsing it and writing the rows to a CSV log.
+
+Everything runs offline, so the benchmark can be used to catch regressions: save the results of a run with
+`--save` and compare a later run against them with `--baseline`. The exit status is 1 if any measure is slower
+than the baseline by more than `--tolerance`.
+
+    $ python benchmarks/bench_parsers.py --save baseline.json
+    $ python benchmarks/bench_parsers.py --baseline baseline.json --tolerance 0.2
+
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import curio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+import baseline  # noqa: E402
+from heimdallr.plugins import top, nvidia_smi, disk_usage, cpu_temperatures  # noqa: E402
+from heimdallr.resource import MultiCommandResource  # noqa: E402
+
+OUTPUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outputs')
+DEFAULT_SIZES = (50, 1000, 10000)
+
+
+def _read_recorded(name):
+    with open(os.path.join(OUTPUTS_DIR, name + '.txt'), encoding='utf-8') as recorded_file:
+        return recorded_file.read()
+
+
+def _scale(header, rows, footer, size, renumber):
+    """Repeat `rows` until there are `size` of them, applying `renumber(row, index)` to each one."""
+    scaled = [renumber(rows[index % len(rows)], index) for index in range(size)]
+    return ''.join(header + scaled + footer)
+
+
+def scale_top(size):
+    lines = _read_recorded('top').splitlines(keepends=True)
+    return _scale(lines[:7], lines[7:], [], size, lambda row, index: re.sub(r'^\s*\d+', '{:>5}'.format(index + 1), row))
+
+
+def scale_nvidia_smi(size):
+    lines = _read_recorded('nvidia-smi').splitlines(keepends=True)
+    return _scale(lines[:15], lines[15:-1], lines[-1:], size,
+                  lambda row, index: re.sub(r'(?<=\s)\d+(?=\s+[A-Z]\s)', '{:>9}'.format(index + 1), row, count=1))
+
+
+def scale_df(name, size):
+    lines = _read_recorded(name).splitlines(keepends=True)
+    return _scale(lines[:1], lines[1:], [], size, lambda row, index: re.sub(r'^\S+', r'\g<0>-{}'.format(index), row))
+
+
+def scale_sensors(size):
+    lines = _read_recorded('sensors').splitlines(keepends=True)
+    core_lines = [line for line in lines if line.startswith('Core ')]
+    header = lines[:lines.index(core_lines[0])]
+    return _scale(header, core_lines, ['\n'], size,
+                  lambda row, index: re.sub(r'^Core \d+', 'Core {}'.format(index), row))
+
+
+def _count_procs(rows):
+    proc_info = rows[0]['proc_info']
+    return len(proc_info.split('|')) if proc_info else 0
+
+
+# name -> (plugin, function returning the outputs of the commands for a size, function counting the parsed entries)
+BENCHMARKS = {
+    'top': (top, lambda size: [scale_top(size)], _count_procs),
+    'nvidia-smi': (nvidia_smi, lambda size: [scale_nvidia_smi(size)], _count_procs),
+    'df': (disk_usage, lambda size: [scale_df('df-hT', size), scale_df('df-hiT', size)], len),
+    'sensors': (cpu_temperatures, lambda size: [scale_sensors(size)], len),
+}
+
+
+async def parse(resource, outputs, config):
+    """Parse the outputs of the commands of `resource` the same way `fetch_data` does."""
+    if isinstance(resource, MultiCommandResource):
+        results = []
+        for output, (regex, table_output) in zip(outputs, resource.make_regexes(config)):
+            info, _ = await resource._generic_parse(output, config, regex, table_output)
+            results.append(info)
+        return list(resource.combine_results(results, config))
+    return [row async for row in resource._generic_parse(outputs[0], config)]
+
+
+def _stub_commands(resource, paths):
+    """Replace the commands run by `resource` with commands printing the files in `paths`."""
+    cmdlines = [['cat', path] for path in paths]
+    if isinstance(resource, MultiCommandResource):
+        resource.make_cmdlines = lambda config: cmdlines
+    else:
+        resource.make_cmdline = lambda config: cmdlines[0]
+
+
+async def _time_parsing(resource, outputs, config, min_time):
+    samples = 0
+    start = time.perf_counter()
+    while True:
+        await parse(resource, outputs, config)
+        samples += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / samples
+
+
+async def _peak_allocation(resource, outputs, config):
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        await parse(resource, outputs, config)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+
+async def _time_ticks(resource, config, ticks):
+    await resource.monitor(config, header=True)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        await resource.monitor(config, header=False)
+    elapsed = time.perf_counter() - start
+    await resource.close()
+    return elapsed / ticks
+
+
+def run_benchmark(name, size, tmp_dir, min_time, ticks):
+    plugin, make_outputs, count_entries = BENCHMARKS[name]
+    outputs = make_outputs(size)
+    config = {}
+    resource = plugin.create_resource(os.path.join(tmp_dir, '{}-{}.csv'.format(name, size)))
+
+    rows = curio.run(parse, resource, outputs, config)
+    if count_entries(rows) != size:
+        raise AssertionError('Parsed {} entries from the {} output instead of {}'.format(
+            count_entries(rows), name, size
+        ))
+
+    parse_time = curio.run(_time_parsing, resource, outputs, config, min_time)
+    peak_allocation = curio.run(_peak_allocation, resource, outputs, config)
+
+    paths = []
+    for index, output in enumerate(outputs):
+        paths.append(os.path.join(tmp_dir, '{}-{}-{}.txt'.format(name, size, index)))
+        with open(paths[-1], 'w', encoding='utf-8') as output_file:
+            output_file.write(output)
+    _stub_commands(resource, paths)
+    tick_time = curio.run(_time_ticks, resource, config, ticks)
+
+    output_bytes = sum(len(output.encode('utf-8')) for output in outputs)
+    return {
+        'resource': name,
+        'size': size,
+        'output_bytes': output_bytes,
+        'parse_time': parse_time,
+        'samples_per_second': 1 / parse_time,
+        'mib_per_second': output_bytes / parse_time / 2 ** 20,
+        'peak_allocation': peak_allocation,
+        'tick_time': tick_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resources', nargs='+', choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS),
+                        help='Resources to benchmark.')
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES, help='Number of entries.')
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='Minimum number of seconds spent measuring the parse time of each case.')
+    parser.add_argument('--ticks', type=int, default=10, help='Number of ticks measured for each case.')
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    results = []
+    print('{:<12}{:>7}{:>12}{:>12}{:>10}{:>14}{:>12}'.format(
+        'resource', 'size', 'output KiB', 'samples/s', 'MiB/s', 'peak KiB', 'tick ms'
+    ))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.resources:
+            for size in args.sizes:
+                result = run_benchmark(name, size, tmp_dir, args.min_time, args.ticks)
+                results.append(result)
+                print('{:<12}{:>7}{:>12.1f}{:>12.1f}{:>10.2f}{:>14.1f}{:>12.2f}'.format(
+                    name, size, result['output_bytes'] / 1024, result['samples_per_second'],
+                    result['mib_per_second'], result['peak_allocation'] / 1024, result['tick_time'] * 1000
+                ))
+
+    baseline.save_and_compare(args, results, ('resource', 'size'), ('parse_time', 'peak_allocation', 'tick_time'))
+
+
+if __name__ == '__main__':
+    main()
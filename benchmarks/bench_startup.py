@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Measure how long heimdallr takes to start.
+
+Each case runs in a fresh interpreter, `--runs` times, and the benchmark reports the minimum and the median wall
+time in milliseconds:
+
+ - `python`: an empty interpreter, the floor of every other case.
+ - `import`: importing `heimdallr.main`.
+ - `registry`: importing `heimdallr.main`, creating the plugin registry and loading the plugin of one resource,
+   which is what `heimdallr monitor -r native_top top.csv` does before it starts sampling.
+ - `plugins`: `heimdallr plugins`, which also discovers the plugins of other packages.
+ - `pkg_resources`: enumerating the plugin entry points with `pkg_resources`, as heimdallr used to do on every
+   start, for comparison. Skipped if setuptools is not installed.
+
+Like `bench_parsers.py`, results can be saved with `--save` and compared with `--baseline`.
+
+    $ python benchmarks/bench_startup.py --runs 20
+
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+import baseline
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+
+CASES = {
+    'python': 'pass',
+    'import': 'import heimdallr.main',
+    'registry': 'import heimdallr.main; heimdallr.main.load_plugins().load("native_top")',
+    'plugins': 'import sys; sys.argv = ["heimdallr", "plugins"]; import heimdallr.main; heimdallr.main.main()',
+    'pkg_resources': 'import pkg_resources; list(pkg_resources.iter_entry_points("heimdallr.plugins"))',
+}
+
+
+def _available(case):
+    if case != 'pkg_resources':
+        return True
+    return subprocess.run([sys.executable, '-c', 'import pkg_resources'], stderr=subprocess.DEVNULL).returncode == 0
+
+
+def time_case(code, runs):
+    """Return the wall times, in seconds, of running `code` in `runs` fresh interpreters."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get('PYTHONPATH')])))
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES), help='Cases to measure.')
+    parser.add_argument('--runs', type=int, default=10, help='Number of runs of each case.')
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    results = []
+    print('{:<16}{:>10}{:>12}'.format('case', 'min ms', 'median ms'))
+    for case in args.cases:
+        if not _available(case):
+            print('{:<16}{:>10}'.format(case, 'skipped'))
+            continue
+        times = time_case(CASES[case], args.runs)
+        result = {'case': case, 'min': min(times), 'median': statistics.median(times)}
+        results.append(result)
+        print('{:<16}{:>10.1f}{:>12.1f}'.format(case, result['min'] * 1000, result['median'] * 1000))
+
+    baseline.save_and_compare(args, results, ('case',), ('median',))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compare the latency of a sequential and a concurrent tick.
+
+Each resource runs a stub command that sleeps for a given amount of time and then prints a value, roughly simulating
+`top`, `nvidia-smi`, `df` (twice) and `du` on a large tree.
+
+Like `bench_parsers.py`, results can be saved with `--save` and compared with `--baseline`.
+
+    $ python benchmarks/bench_tick_latency.py --ticks 5
+
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+
+import curio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+import baseline  # noqa: E402
+from heimdallr.main import _sample_sequentially, _sample_concurrently  # noqa: E402
+from heimdallr.resource import SimpleCommandResource  # noqa: E402
+
+
+class StubResource(SimpleCommandResource):
+    """A resource whose command sleeps for `delay` seconds and prints a number."""
+
+    def __init__(self, output_file, delay):
+        super().__init__(output_file)
+        self._delay = delay
+
+    def make_cmdline(self, config):
+        return ['sh', '-c', 'sleep {}; echo 42'.format(self._delay)]
+
+    def make_regex(self, config):
+        return re.compile(r'(?P<value>\d+)\s*')
+
+
+STUB_DELAYS = {'top': 0.3, 'nvidia-smi': 0.2, 'df-h': 0.05, 'df-hi': 0.05, 'du': 1.0}
+
+
+async def measure(sampler, resources, ticks):
+    latencies = []
+    for tick in range(ticks):
+        start = time.monotonic()
+        await sampler(resources, {resource for resource, _ in resources} if tick == 0 else set())
+        latencies.append(time.monotonic() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticks', type=int, default=5, help='Number of ticks to measure for each mode.')
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        resources = [
+            (StubResource(os.path.join(tmp_dir, name + '.csv'), delay), {'logfile': name})
+            for name, delay in STUB_DELAYS.items()
+        ]
+        for name, sampler in (('sequential', _sample_sequentially), ('concurrent', _sample_concurrently)):
+            latencies = curio.run(measure, sampler, resources, args.ticks)
+            results.append({'mode': name, 'mean': sum(latencies) / len(latencies), 'max': max(latencies)})
+            print('{:<12} mean={:.3f}s min={:.3f}s max={:.3f}s'.format(
+                name, sum(latencies) / len(latencies), min(latencies), max(latencies)
+            ))
+    print('sum of stub delays: {:.3f}s, max stub delay: {:.3f}s'.format(
+        sum(STUB_DELAYS.values()), max(STUB_DELAYS.values())
+    ))
+    baseline.save_and_compare(args, results, ('mode',), ('mean',))
+
+
+if __name__ == '__main__':
+    main()
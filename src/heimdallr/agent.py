@@ -0,0 +1,348 @@
+import os
+import re
+import sys
+import json
+import stat
+import zlib
+import socket
+import struct
+from collections import deque
+
+import curio
+import curio.network
+
+from .logwriter import create_log_writer, log_columns, log_format, rotate_log, BINARY_LOG_EXTENSION
+from .prometheus import parse_address
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_BATCH_ROWS = 5000
+DEFAULT_SPOOL_ROWS = 100000
+DEFAULT_CLOSE_TIMEOUT = 5.0
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+MAX_FRAME_SIZE = 64 * 2 ** 20
+# many agents may connect at once, e.g. when the collector restarts.
+COLLECTOR_BACKLOG = 1024
+
+# frames start with the length of their payload, a JSON message compressed with zlib.
+_FRAME_LENGTH = struct.Struct('!I')
+# sent by the collector once the rows of a frame were written.
+ACK = b'\x06'
+# sent by the collector, followed by a frame with the errors, if some samples of a frame could not be written.
+REJECT = b'\x15'
+
+
+def parse_endpoint(address):
+    """Parse the address of a collector, `unix:PATH` or `[HOST]:PORT`.
+
+    Returns `('unix', path)` or `('tcp', host, port)`.
+
+    """
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    return ('tcp',) + parse_address(address)
+
+
+def encode_frame(message):
+    payload = zlib.compress(json.dumps(message, default=str, separators=(',', ':')).encode('utf-8'))
+    return _FRAME_LENGTH.pack(len(payload)) + payload
+
+
+async def read_frame(stream):
+    """Read a frame from the curio `stream` and return its message, or None if the stream ends before the frame."""
+    try:
+        header = await stream.read_exactly(_FRAME_LENGTH.size)
+    except EOFError as e:
+        if e.bytes_read:
+            raise
+        return None
+    length, = _FRAME_LENGTH.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError('Frame of {} bytes is too large'.format(length))
+    return json.loads(zlib.decompress(await stream.read_exactly(length)).decode('utf-8'))
+
+
+async def _connect(endpoint):
+    if endpoint[0] == 'unix':
+        return await curio.network.open_unix_connection(endpoint[1])
+    return await curio.network.open_connection(endpoint[1], endpoint[2])
+
+
+def _safe_name(name):
+    """Turn a host or resource name received from an agent into a valid file name."""
+    return re.sub(r'[^\w.-]+', '_', str(name)).lstrip('.') or '_'
+
+
+class _ResourceSink:
+    """The observer of a resource that adds its samples to the spool of an `AgentSink`."""
+
+    def __init__(self, sink, name):
+        self._sink = sink
+        self.name = name
+
+    def add_sample(self, columns, rows):
+        self._sink.add(self.name, columns, rows)
+
+
+class AgentSink:
+    """Sends the samples of the resources to a `heimdallr collect` server (see `Collector`).
+
+    Samples are added to a spool by the observers returned by `observer` and sent every `flush_interval` seconds,
+    in frames of about `batch_rows` rows. Each frame is the length of its payload (4 bytes, big-endian) followed
+    by a JSON message compressed with zlib. The first message of a connection contains the `host` name of the agent,
+    the others a list of samples `[resource, columns, rows]`, with the rows as lists of values.
+
+    A frame is removed from the spool only once the collector acknowledged it, so that nothing is lost when the
+    connection drops: the agent reconnects with an exponential backoff and sends the frame again, which may write
+    it twice. While the collector is slow or unreachable the spool keeps at most `spool_rows` rows, and the oldest
+    samples are dropped, counted by `dropped_rows`, so the memory used by heimdallr stays bounded. Samples that the
+    collector rejects, because it cannot write them, are not sent again: they are reported on stderr and counted
+    by `rejected_rows`.
+
+    """
+
+    def __init__(self, address, host=None, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_rows=DEFAULT_BATCH_ROWS,
+                 spool_rows=DEFAULT_SPOOL_ROWS):
+        self.endpoint = parse_endpoint(address)
+        self.host = host or socket.gethostname()
+        self.flush_interval = flush_interval
+        self.batch_rows = batch_rows
+        self.spool_rows = spool_rows
+        self.sent_rows = 0
+        self.sent_bytes = 0
+        self.dropped_rows = 0
+        self.rejected_rows = 0
+        self._spool = deque()
+        self._spooled_rows = 0
+        self._in_flight = []
+        self._closing = False
+        self._wakeup = curio.Event()
+        self._task = None
+
+    def observer(self, name):
+        """Return the observer that sends the samples of the resource `name` (see `Resource.monitor`)."""
+        return _ResourceSink(self, name)
+
+    @property
+    def pending_rows(self):
+        return self._spooled_rows + sum(len(rows) for _, _, rows in self._in_flight)
+
+    def add(self, name, columns, rows):
+        """Add the `rows` of a sample of the resource `name` to the spool, dropping the oldest samples if full."""
+        if not rows:
+            return
+        self._spool.append((name, list(columns), [[row.get(column, '') for column in columns] for row in rows]))
+        self._spooled_rows += len(rows)
+        self._trim()
+
+    def _trim(self):
+        while self._spooled_rows > self.spool_rows:
+            _, _, rows = self._spool.popleft()
+            self._spooled_rows -= len(rows)
+            self.dropped_rows += len(rows)
+
+    async def _send_spool(self, stream):
+        while self._spool:
+            rows = 0
+            while self._spool and (not self._in_flight or rows + len(self._spool[0][2]) <= self.batch_rows):
+                self._in_flight.append(self._spool.popleft())
+                rows += len(self._in_flight[-1][2])
+            self._spooled_rows -= rows
+            frame = encode_frame({'samples': self._in_flight})
+            await stream.write(frame)
+            answer = await stream.read_exactly(len(ACK))
+            if answer == REJECT:
+                self._rejected(await read_frame(stream))
+            elif answer != ACK:
+                raise ConnectionError('Unexpected answer from the collector')
+            self._in_flight = []
+            self.sent_rows += rows
+            self.sent_bytes += len(frame)
+
+    def _rejected(self, message):
+        if not isinstance(message, dict):
+            raise ConnectionError('Unexpected answer from the collector')
+        for resource, rows, error in message.get('rejected', ()):
+            self.rejected_rows += rows
+            sys.stderr.write('The collector rejected {} rows of {!r}: {}\n'.format(rows, resource, error))
+
+    def _requeue(self):
+        self._spool.extendleft(reversed(self._in_flight))
+        self._spooled_rows += sum(len(rows) for _, _, rows in self._in_flight)
+        self._in_flight = []
+        self._trim()
+
+    async def run(self):
+        """Send the spool to the collector until cancelled, or until `aclose` is called and the spool is empty."""
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                client = await _connect(self.endpoint)
+            except OSError:
+                if self._closing:
+                    return
+                await curio.ignore_after(delay, self._wakeup.wait())
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+            delay = RECONNECT_DELAY
+            try:
+                async with client:
+                    stream = client.as_stream()
+                    await stream.write(encode_frame({'host': self.host}))
+                    while True:
+                        await self._send_spool(stream)
+                        if self._closing:
+                            return
+                        await curio.ignore_after(self.flush_interval, self._wakeup.wait())
+            except (OSError, EOFError):
+                if self._closing:
+                    return
+            finally:
+                # the frame that was being sent when the connection dropped, or the task was cancelled, is kept.
+                self._requeue()
+
+    async def start(self):
+        self._task = await curio.spawn(self.run, daemon=True)
+
+    async def aclose(self, timeout=DEFAULT_CLOSE_TIMEOUT):
+        """Send what is left in the spool, waiting at most `timeout` seconds, and stop."""
+        self._closing = True
+        await self._wakeup.set()
+        async with curio.ignore_after(timeout):
+            if self._task is not None:
+                await self._task.wait()
+            if self.pending_rows:
+                # the task was cancelled, e.g. by Ctrl-C.
+                await self.run()
+        if self._task is not None:
+            await self._task.cancel()
+            self._task = None
+
+
+class Collector:
+    """Receives the samples sent by many heimdallr agents (see `AgentSink`) and writes them to per-host logs.
+
+    The rows of the resource `name` sent by the agent `host` are written to `directory/host/name.csv`, or to
+    `directory/host/name.hlog` with the `format=binary` option. The logs are created with the writer options in
+    `config`, like the log of a resource, and a header is written when a log is opened. When the columns of a
+    resource change, its log is closed and rotated (see `heimdallr.logwriter.rotate_log`), so that each file has
+    a single header. Each frame is acknowledged once its rows have been committed to the logs. The samples that
+    cannot be written, e.g. because an existing log is not a valid log, are rejected with the error instead, so
+    that the agent does not send them again.
+
+    """
+
+    def __init__(self, directory, config=None, verbose=False):
+        self.directory = directory
+        self.config = config or {}
+        self.verbose = verbose
+        self.received_rows = 0
+        # (host, resource) -> [writer, columns, lock]
+        self._logs = {}
+
+    def log_path(self, host, resource):
+        extension = BINARY_LOG_EXTENSION if log_format('', self.config) == 'binary' else '.csv'
+        return os.path.join(self.directory, _safe_name(host), _safe_name(resource) + extension)
+
+    async def _log(self, host, resource, columns):
+        log = self._logs.pop((host, resource), None)
+        if log is not None and log[1] != columns:
+            await log[0].aclose()
+            log = None
+        if log is None:
+            path = self.log_path(host, resource)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if log_columns(path, self.config) not in (None, columns):
+                rotate_log(path, self.config)
+            writer = create_log_writer(path, columns, self.config)
+            writer.writeheader()
+            log = [writer, columns, curio.Lock()]
+        self._logs[host, resource] = log
+        return log
+
+    async def _write_samples(self, host, samples):
+        """Write the rows of the `samples` of a frame, committing each log once.
+
+        Returns the samples that could not be written, as a list of `[resource, number of rows, error]`.
+
+        """
+        logs = {}
+        rejected = []
+        for resource, columns, rows in samples:
+            if not isinstance(columns, list) or not isinstance(rows, list):
+                raise ValueError('Invalid sample of {!r}'.format(resource))
+            try:
+                log = await self._log(host, str(resource), columns)
+                log[0].writerows(dict(zip(log[1], row)) for row in rows)
+            except (ValueError, TypeError) as e:
+                rejected.append([str(resource), len(rows), '{}: {}'.format(e.__class__.__name__, e)])
+                continue
+            logs[id(log)] = log
+            self.received_rows += len(rows)
+        for writer, _, lock in logs.values():
+            # the same host may be connected twice for a moment, when an agent reconnects.
+            async with lock:
+                await writer.commit()
+        return rejected
+
+    async def _serve_client(self, client, address):
+        stream = client.as_stream()
+        host = None
+        async with stream:
+            try:
+                hello = await read_frame(stream)
+                if hello is None:
+                    return
+                if not isinstance(hello, dict) or 'host' not in hello:
+                    raise ValueError('Missing host name')
+                host = str(hello['host'])
+                if self.verbose:
+                    sys.stderr.write('Agent {!r} connected.\n'.format(host))
+                while True:
+                    message = await read_frame(stream)
+                    if message is None:
+                        break
+                    rejected = await self._write_samples(host, message['samples'])
+                    if rejected:
+                        for resource, rows, error in rejected:
+                            sys.stderr.write('Rejected {} rows of {!r} from agent {!r}: {}\n'.format(
+                                rows, resource, host, error
+                            ))
+                        await stream.write(REJECT + encode_frame({'rejected': rejected}))
+                    else:
+                        await stream.write(ACK)
+            except (OSError, EOFError, ValueError, TypeError, KeyError, zlib.error) as e:
+                sys.stderr.write('Dropping the connection of agent {!r}: {}: {}\n'.format(
+                    host or address, e.__class__.__name__, e
+                ))
+            else:
+                if self.verbose:
+                    sys.stderr.write('Agent {!r} disconnected.\n'.format(host))
+
+    async def serve(self, address):
+        """Receive the samples of the agents connecting to `address`, `unix:PATH` or `[HOST]:PORT`.
+
+        Like `heimdallr.history.HistoryStore.serve`, a stale Unix domain socket is replaced and removed when the
+        server is cancelled.
+
+        """
+        endpoint = parse_endpoint(address)
+        if endpoint[0] == 'tcp':
+            await curio.network.tcp_server(endpoint[1], endpoint[2], self._serve_client, backlog=COLLECTOR_BACKLOG)
+            return
+        path = endpoint[1]
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+        try:
+            await curio.network.unix_server(path, self._serve_client, backlog=COLLECTOR_BACKLOG)
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def aclose(self):
+        """Flush and close all the logs."""
+        for writer, _, _ in self._logs.values():
+            await writer.aclose()
+        self._logs = {}
@@ -0,0 +1,320 @@
+import io
+import os
+import re
+import csv
+import gzip
+import json
+import lzma
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+from .logwriter import LogWriter
+from .utils import LOCAL_TIMEZONE, to_local_str, split_unit
+
+# A binary log starts with MAGIC followed by a schema record (kind `S`) containing the JSON-encoded list of columns.
+# The rest of the file is a sequence of records, each made of a one byte kind, the length of the payload,
+# the payload itself and its CRC32:
+#  - dictionary records (kind `D`) add a string to the dictionary, with the next free id.
+#  - row records (kind `R`) contain one value for each column.
+# The log is row-oriented, with the type of each value tagged in the row, rather than columnar with types in the
+# schema: a sample is appended with a single write, like a CSV row, and a column can hold values of different types
+# (e.g. `N/A` in a numeric column, or a size printed with a different unit) without falling back to strings.
+# A record that is incomplete or has a wrong checksum marks the end of the valid data: everything after it is the
+# result of a crash while writing and is truncated when the file is reopened for appending.
+MAGIC = b'HMDLLOG\x01'
+SCHEMA_RECORD = b'S'
+DICTIONARY_RECORD = b'D'
+ROW_RECORD = b'R'
+
+_RECORD_HEADER = struct.Struct('<cI')
+_CRC = struct.Struct('<I')
+_LENGTH = struct.Struct('<I')
+
+# Each value of a row is a one byte tag followed by a payload whose format depends on the tag.
+# Integers are stored using the smallest fixed width that can hold them. Timestamps are stored as the seconds of
+# their wall-clock time, as if it was UTC, and the id of their timezone suffix, so that they are exported exactly as
+# they were written whatever the timezone of the exporter. TIMESTAMP, in the local timezone, is only read.
+(EMPTY, INT8, INT16, INT32, INT64, FLOAT, STRING, TIMESTAMP,
+ INT_WITH_UNIT, FLOAT_WITH_UNIT, INLINE_STRING, WALL_TIMESTAMP) = range(12)
+_PAYLOADS = {
+    INT8: struct.Struct('<b'),
+    INT16: struct.Struct('<h'),
+    INT32: struct.Struct('<i'),
+    INT64: struct.Struct('<q'),
+    FLOAT: struct.Struct('<d'),
+    STRING: struct.Struct('<H'),
+    TIMESTAMP: struct.Struct('<q'),
+    INT_WITH_UNIT: struct.Struct('<qH'),
+    FLOAT_WITH_UNIT: struct.Struct('<dH'),
+    INLINE_STRING: _LENGTH,
+    WALL_TIMESTAMP: struct.Struct('<qH'),
+}
+_INT_TAGS = ((INT8, 2 ** 7), (INT16, 2 ** 15), (INT32, 2 ** 31), (INT64, 2 ** 63))
+
+MAX_DICTIONARY_SIZE = 2 ** 16
+MAX_DICTIONARY_STRING_LENGTH = 256
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+_TIMESTAMP = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\w*)')
+_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _record(kind, payload):
+    return _RECORD_HEADER.pack(kind, len(payload)) + payload + _CRC.pack(zlib.crc32(payload))
+
+
+def _encode_int(value):
+    for tag, limit in _INT_TAGS:
+        if -limit <= value < limit:
+            return bytes([tag]) + _PAYLOADS[tag].pack(value)
+
+
+def _exact_number(text):
+    """Return the int or float represented by `text`, if converting it back to a string gives `text` again."""
+    try:
+        number = float(text) if '.' in text else int(text)
+    except ValueError:
+        # e.g. a decimal comma.
+        return None
+    if str(number) != text or (isinstance(number, int) and not INT64_MIN <= number <= INT64_MAX):
+        return None
+    return number
+
+
+class _ValueEncoder:
+    """Encodes the values of rows, keeping the dictionary of repeated strings."""
+
+    def __init__(self, strings=()):
+        self._dictionary = {string: index for index, string in enumerate(strings)}
+        self._last_timestamp = (None, None)
+
+    def _string_id(self, string, out):
+        """Return the id of `string` in the dictionary, adding it if needed, or None if it should be inlined."""
+        string_id = self._dictionary.get(string)
+        if string_id is None:
+            if len(self._dictionary) >= MAX_DICTIONARY_SIZE or len(string) > MAX_DICTIONARY_STRING_LENGTH:
+                return None
+            string_id = self._dictionary[string] = len(self._dictionary)
+            out.write(_record(DICTIONARY_RECORD, _LENGTH.pack(string_id) + string.encode('utf-8')))
+        return string_id
+
+    def _timestamp(self, value, out):
+        """Return the encoded timestamp `value`, or None if it is not a timestamp that can be encoded exactly."""
+        if self._last_timestamp[0] == value:
+            return self._last_timestamp[1]
+        encoded = None
+        match = _TIMESTAMP.fullmatch(value)
+        date = None
+        if match:
+            try:
+                date = datetime.strptime(value[:19], _TIMESTAMP_FORMAT)
+            except ValueError:
+                pass
+        if date is not None and date.strftime(_TIMESTAMP_FORMAT) == value[:19]:
+            suffix_id = self._string_id(match[1], out)
+            if suffix_id is not None:
+                seconds = (date - _EPOCH) // timedelta(seconds=1)
+                encoded = bytes([WALL_TIMESTAMP]) + _PAYLOADS[WALL_TIMESTAMP].pack(seconds, suffix_id)
+        self._last_timestamp = (value, encoded)
+        return encoded
+
+    def encode(self, value, out):
+        """Encode a single value into `out`. New dictionary records are written to `out` too."""
+        if value is None or value == '':
+            return bytes([EMPTY])
+        if isinstance(value, bool):
+            value = str(value)
+        if isinstance(value, int) and INT64_MIN <= value <= INT64_MAX:
+            return _encode_int(value)
+        if isinstance(value, float):
+            return bytes([FLOAT]) + _PAYLOADS[FLOAT].pack(value)
+        value = str(value)
+        parts = split_unit(value)
+        if parts is not None and parts[0] + parts[1] == value:
+            number, unit = _exact_number(parts[0]), parts[1]
+            if number is not None:
+                if not unit:
+                    return _encode_int(number) if isinstance(number, int) else self.encode(number, out)
+                unit_id = self._string_id(unit, out)
+                if unit_id is not None:
+                    tag = INT_WITH_UNIT if isinstance(number, int) else FLOAT_WITH_UNIT
+                    return bytes([tag]) + _PAYLOADS[tag].pack(number, unit_id)
+        timestamp = self._timestamp(value, out)
+        if timestamp is not None:
+            return timestamp
+        string_id = self._string_id(value, out)
+        if string_id is not None:
+            return bytes([STRING]) + _PAYLOADS[STRING].pack(string_id)
+        encoded = value.encode('utf-8')
+        return bytes([INLINE_STRING]) + _LENGTH.pack(len(encoded)) + encoded
+
+    def encode_row(self, values, out):
+        """Write the record of a row, preceded by the dictionary records of its new strings, into `out`."""
+        payload = b''.join([self.encode(value, out) for value in values])
+        out.write(_record(ROW_RECORD, payload))
+
+
+def _decode_row(payload, strings):
+    values = []
+    offset = 0
+    while offset < len(payload):
+        tag = payload[offset]
+        offset += 1
+        if tag == EMPTY:
+            values.append('')
+            continue
+        payload_struct = _PAYLOADS[tag]
+        fields = payload_struct.unpack_from(payload, offset)
+        offset += payload_struct.size
+        if tag in (INT8, INT16, INT32, INT64, FLOAT):
+            values.append(str(fields[0]))
+        elif tag == STRING:
+            values.append(strings[fields[0]])
+        elif tag == TIMESTAMP:
+            # written by older versions, in the local timezone.
+            values.append(to_local_str(datetime.fromtimestamp(fields[0], LOCAL_TIMEZONE).replace(tzinfo=None)))
+        elif tag == WALL_TIMESTAMP:
+            values.append((_EPOCH + timedelta(seconds=fields[0])).strftime(_TIMESTAMP_FORMAT) + strings[fields[1]])
+        elif tag in (INT_WITH_UNIT, FLOAT_WITH_UNIT):
+            values.append(str(fields[0]) + strings[fields[1]])
+        else:
+            values.append(payload[offset:offset + fields[0]].decode('utf-8'))
+            offset += fields[0]
+    return values
+
+
+class BinaryLogReader:
+    """Reads a binary log file written by `BinaryLogWriter`.
+
+    Iterating over the reader yields the rows as lists of strings, in the same format in which they would have
+    been written to a CSV file. Segments compressed by the log rotation can be read directly. Reading stops at the
+    first incomplete or corrupted record, and `valid_length` is the size of the file up to that point.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = None
+        self.strings = []
+        self.valid_length = 0
+        if path.endswith(('.gz', '.xz')):
+            self._file = (gzip.open if path.endswith('.gz') else lzma.open)(path, 'rb')
+        else:
+            self._file = open(path, 'rb')
+        self._read_schema()
+
+    def _read_schema(self):
+        magic = self._file.read(len(MAGIC))
+        if not magic:
+            return
+        if not MAGIC.startswith(magic):
+            raise ValueError('{!r} is not a heimdallr binary log'.format(self.path))
+        record = self._read_record()
+        if record is not None and record[0] == SCHEMA_RECORD:
+            self.columns = json.loads(record[1].decode('utf-8'))['columns']
+            self.valid_length = self._file.tell()
+
+    def _read_record(self):
+        header = self._file.read(_RECORD_HEADER.size)
+        if len(header) < _RECORD_HEADER.size:
+            return None
+        kind, length = _RECORD_HEADER.unpack(header)
+        payload = self._file.read(length)
+        crc = self._file.read(_CRC.size)
+        if len(payload) < length or len(crc) < _CRC.size or _CRC.unpack(crc)[0] != zlib.crc32(payload):
+            return None
+        return kind, payload
+
+    def __iter__(self):
+        if self.columns is None:
+            return
+        while True:
+            record = self._read_record()
+            if record is None or record[0] not in (DICTIONARY_RECORD, ROW_RECORD):
+                return
+            kind, payload = record
+            if kind == DICTIONARY_RECORD:
+                self.strings.append(payload[_LENGTH.size:].decode('utf-8'))
+            else:
+                row = _decode_row(payload, self.strings)
+            self.valid_length = self._file.tell()
+            if kind == ROW_RECORD:
+                yield row
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def export_to_csv(path, out_file, header=True):
+    """Stream the rows of the binary log `path` as CSV into `out_file`."""
+    with BinaryLogReader(path) as reader:
+        writer = csv.writer(out_file)
+        if header and reader.columns is not None:
+            writer.writerow(reader.columns)
+        writer.writerows(reader)
+
+
+class BinaryLogWriter(LogWriter):
+    """A long-lived writer for a binary log file.
+
+    The log is append-only: when an existing file is opened its dictionary is loaded and any incomplete record at
+    the end, left by a crash, is truncated. The columns of an existing file must match `fieldnames`.
+
+    Numbers, numbers with a unit suffix (e.g. `45C` or `1234MiB`) and timestamps are stored as fixed-width binary
+    values, while other strings are stored in a dictionary and referenced by id. Values are encoded in binary only
+    when they can be converted back to exactly the same string, so exporting the log gives back the original rows.
+
+    """
+
+    def __init__(self, path, fieldnames, **kwargs):
+        super().__init__(path, fieldnames, **kwargs)
+        self._valid_length = 0
+        strings = ()
+        if os.path.exists(path):
+            with BinaryLogReader(path) as reader:
+                for _ in reader:
+                    pass
+                if reader.columns is not None and reader.columns != list(fieldnames):
+                    raise ValueError('The columns of {!r} do not match those of the resource'.format(path))
+                strings = reader.strings
+                self._valid_length = reader.valid_length
+        self._encoder = _ValueEncoder(strings)
+
+    def _new_buffer(self):
+        return io.BytesIO()
+
+    def _open(self):
+        if self._valid_length is None:
+            # the file was already recovered when it was first opened.
+            return open(self.path, 'ab')
+        log_file = open(self.path, 'r+b' if os.path.exists(self.path) else 'w+b')
+        log_file.truncate(self._valid_length)
+        log_file.seek(self._valid_length)
+        if not self._valid_length:
+            schema = json.dumps({'columns': list(self.fieldnames)}).encode('utf-8')
+            log_file.write(MAGIC + _record(SCHEMA_RECORD, schema))
+        self._valid_length = None
+        return log_file
+
+    def _start_segment(self):
+        self._valid_length = 0
+        self._encoder = _ValueEncoder()
+
+    def writeheader(self):
+        """Does nothing. The columns are always stored at the beginning of the file."""
+
+    def writerows(self, rows):
+        with self._lock:
+            for row in rows:
+                wrong_fields = row.keys() - self.fieldnames
+                if wrong_fields:
+                    raise ValueError('dict contains fields not in fieldnames: ' + ', '.join(map(repr, wrong_fields)))
+                self._encoder.encode_row([row.get(column, '') for column in self.fieldnames], self._buffer)
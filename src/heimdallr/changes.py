@@ -0,0 +1,152 @@
+from datetime import datetime
+
+from .logindex import parse_timestamp, time_column
+from .utils import parse_number, to_local_str, as_list
+
+ALL = 'all'
+CHANGES = 'changes'
+RECORD_MODES = (ALL, CHANGES)
+# the columns added by `Resource.monitor` that describe how a sample was taken rather than the resource.
+BOOKKEEPING_COLUMNS = ('datetime', 'interval', 'timed_out')
+
+
+def check_record_mode(record):
+    if record not in RECORD_MODES:
+        raise ValueError('Invalid record mode {!r}. Valid modes: {}'.format(record, ', '.join(RECORD_MODES)))
+
+
+def parse_tolerances(tolerances):
+    """Parse the `tolerances` option into a dict `{column: tolerance}`.
+
+    The option is either a dict or a string of `column:tolerance` pairs separated by whitespace or commas (e.g.
+    `temperature:0.5 used:10M`). Tolerances are converted with `heimdallr.utils.parse_number`, so sizes with a binary
+    suffix are in bytes, like the values they are compared with.
+
+    """
+    if tolerances is None:
+        return {}
+    if isinstance(tolerances, dict):
+        pairs = tolerances.items()
+    else:
+        pairs = [tolerance.rsplit(':', maxsplit=1) for tolerance in as_list(tolerances)]
+    parsed = {}
+    for pair in pairs:
+        column, tolerance = pair if len(pair) == 2 else (pair[0], None)
+        value = parse_number(tolerance)
+        if value is None or value < 0:
+            raise ValueError('Invalid tolerance {!r} for column {!r}'.format(tolerance, column))
+        parsed[column] = value
+    return parsed
+
+
+class ChangeFilter:
+    """Select the rows of the samples of a resource that changed since they were last written.
+
+    Rows are grouped by the values of their `label_columns`, like the core or the filesystem. A row is kept if any
+    of its columns, except the `BOOKKEEPING_COLUMNS` like the `datetime` or the adaptive `interval`, differs from
+    the last row kept for the same group, or if that row was kept at least `heartbeat` seconds before. Numeric
+    columns listed in `tolerances` only count as changed when their value moved by more than the tolerance, with
+    respect to the last value kept.
+
+    """
+
+    def __init__(self, label_columns=(), heartbeat=None, tolerances=None):
+        self.label_columns = list(label_columns)
+        self.heartbeat = heartbeat
+        self.tolerances = dict(tolerances or {})
+        # labels -> (row, time at which it was kept)
+        self._last = {}
+
+    @classmethod
+    def from_config(cls, label_columns, config):
+        """Create a filter using the `heartbeat` and `tolerances` options of a resource."""
+        return cls(
+            label_columns,
+            heartbeat=config.get('heartbeat'),
+            tolerances=parse_tolerances(config.get('tolerances')),
+        )
+
+    def _changed(self, old, new):
+        for column, value in new.items():
+            if column in BOOKKEEPING_COLUMNS:
+                continue
+            tolerance = self.tolerances.get(column)
+            if tolerance is not None:
+                old_number, new_number = parse_number(old.get(column)), parse_number(value)
+                if old_number is not None and new_number is not None:
+                    if abs(new_number - old_number) > tolerance:
+                        return True
+                    continue
+            if old.get(column) != value:
+                return True
+        return False
+
+    def filter(self, rows, timestamp):
+        """Return the `rows` of a sample taken at `timestamp` that must be written."""
+        kept = []
+        for row in rows:
+            key = tuple(row.get(column) for column in self.label_columns)
+            last = self._last.get(key)
+            if (last is None or self._changed(last[0], row)
+                    or (self.heartbeat is not None and timestamp - last[1] >= self.heartbeat)):
+                self._last[key] = (row, timestamp)
+                kept.append(row)
+        return kept
+
+
+def densify(rows, interval, label_columns=(), start=None, end=None, max_age=None):
+    """Rebuild the dense time series of a log written with `record=changes`.
+
+    `rows` are the header and then the rows of the log, as yielded by `heimdallr.logindex.query_log`. The header is
+    yielded unchanged, followed by a sample every `interval` seconds from `start` (by default the time of the first
+    row) to `end` (by default the time of the last row): for each group of `label_columns`, the last row written up
+    to that time, with the time of the sample. Rows written up to half an interval after a sample are part of it,
+    since ticks are never exactly `interval` seconds apart.
+
+    Groups whose last row is older than `max_age` seconds, e.g. a filesystem that was unmounted, are left out. With
+    a heartbeat, it should be a bit longer than the heartbeat. Rows before `start` are needed to know the values at
+    `start`, so the log should be read from `start - max_age`, or from the beginning.
+
+    """
+    if interval <= 0:
+        raise ValueError('The interval must be positive')
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    if time_column(header) is None:
+        raise ValueError('The log has no time column')
+    yield header
+    time_index = header.index(time_column(header))
+    label_indexes = [header.index(column) for column in label_columns if column in header]
+    last = {}
+    sample_time = start
+    last_time = None
+
+    def sample():
+        text = to_local_str(datetime.fromtimestamp(sample_time))
+        for key, (row_time, row) in list(last.items()):
+            if max_age is not None and sample_time - row_time > max_age:
+                del last[key]
+                continue
+            row = list(row)
+            row[time_index] = text
+            yield row
+
+    for row in rows:
+        timestamp = parse_timestamp(row[time_index])
+        if timestamp is None:
+            continue
+        if sample_time is None:
+            sample_time = timestamp
+        while sample_time + interval / 2 < timestamp and (end is None or sample_time <= end):
+            yield from sample()
+            sample_time += interval
+        last[tuple(row[index] for index in label_indexes)] = (timestamp, row)
+        last_time = timestamp
+    if last_time is None:
+        return
+    end = last_time + interval / 2 if end is None else end
+    while sample_time <= end:
+        yield from sample()
+        sample_time += interval
@@ -0,0 +1,147 @@
+import os
+import json
+import stat
+import time
+from collections import deque
+
+import curio
+import curio.network
+
+DEFAULT_HISTORY_SIZE = 1000
+
+
+class SampleHistory:
+    """A ring buffer with the last `size` samples of a resource.
+
+    Each sample is stored as its time (as returned by `time.time()`) and its rows, as tuples of values in the
+    order of `columns`, so the memory used is bounded by the number of samples.
+
+    """
+
+    def __init__(self, size=DEFAULT_HISTORY_SIZE):
+        if size <= 0:
+            raise ValueError('The history size must be positive, got {!r}'.format(size))
+        self.columns = None
+        self._samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add_sample(self, columns, rows, timestamp=None):
+        """Add a sample made of `rows`, dicts with the keys in `columns`."""
+        if columns != self.columns:
+            # the columns can change only if the resource was reconfigured. Old samples cannot be queried anymore.
+            self.columns = list(columns)
+            self._samples.clear()
+        timestamp = time.time() if timestamp is None else timestamp
+        self._samples.append((timestamp, [tuple(row.get(column, '') for column in columns) for row in rows]))
+
+    def samples(self, start=None, end=None, last=None):
+        """Return the samples taken between `start` and `end` included, or the `last` ones, from the oldest."""
+        if last is not None and last < 0:
+            raise ValueError('The number of samples must not be negative, got {!r}'.format(last))
+        samples = [
+            sample for sample in self._samples
+            if (start is None or sample[0] >= start) and (end is None or sample[0] <= end)
+        ]
+        if last is None:
+            return samples
+        return samples[-last:] if last else []
+
+
+class HistoryStore:
+    """The histories of all the resources, by name."""
+
+    def __init__(self):
+        self.histories = {}
+
+    def create(self, name, size=DEFAULT_HISTORY_SIZE):
+        self.histories[name] = SampleHistory(size)
+        return self.histories[name]
+
+    def remove(self, name):
+        self.histories.pop(name, None)
+
+    def _history(self, request):
+        try:
+            return self.histories[request['resource']]
+        except KeyError:
+            raise ValueError('Unknown resource {!r}'.format(request.get('resource'))) from None
+
+    @staticmethod
+    def _project(history, samples, columns):
+        if columns is None:
+            return history.columns, [{'time': timestamp, 'rows': rows} for timestamp, rows in samples]
+        unknown = [column for column in columns if column not in history.columns]
+        if unknown:
+            raise ValueError('Unknown columns: {}'.format(', '.join(map(repr, unknown))))
+        indexes = [history.columns.index(column) for column in columns]
+        return columns, [
+            {'time': timestamp, 'rows': [[row[index] for index in indexes] for row in rows]}
+            for timestamp, rows in samples
+        ]
+
+    def handle(self, request):
+        """Answer a request, a dict with the `command` to run and its arguments. Return the response as a dict.
+
+        The commands are:
+
+         - `resources`: the columns and number of samples of each resource.
+         - `latest`: the last `count` samples (1 by default) of `resource`.
+         - `range`: the samples of `resource` taken between the timestamps `start` and `end`, both optional.
+
+        `latest` and `range` return only the `columns` listed in the request, if given. Errors are returned as a
+        dict with the `error` key.
+
+        """
+        try:
+            command = request.get('command')
+            if command == 'resources':
+                return {'resources': {
+                    name: {'columns': history.columns, 'samples': len(history)}
+                    for name, history in self.histories.items()
+                }}
+            if command == 'latest':
+                history = self._history(request)
+                samples = history.samples(last=int(request.get('count', 1)))
+            elif command == 'range':
+                history = self._history(request)
+                samples = history.samples(request.get('start'), request.get('end'))
+            else:
+                raise ValueError('Unknown command {!r}'.format(command))
+            columns, samples = self._project(history, samples, request.get('columns'))
+            return {'resource': request['resource'], 'columns': columns, 'samples': samples}
+        except (ValueError, TypeError, AttributeError) as e:
+            return {'error': str(e)}
+
+    async def _serve_client(self, client, address):
+        stream = client.as_stream()
+        async with stream:
+            async for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                except ValueError as e:
+                    response = {'error': 'Invalid request: {}'.format(e)}
+                else:
+                    response = self.handle(request) if isinstance(request, dict) else {'error': 'Invalid request'}
+                await stream.write(json.dumps(response).encode('utf-8') + b'\n')
+
+    async def serve(self, path):
+        """Serve the histories on the Unix domain socket `path`.
+
+        Each line received is a JSON request (see `handle`) and is answered with a line containing the JSON
+        response. A stale socket left at `path` is replaced, and the socket file is removed when the server is
+        cancelled.
+
+        """
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+        try:
+            await curio.network.unix_server(path, self._serve_client)
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,177 @@
+import io
+import sys
+import math
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+PHASES = ('spawn', 'exec', 'parse', 'clean', 'write', 'total')
+COUNTERS = ('parse_failures', 'backups', 'restarts', 'timeouts')
+
+
+class Histogram:
+    """A latency histogram with logarithmic buckets.
+
+    There are `BUCKETS_PER_OCTAVE` buckets for each power of two, starting from `MIN_VALUE` seconds, so the
+    percentiles computed from the buckets overestimate the real ones by less than 19%.
+
+    """
+
+    BUCKETS_PER_OCTAVE = 4
+    MIN_VALUE = 1e-6
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.buckets = defaultdict(int)
+
+    @classmethod
+    def bucket_of(cls, value):
+        if value <= cls.MIN_VALUE:
+            return 0
+        return math.ceil(math.log2(value / cls.MIN_VALUE) * cls.BUCKETS_PER_OCTAVE)
+
+    @classmethod
+    def upper_bound(cls, bucket):
+        return cls.MIN_VALUE * 2 ** (bucket / cls.BUCKETS_PER_OCTAVE)
+
+    def record(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.buckets[self.bucket_of(value)] += 1
+
+    def copy(self):
+        histogram = Histogram()
+        histogram.count, histogram.sum, histogram.max = self.count, self.sum, self.max
+        histogram.buckets.update(self.buckets)
+        return histogram
+
+    def __sub__(self, other):
+        """Return the histogram of the values recorded after `other`, which must be a previous copy of `self`.
+
+        Unless a single value was recorded, the maximum of the difference is approximated by the upper bound of its
+        highest non-empty bucket.
+
+        """
+        histogram = Histogram()
+        histogram.count = self.count - other.count
+        histogram.sum = self.sum - other.sum
+        for bucket, count in self.buckets.items():
+            if count > other.buckets.get(bucket, 0):
+                histogram.buckets[bucket] = count - other.buckets.get(bucket, 0)
+        if histogram.count == 1:
+            histogram.max = histogram.sum
+        elif histogram.buckets:
+            histogram.max = min(self.max, self.upper_bound(max(histogram.buckets)))
+        return histogram
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, fraction):
+        """Return an upper bound of the given percentile (e.g. 0.9 for the 90th), or None if the histogram is empty."""
+        if not self.count:
+            return None
+        threshold = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= threshold:
+                return min(self.max, self.upper_bound(bucket))
+        return self.max
+
+
+class Instrumentation:
+    """Latency histograms of the phases of sampling each resource, and counters of notable events.
+
+    Both are keyed by `(resource, name)`, where `resource` is the name of the resource in the configuration.
+
+    Outputs may be parsed in worker threads (see `heimdallr.parsing`), so the values are recorded under a lock and
+    must be read with `snapshot`.
+
+    """
+
+    def __init__(self):
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, resource, phase, seconds):
+        with self._lock:
+            self.histograms[resource, phase].record(seconds)
+
+    def increment(self, resource, counter, amount=1):
+        with self._lock:
+            self.counters[resource, counter] += amount
+
+    def snapshot(self):
+        """Return copies of the histograms and of the counters, as two dicts."""
+        with self._lock:
+            histograms = {key: histogram.copy() for key, histogram in self.histograms.items()}
+            return histograms, dict(self.counters)
+
+    @contextmanager
+    def timed(self, resource, phase):
+        """Record the time spent in the body of the `with` statement as a sample of `phase`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(resource, phase, time.perf_counter() - start)
+
+    def resources(self):
+        """Return the names of the resources for which something was recorded, sorted."""
+        with self._lock:
+            return sorted({resource for resource, _ in self.histograms} | {resource for resource, _ in self.counters})
+
+
+STATS = Instrumentation()
+
+
+def resource_name(resource, config):
+    """Return the name under which the metrics of `resource` are recorded."""
+    return config.get('resource_name') or resource.__class__.__name__
+
+
+@contextmanager
+def profiling(output='-', limit=25):
+    """Profile the body of the `with` statement with `cProfile` and `tracemalloc`.
+
+    When the body exits, even because of an exception, a summary with the `limit` functions with the highest
+    cumulative time and the `limit` lines that allocated most of the memory still in use is written to the file
+    `output`, or to stderr if `output` is `-`. Code running in worker threads is not profiled.
+
+    """
+    # imported here since they are slow to import and rarely needed.
+    import pstats
+    import cProfile
+    import tracemalloc
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        summary = io.StringIO()
+        summary.write('Profile by cumulative time:\n')
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(limit)
+        summary.write('Memory allocated: {:.1f} KiB, peak: {:.1f} KiB. Top allocations:\n'.format(
+            current / 1024, peak / 1024
+        ))
+        for statistic in snapshot.statistics('lineno')[:limit]:
+            summary.write('  {}\n'.format(statistic))
+        if output == '-':
+            sys.stderr.write(summary.getvalue())
+        else:
+            with open(output, 'w') as output_file:
+                output_file.write(summary.getvalue())
@@ -0,0 +1,166 @@
+import os
+import csv
+import mmap
+import bisect
+from datetime import datetime
+from fnmatch import fnmatchcase
+
+INDEX_SUFFIX = '.idx'
+DEFAULT_INDEX_EVERY = 1000
+TIME_COLUMNS = ('datetime', 'window_start')
+
+
+def index_path(path):
+    """Return the path of the sparse index of the log file `path`."""
+    return path + INDEX_SUFFIX
+
+
+def time_column(columns):
+    """Return the column with the time of the rows of a log, or None if there is none."""
+    return next((column for column in TIME_COLUMNS if column in columns), None)
+
+
+def parse_timestamp(text):
+    """Convert a time as written in the logs (e.g. `2024-01-01T13:00:00CET`) into a Unix timestamp, or None.
+
+    The time zone name is ignored: the time is assumed to be in the local time zone, like the logs are written.
+
+    """
+    try:
+        return datetime.fromisoformat(text[:19]).timestamp()
+    except (ValueError, TypeError):
+        return None
+
+
+def _records(log, offset):
+    """Yield the byte offset and the bytes of each CSV record of the memory-mapped `log`, starting at `offset`.
+
+    A record may span several lines, when a quoted value contains a newline.
+
+    """
+    log.seek(offset)
+    while True:
+        start = log.tell()
+        record = log.readline()
+        if not record:
+            return
+        while record.count(b'"') % 2:
+            line = log.readline()
+            if not line:
+                break
+            record += line
+        yield start, record
+
+
+def _parse_record(record):
+    return next(csv.reader([record.decode('utf-8', errors='replace')]), [])
+
+
+def read_index(path):
+    """Read the sparse index of the log `path`, a list of `(timestamp, offset)` pairs, or None if it is missing."""
+    try:
+        with open(index_path(path)) as index_file:
+            entries = []
+            for line in index_file:
+                timestamp, offset = line.split()
+                entries.append((float(timestamp), int(offset)))
+            return entries
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        # a corrupted index is rebuilt.
+        return None
+
+
+def build_index(log, time_index, every=DEFAULT_INDEX_EVERY):
+    """Return the sparse index of the memory-mapped CSV `log`, with an entry every `every` rows.
+
+    `time_index` is the position of the time column in the rows. Lines that have no valid time, like the headers
+    written each time heimdallr was restarted, are not counted.
+
+    """
+    entries = []
+    rows = 0
+    for offset, record in _records(log, 0):
+        values = _parse_record(record)
+        timestamp = parse_timestamp(values[time_index]) if len(values) > time_index else None
+        if timestamp is None:
+            continue
+        if rows % every == 0:
+            entries.append((timestamp, offset))
+        rows += 1
+    return entries
+
+
+def write_index(path, entries):
+    """Replace the sparse index of the log `path` with `entries`."""
+    temporary_path = index_path(path) + '.tmp'
+    with open(temporary_path, 'w') as index_file:
+        index_file.writelines('{!r} {}\n'.format(timestamp, offset) for timestamp, offset in entries)
+    os.replace(temporary_path, index_path(path))
+
+
+def _valid_index(log, entries):
+    """Check that the entries of an index point to the beginning of records inside the log."""
+    return all(offset < len(log) and (offset == 0 or log[offset - 1] == ord('\n')) for _, offset in entries)
+
+
+def _select(header, rows, start, end, columns, filters):
+    """Yield the projected header and then the rows, given as lists of strings, selected by `query_log`."""
+    time_name = time_column(header)
+    if time_name is None:
+        raise ValueError('The log has no time column')
+    unknown = [column for column in list(columns or ()) + list(filters or ()) if column not in header]
+    if unknown:
+        raise ValueError('Unknown columns: {}'.format(', '.join(map(repr, unknown))))
+    time_index = header.index(time_name)
+    projection = [header.index(column) for column in columns] if columns else range(len(header))
+    conditions = [(header.index(column), pattern) for column, pattern in (filters or {}).items()]
+    yield [header[index] for index in projection]
+    for values in rows:
+        if len(values) != len(header):
+            continue
+        timestamp = parse_timestamp(values[time_index])
+        if timestamp is None or (start is not None and timestamp < start):
+            continue
+        if end is not None and timestamp > end:
+            return
+        if all(fnmatchcase(values[index], pattern) for index, pattern in conditions):
+            yield [values[index] for index in projection]
+
+
+def query_log(path, start=None, end=None, columns=None, filters=None, every=DEFAULT_INDEX_EVERY):
+    """Yield the header and then the rows of the log `path` whose time is between `start` and `end` included.
+
+    Times are Unix timestamps. A CSV log is memory-mapped, and the first row to read is found by a binary search
+    over its sparse index (see `build_index`), which is rebuilt if it is missing or does not match the log. Binary
+    logs cannot be read from the middle, since their strings are stored in a dictionary, so they are scanned from
+    the beginning. Reading stops at the first row after `end`.
+
+    Only the given `columns` are returned, and only the rows matching all the `filters`, a dict `{column: pattern}`
+    with shell-style wildcards (e.g. `{'mount point': '/home*'}`).
+
+    """
+    from .logwriter import BINARY_LOG_EXTENSION
+    if path.endswith((BINARY_LOG_EXTENSION, BINARY_LOG_EXTENSION + '.gz', BINARY_LOG_EXTENSION + '.xz')):
+        from .binlog import BinaryLogReader
+        with BinaryLogReader(path) as reader:
+            if reader.columns is not None:
+                yield from _select(reader.columns, reader, start, end, columns, filters)
+        return
+    with open(path, 'rb') as log_file:
+        if not os.fstat(log_file.fileno()).st_size:
+            return
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log:
+            header = _parse_record(log.readline())
+            offset = 0
+            if start is not None and time_column(header) is not None:
+                entries = read_index(path)
+                if entries is None or not _valid_index(log, entries):
+                    entries = build_index(log, header.index(time_column(header)), every)
+                    write_index(path, entries)
+                position = bisect.bisect_left(entries, (start, -1)) - 1
+                if position >= 0:
+                    offset = entries[position][1]
+            rows = (_parse_record(record) for _, record in _records(log, offset))
+            yield from _select(header, rows, start, end, columns, filters)
@@ -0,0 +1,431 @@
+import io
+import os
+import re
+import csv
+import gzip
+import lzma
+import locale
+import time
+import shutil
+import sys
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from curio.workers import run_in_thread
+
+from .logindex import DEFAULT_INDEX_EVERY, index_path, time_column, parse_timestamp
+
+_OPEN_WRITERS = weakref.WeakSet()
+
+BINARY_LOG_EXTENSION = '.hlog'
+LOG_FORMATS = ('csv', 'binary')
+COMPRESSIONS = {'gzip': ('.gz', gzip.open), 'xz': ('.xz', lzma.open)}
+
+# closed segments are compressed and pruned one at a time, in a single background thread.
+_SEGMENTS_EXECUTOR = None
+
+
+def close_all_writers():
+    """Synchronously flush and close all the writers that are still open.
+
+    This is meant to be called on exit paths where the event loop is no longer running, e.g. from a signal handler.
+
+    """
+    for writer in list(_OPEN_WRITERS):
+        writer.close()
+
+
+def log_format(path, config):
+    """Return the format of a log file: the `format` option if given, otherwise it is deduced from the extension."""
+    default = 'binary' if path.endswith(BINARY_LOG_EXTENSION) else 'csv'
+    fmt = config.get('format', default)
+    if fmt not in LOG_FORMATS:
+        raise ValueError('Invalid log format {!r}. Valid formats: {}'.format(fmt, ', '.join(LOG_FORMATS)))
+    return fmt
+
+
+def check_compression(compression):
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError('Invalid compression {!r}. Valid compressions: {}'.format(
+            compression, ', '.join(COMPRESSIONS)
+        ))
+
+
+def _segments_executor():
+    global _SEGMENTS_EXECUTOR
+    if _SEGMENTS_EXECUTOR is None:
+        _SEGMENTS_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='heimdallr-segments')
+    return _SEGMENTS_EXECUTOR
+
+
+def list_segments(path):
+    """Return the paths of the closed segments of the log file `path`, from the oldest to the newest."""
+    directory, name = os.path.split(os.path.abspath(path))
+    root, extension = os.path.splitext(name)
+    segment_regex = re.compile(
+        re.escape(root) + r'\.(?P<stamp>\d{8}-\d{6})(?:-(?P<counter>\d+))?' + re.escape(extension) + r'(?:\.gz|\.xz)?'
+    )
+    segments = []
+    for segment_name in os.listdir(directory):
+        match = segment_regex.fullmatch(segment_name)
+        if match:
+            segments.append(((match['stamp'], int(match['counter'] or 0)), os.path.join(directory, segment_name)))
+    return [segment for _, segment in sorted(segments)]
+
+
+def _compress_segment(segment, compression):
+    extension, open_compressed = COMPRESSIONS[compression]
+    with open(segment, 'rb') as source, open_compressed(segment + extension, 'wb') as destination:
+        shutil.copyfileobj(source, destination)
+    os.remove(segment)
+
+
+def _apply_retention(path, keep_segments, keep_bytes):
+    """Remove the oldest segments of `path` until at most `keep_segments` segments of at most `keep_bytes` remain."""
+    segments = list_segments(path)
+    if keep_segments is not None:
+        for segment in segments[:max(0, len(segments) - keep_segments)]:
+            os.remove(segment)
+        segments = segments[max(0, len(segments) - keep_segments):]
+    if keep_bytes is not None:
+        sizes = [os.path.getsize(segment) for segment in segments]
+        while segments and sum(sizes) > keep_bytes:
+            os.remove(segments.pop(0))
+            sizes.pop(0)
+
+
+def _process_closed_segment(path, segment, compression, keep_segments, keep_bytes):
+    try:
+        # the segment may have already been removed by the retention policy applied to previous segments.
+        if compression is not None and os.path.exists(segment):
+            _compress_segment(segment, compression)
+        _apply_retention(path, keep_segments, keep_bytes)
+    except OSError as e:
+        sys.stderr.write('Error while processing log segment {0!r}.\n{1.__class__.__name__}: {1}\n'.format(segment, e))
+
+
+def _free_segment_name(root, stamp, counter, extension):
+    """Return the first name of a segment, and its counter, from `counter` on that is not used by another segment."""
+    segment = LogWriter._segment_name(root, stamp, counter, extension)
+    while any(os.path.exists(segment + suffix) for suffix in ('', '.gz', '.xz')):
+        counter += 1
+        segment = LogWriter._segment_name(root, stamp, counter, extension)
+    return segment, counter
+
+
+def log_columns(path, config):
+    """Return the columns at the beginning of the log file `path`, or None if the file is missing or empty."""
+    if not os.path.exists(path):
+        return None
+    if log_format(path, config) == 'binary':
+        from .binlog import BinaryLogReader
+        with BinaryLogReader(path) as reader:
+            return reader.columns
+    with open(path, newline='', encoding=locale.getpreferredencoding(False)) as log_file:
+        return next(csv.reader(log_file), None)
+
+
+def rotate_log(path, config):
+    """Rename the log file `path` to a closed segment, as the rotation of a writer with the options in `config` does.
+
+    This is used to start a new log when its columns change, once its writer was closed. The segment is named after
+    the current time, since the time at which the log was started is not known. Returns the name of the segment.
+
+    """
+    root, extension = os.path.splitext(path)
+    segment, _ = _free_segment_name(root, datetime.now().strftime('%Y%m%d-%H%M%S'), 0, extension)
+    os.rename(path, segment)
+    _segments_executor().submit(
+        _process_closed_segment, path, segment, config.get('compress'), config.get('keep_segments'),
+        config.get('keep_bytes')
+    )
+    return segment
+
+
+def create_log_writer(path, fieldnames, config):
+    """Create the writer for the log file of a resource, in the format selected by its configuration."""
+    if log_format(path, config) == 'binary':
+        from .binlog import BinaryLogWriter
+        return BinaryLogWriter.from_config(path, fieldnames, config)
+    return CsvLogWriter.from_config(path, fieldnames, config)
+
+
+class LogWriter:
+    """Base class of the long-lived writers of log files.
+
+    Rows are formatted into an in-memory buffer that is reused for the whole life of the writer and are written to
+    the file in groups by `commit`, with a single write performed in a worker thread.
+
+    By default every commit writes the buffered rows to the file. Passing `flush_interval` (in seconds) and/or
+    `flush_bytes` the buffered rows are written only once that many seconds passed since the last flush or once
+    the buffer contains at least that many bytes. If `fsync` is true the file is also synced to disk after each
+    flush.
+
+    The file is opened lazily on the first flush and kept open until `close` is called.
+
+    The log can be rotated once it reaches `rotate_bytes` bytes and/or at the end of every wall-clock period of
+    `rotate_interval` seconds, aligned to the Unix epoch (e.g. every hour, on the hour). Rotation happens right
+    after the first flush that follows one of these events. The current segment is then renamed adding the time
+    at which it was started to its name (e.g. `top.20240101-130000.csv`) and a new one is started at `path`.
+    Closed segments are compressed with `compression` (`gzip` or `xz`) in a background thread, after which the
+    oldest segments are removed so that at most `keep_segments` segments, amounting to at most `keep_bytes`
+    bytes, are kept.
+
+    Subclasses must define `_new_buffer`, `_open`, `writeheader` and `writerows` and may define `_start_segment`.
+
+    """
+
+    def __init__(self, path, fieldnames, flush_interval=None, flush_bytes=None, fsync=False,
+                 rotate_bytes=None, rotate_interval=None, compression=None, keep_segments=None, keep_bytes=None):
+        check_compression(compression)
+        self.path = path
+        self.fieldnames = fieldnames
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.fsync = fsync
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval = rotate_interval
+        self.compression = compression
+        self.keep_segments = keep_segments
+        self.keep_bytes = keep_bytes
+        self._buffer = self._new_buffer()
+        self._file = None
+        self._last_flush = time.monotonic()
+        self._segment_start = time.time()
+        self._last_segment = (None, 0)
+        self._lock = threading.RLock()
+        _OPEN_WRITERS.add(self)
+
+    @classmethod
+    def from_config(cls, path, fieldnames, config):
+        """Create a writer using the flushing and rotation options of a resource.
+
+        The options have the same names as the arguments of the writer, except for `compression` which is
+        given by the `compress` option.
+
+        """
+        return cls(
+            path,
+            fieldnames,
+            flush_interval=config.get('flush_interval'),
+            flush_bytes=config.get('flush_bytes'),
+            fsync=config.get('fsync', False),
+            rotate_bytes=config.get('rotate_bytes'),
+            rotate_interval=config.get('rotate_interval'),
+            compression=config.get('compress'),
+            keep_segments=config.get('keep_segments'),
+            keep_bytes=config.get('keep_bytes'),
+        )
+
+    def _new_buffer(self):
+        raise NotImplementedError
+
+    def _open(self):
+        """Open the log file for appending."""
+        raise NotImplementedError
+
+    def _start_segment(self):
+        """Called after the log was rotated, before anything is written to the new segment."""
+
+    def writeheader(self):
+        raise NotImplementedError
+
+    def writerows(self, rows):
+        """Format `rows` into the buffer. They will be written to the file by the next flush."""
+        raise NotImplementedError
+
+    def _flushed(self, offset, data):
+        """Called after `data` was written to the file starting at byte `offset`, before the log is rotated."""
+
+    @property
+    def pending_bytes(self):
+        """The size of the buffered rows once written to the file, in bytes."""
+        return self._buffer.tell()
+
+    def should_flush(self):
+        if not self._buffer.tell():
+            return False
+        if self.flush_interval is None and self.flush_bytes is None:
+            return True
+        if self._file is not None and self._should_rotate():
+            return True
+        if self.flush_bytes is not None and self.pending_bytes >= self.flush_bytes:
+            return True
+        return self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush(self):
+        """Write all the buffered rows to the file."""
+        with self._lock:
+            if self._file is None:
+                self._file = self._open()
+            data = self._buffer.getvalue()
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._flushed(offset, data)
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            self._last_flush = time.monotonic()
+            if self._should_rotate():
+                self._rotate()
+
+    @staticmethod
+    def _segment_name(root, stamp, counter, extension):
+        if counter:
+            return '{}.{}-{}{}'.format(root, stamp, counter, extension)
+        return '{}.{}{}'.format(root, stamp, extension)
+
+    def _should_rotate(self):
+        if self.rotate_bytes is not None and self._file.tell() >= self.rotate_bytes:
+            return True
+        if self.rotate_interval is not None:
+            return time.time() // self.rotate_interval != self._segment_start // self.rotate_interval
+        return False
+
+    def _rotate(self):
+        """Close the current segment, rename it and hand it over to the background thread."""
+        self._file.close()
+        self._file = None
+        root, extension = os.path.splitext(self.path)
+        stamp = datetime.fromtimestamp(self._segment_start).strftime('%Y%m%d-%H%M%S')
+        # segments started in the same second are numbered. The counter never goes back, even when the retention
+        # policy removes segments, so that the names always sort in chronological order.
+        counter = self._last_segment[1] + 1 if self._last_segment[0] == stamp else 0
+        segment, counter = _free_segment_name(root, stamp, counter, extension)
+        self._last_segment = (stamp, counter)
+        os.rename(self.path, segment)
+        self._segment_start = time.time()
+        self._start_segment()
+        _segments_executor().submit(
+            _process_closed_segment, self.path, segment, self.compression, self.keep_segments, self.keep_bytes
+        )
+
+    def close(self):
+        """Flush the buffered rows and close the file. Closing a writer twice is a no-op."""
+        with self._lock:
+            if self._buffer.tell():
+                self.flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            _OPEN_WRITERS.discard(self)
+
+    async def commit(self):
+        """End a group of rows, flushing them if the flush policy requires it."""
+        if self.should_flush():
+            await run_in_thread(self.flush)
+
+    async def aclose(self):
+        await run_in_thread(self.close)
+
+
+class _EncodedSizeBuffer(io.StringIO):
+    """A text buffer that keeps the number of bytes its content takes once encoded, in `encoded_size`."""
+
+    def __init__(self, encoding):
+        super().__init__()
+        self._target_encoding = encoding
+        self.encoded_size = 0
+
+    def write(self, text):
+        self.encoded_size += len(text.encode(self._target_encoding))
+        return super().write(text)
+
+    def truncate(self, size=None):
+        size = super().truncate(size)
+        if not size:
+            self.encoded_size = 0
+        return size
+
+
+class CsvLogWriter(LogWriter):
+    """A long-lived writer for a CSV log file.
+
+    Unless `index_every` is 0, the writer also maintains the sparse index of the log used by `heimdallr query`
+    (see `heimdallr.logindex`): every `index_every` rows the time of the row and its offset in the file are appended
+    to the index, when the row is flushed. The index of a rotated segment is removed, and rebuilt only if needed.
+
+    """
+
+    def __init__(self, path, fieldnames, index_every=DEFAULT_INDEX_EVERY, **kwargs):
+        self._encoding = locale.getpreferredencoding(False)
+        super().__init__(path, fieldnames, **kwargs)
+        self._writer = csv.DictWriter(self._buffer, fieldnames)
+        self._has_header = False
+        self.index_every = index_every
+        self._time_column = time_column(fieldnames)
+        self._rows_to_index = 0
+        self._pending_index = []
+
+    @classmethod
+    def from_config(cls, path, fieldnames, config):
+        """Create a writer like `LogWriter.from_config`, indexing a row every `index_every` rows."""
+        writer = super().from_config(path, fieldnames, config)
+        writer.index_every = config.get('index_every', DEFAULT_INDEX_EVERY)
+        return writer
+
+    def _new_buffer(self):
+        return _EncodedSizeBuffer(self._encoding)
+
+    @property
+    def pending_bytes(self):
+        # the buffer holds characters, and non-ASCII ones take more than a byte in the file: the buffer counts the
+        # bytes as they are written, rather than encoding all of it on every commit.
+        return self._buffer.encoded_size
+
+    def _remove_index(self):
+        try:
+            os.remove(index_path(self.path))
+        except FileNotFoundError:
+            pass
+
+    def _open(self):
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            # an index left by a log that was removed would point to the wrong rows.
+            self._remove_index()
+        return open(self.path, 'a', newline='', encoding=self._encoding)
+
+    def _start_segment(self):
+        self._remove_index()
+        self._rows_to_index = 0
+        if self._has_header:
+            self._writer.writeheader()
+
+    def writeheader(self):
+        with self._lock:
+            self._has_header = True
+            self._writer.writeheader()
+
+    def writerows(self, rows):
+        with self._lock:
+            if not self.index_every or self._time_column is None:
+                self._writer.writerows(rows)
+                return
+            rows = list(rows)
+            position = 0
+            while position < len(rows):
+                if self._rows_to_index <= 0:
+                    timestamp = parse_timestamp(rows[position].get(self._time_column))
+                    if timestamp is not None:
+                        self._pending_index.append((timestamp, self._buffer.tell()))
+                        self._rows_to_index = self.index_every
+                chunk = rows[position:position + max(self._rows_to_index, 1)]
+                self._writer.writerows(chunk)
+                position += len(chunk)
+                self._rows_to_index -= len(chunk)
+
+    def _flushed(self, offset, data):
+        if not self._pending_index:
+            return
+        encoding = self._file.encoding
+        entries = [
+            '{!r} {}\n'.format(timestamp, offset + len(data[:position].encode(encoding)))
+            for timestamp, position in self._pending_index
+        ]
+        self._pending_index = []
+        with open(index_path(self.path), 'a') as index_file:
+            index_file.writelines(entries)
@@ -3,32 +3,33 @@
 import os
 import re
 import ast
+import csv
 import sys
 import atexit
 import signal
+import socket
 import argparse
 import subprocess
 import configparser
 from contextlib import suppress
+from datetime import datetime
 
 import curio
+import curio.io
 
-from .utils import _pid_exists, name_of_temporary_file, create_gentle_killer
+from .agent import AgentSink, Collector, DEFAULT_SPOOL_ROWS
+from .history import HistoryStore, DEFAULT_HISTORY_SIZE
+from .parsing import PARSE_EXECUTORS
+from .instrumentation import profiling
+from .prometheus import MetricsRegistry, parse_address
+from .registry import PluginRegistry, PluginLoadError
+from .scheduler import Scheduler, Schedule, COALESCE, MISSED_TICKS_POLICIES
+from .logwriter import CsvLogWriter, LOG_FORMATS, close_all_writers
+from .utils import _pid_exists, name_of_temporary_file, create_gentle_killer, to_local_str, as_list, parse_interval
 
 
-def parse_interval(interval):
-    """Parse a time interval into the equivalent number of seconds:
-
-        >>> parse_interval("5s")
-        5
-        >>> parse_interval("2m")
-        120
-        >>> parse_interval("1.5h")
-        5472.0
-
-    """
-    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smh])', interval)
-    return float(match[1]) * ({'s': 1, 'm': 60, 'h': 60 * 60}[match[2]])
+# the options that can change without restarting a resource.
+SCHEDULING_OPTIONS = ('interval', 'missed_ticks')
 
 
 def parse_configuration_file(config_file):
@@ -72,28 +73,340 @@ def _parse_value(value):
 
 
 
+def _pop_header(headers, resource):
+    """Return whether `resource` still has to write its header, and mark it as written."""
+    write_header = resource in headers
+    headers.discard(resource)
+    return write_header
+
+
+async def _sample_sequentially(resources, headers):
+    """Sample the given resources one after the other.
+
+    `headers` is the set of resources that still have to write the header of their log file.
+
+    """
+    for resource, config in resources:
+        await resource.monitor(config, header=_pop_header(headers, resource))
+
+
+async def _sample_concurrently(resources, headers, busy=None, done=None):
+    """Sample the given resources concurrently, as tasks of a single task group.
+
+    Each resource is added to the `busy` set while its sample is being taken, so that the caller can avoid
+    starting a new sample of a resource whose previous sample is still running. The `done` event, if given, is
+    set whenever the sample of a resource ends.
+
+    """
+    busy = set() if busy is None else busy
+
+    async def sample(resource, config):
+        try:
+            await resource.monitor(config, header=_pop_header(headers, resource))
+        finally:
+            busy.discard(resource)
+            if done is not None:
+                await done.set()
+
+    async with curio.TaskGroup() as group:
+        for resource, config in resources:
+            busy.add(resource)
+            await group.spawn(sample, resource, config)
+    for exception in group.exceptions:
+        if exception is not None and not isinstance(exception, curio.CancelledError):
+            raise exception
+
+
+async def _log_lateness(lateness_writer, due):
+    """Write a row for each sampled resource with the lateness of its tick."""
+    now = to_local_str(datetime.now())
+    lateness_writer.writerows(
+        {
+            'datetime': now,
+            'resource': name,
+            'interval': schedule.interval,
+            'lateness': '{:.6f}'.format(lateness),
+            'missed_ticks': schedule.missed,
+        }
+        for (name, _, _), schedule, lateness in due
+    )
+    await lateness_writer.commit()
+
+
+def _resource_config(name, config, global_configuration):
+    """Complete the configuration of a resource with the options set by `run` (see its documentation)."""
+    config = dict(
+        config,
+        monitored_pid=global_configuration['pid'],
+        resource_name=name,
+        interval=config.get('interval', global_configuration['interval']),
+    )
+    if global_configuration.get('timeout') is not None:
+        config.setdefault('timeout', global_configuration['timeout'])
+    if global_configuration.get('parse_executor') is not None:
+        config.setdefault('parse_executor', global_configuration['parse_executor'])
+    return config
+
+
+def _diff_configurations(old, new):
+    """Compare two configurations of the resources, as completed by `_resource_config`.
+
+    Returns four sorted lists of names: the resources that were removed, those that were added, those whose options
+    changed and must be restarted, and those that only changed their `interval` or `missed_ticks` options and can
+    just be rescheduled. Adaptive and streamed resources are always restarted, since they also use their interval.
+
+    """
+    def without_scheduling(config):
+        return {key: value for key, value in config.items() if key not in SCHEDULING_OPTIONS}
+
+    removed = sorted(old.keys() - new.keys())
+    added = sorted(new.keys() - old.keys())
+    changed, rescheduled = [], []
+    for name in sorted(old.keys() & new.keys()):
+        if old[name] == new[name]:
+            continue
+        restart = old[name].get('adaptive') or old[name].get('stream')
+        if not restart and without_scheduling(old[name]) == without_scheduling(new[name]):
+            rescheduled.append(name)
+        else:
+            changed.append(name)
+    return removed, added, changed, rescheduled
+
+
+async def _wait_for_signal(signum, events):
+    """Set the `events` every time the process receives the signal `signum`, until cancelled.
+
+    The signal handler only writes a byte into a socket, which is read by this task, so that the events are set from
+    the event loop.
+
+    """
+    receiver, sender = socket.socketpair()
+    sender.setblocking(False)
+
+    def handler(*_):
+        with suppress(OSError):
+            sender.send(b'\0')
+
+    previous_handler = signal.signal(signum, handler)
+    receiver = curio.io.Socket(receiver)
+    try:
+        while True:
+            await receiver.recv(64)
+            for event in events:
+                await event.set()
+    finally:
+        signal.signal(signum, previous_handler)
+        sender.close()
+        await receiver.close()
+
+
 async def run(configuration, global_configuration, plugins):
-    """Mainloop that calls the `monitor_*` function and then sleeps for `interval` seconds."""
-    resources_instances = []
-    for resource, config in configuration.items():
-        resources_instances.append((plugins[resource].create_resource(config['logfile']), config))
+    """Mainloop that calls `Resource.monitor` for each resource whenever its next deadline is reached.
+
+    Each resource is sampled every `interval` seconds, taken from its own configuration or from the global one.
+    Deadlines are absolute, so the time spent sampling does not accumulate into drift. What happens when a deadline
+    is missed is decided by the `missed_ticks` policy (see `heimdallr.scheduler.Schedule`).
+
+    If `global_configuration['concurrent']` is true the resources due at the same time are sampled concurrently,
+    and a resource whose previous sample is still running is skipped.
+
+    Resources with adaptive sampling change their `sampling_interval` after each sample, and their schedule is
+    updated accordingly.
+
+    If `global_configuration['socket']` is given the last samples of each resource (`history` option, defaulting
+    to `global_configuration['history']`) are kept in memory and served on that Unix domain socket.
+
+    If `global_configuration['metrics_address']` is given the latest values of each resource are served over HTTP
+    at that address in the Prometheus text format (see `heimdallr.prometheus`). The rows of a resource are labelled
+    with the values of its `labels` option, defaulting to the `LABEL_COLUMNS` of the resource.
+
+    If `global_configuration['agent']` is given the samples of every resource are also sent to the `heimdallr collect`
+    server at that address, as `global_configuration['agent_host']` (see `heimdallr.agent.AgentSink`). On exit the
+    samples not sent yet are given a few seconds to reach the collector.
 
+    On SIGTERM or SIGINT (Ctrl-C) the samples still running are completed and the logs are flushed and closed before
+    returning, so that the rows buffered by the `flush_interval` and `flush_bytes` options are not lost.
+
+    If `global_configuration['reload_configuration']` is given, it is called whenever heimdallr receives SIGHUP to
+    get the new configuration of the resources. Only the resources whose configuration changed are closed and
+    recreated, the others keep sampling with their open logs and their state. If the function raises an exception,
+    or the new configuration is invalid, an error is written to stderr and the current configuration is kept.
+
+    The configuration of each resource is extended with the `monitored_pid` option, containing the pid of the
+    process monitored by heimdallr, if any, and the `resource_name` option, containing the name of the resource,
+    under which its metrics are recorded by `heimdallr.instrumentation`. The `interval` option is always set to
+    the interval of the resource, and the `timeout` and `parse_executor` options default to
+    `global_configuration['timeout']` and `global_configuration['parse_executor']`.
+
+    """
     pid = global_configuration['pid']
+    policy = global_configuration.get('missed_ticks', COALESCE)
+    verbose = global_configuration['verbose']
+    concurrent = global_configuration.get('concurrent', False)
+    lateness_log = global_configuration.get('lateness_log')
     write_header = global_configuration['write_header']
-    interval = global_configuration['interval']
+    socket_path = global_configuration.get('socket')
+    metrics_address = global_configuration.get('metrics_address')
+    reload_configuration = global_configuration.get('reload_configuration')
+    store = HistoryStore() if socket_path else None
+    registry = MetricsRegistry() if metrics_address else None
+    agent = None
+    if global_configuration.get('agent'):
+        agent = AgentSink(
+            global_configuration['agent'],
+            host=global_configuration.get('agent_host'),
+            spool_rows=global_configuration.get('spool_rows') or DEFAULT_SPOOL_ROWS,
+        )
+    default_history = global_configuration.get('history') or DEFAULT_HISTORY_SIZE
+    scheduler = Scheduler()
+    headers = set()
+
+    def add_resource(name, resource, config):
+        if store is not None:
+            resource.observers.append(store.create(name, config.get('history', default_history)))
+        if registry is not None:
+            resource.observers.append(registry.gauges(name, as_list(config.get('labels', resource.LABEL_COLUMNS))))
+        if agent is not None:
+            resource.observers.append(agent.observer(name))
+        if write_header:
+            headers.add(resource)
+        scheduler.add((name, resource, config), config['interval'], config.get('missed_ticks', policy))
+
+    async def remove_resource(item):
+        name, resource, _ = item
+        scheduler.remove(item)
+        headers.discard(resource)
+        if store is not None:
+            store.remove(name)
+        if registry is not None:
+            registry.remove(name)
+        await resource.close()
+
+    async def reload():
+        try:
+            new_configuration = {
+                name: _resource_config(name, config, global_configuration)
+                for name, config in reload_configuration().items()
+            }
+            if not new_configuration:
+                raise ValueError('No resources to monitor')
+            current = {item[0]: (item, schedule) for item, schedule in scheduler}
+            removed, added, changed, rescheduled = _diff_configurations(
+                {name: item[2] for name, (item, _) in current.items()}, new_configuration
+            )
+            for name in added + changed + rescheduled:
+                # check the options of the schedule before changing anything.
+                Schedule(new_configuration[name]['interval'], new_configuration[name].get('missed_ticks', policy))
+            created = {name: plugins[name].create_resource(new_configuration[name]['logfile'])
+                       for name in added + changed}
+            for name, resource in created.items():
+                # the options are otherwise checked by the first sample, once the current resources are gone.
+                resource.check_config(new_configuration[name])
+        except Exception as e:
+            sys.stderr.write('Invalid configuration, keeping the current one. {0.__class__.__name__}: {0}\n'.format(e))
+            return
+        # samples still running would use the resources that are going to be closed.
+        for tick in ticks:
+            await tick.join()
+        ticks.clear()
+        for name in removed + changed:
+            await remove_resource(current[name][0])
+        for name in added + changed:
+            add_resource(name, created[name], new_configuration[name])
+        for name in rescheduled:
+            (_, _, config), schedule = current[name]
+            config.clear()
+            config.update(new_configuration[name])
+            schedule.policy = config.get('missed_ticks', policy)
+            if schedule.interval != config['interval']:
+                schedule.set_interval(config['interval'])
+        if verbose:
+            sys.stderr.write('Configuration reloaded: {} added, {} removed, {} restarted, {} rescheduled.\n'.format(
+                len(added), len(removed), len(changed), len(rescheduled)
+            ))
+
+    for name, config in configuration.items():
+        config = _resource_config(name, config, global_configuration)
+        add_resource(name, plugins[name].create_resource(config['logfile']), config)
+
+    lateness_writer = None
+    if lateness_log:
+        lateness_writer = CsvLogWriter(lateness_log, ['datetime', 'resource', 'interval', 'lateness', 'missed_ticks'])
+        if write_header:
+            lateness_writer.writeheader()
+    busy = set()
+    done = curio.Event()
+    reload_requested = curio.Event()
+    stop_requested = curio.Event()
+    ticks = []
+    servers = []
+    # the handlers stay installed until the logs are closed, so that a second signal does not interrupt it.
+    stop_signals = [
+        await curio.spawn(_wait_for_signal, signum, [stop_requested, done], daemon=True)
+        for signum in (signal.SIGTERM, signal.SIGINT)
+    ]
+    if store is not None:
+        servers.append(await curio.spawn(store.serve, socket_path, daemon=True))
+    if registry is not None:
+        servers.append(await curio.spawn(registry.serve, *parse_address(metrics_address), daemon=True))
+    if reload_configuration is not None:
+        servers.append(await curio.spawn(_wait_for_signal, signal.SIGHUP, [reload_requested, done], daemon=True))
+    if agent is not None:
+        await agent.start()
 
     with suppress(KeyboardInterrupt):
-        while pid is None or _pid_exists(pid):
-            for resource, config in resources_instances:
-                await resource.monitor(config, header=write_header)
-            write_header = False
-            await curio.sleep(interval)
+        try:
+            while (pid is None or _pid_exists(pid)) and not stop_requested.is_set():
+                if reload_requested.is_set():
+                    reload_requested.clear()
+                    await reload()
+                due = scheduler.pop_due()
+                if concurrent:
+                    for tick in [tick for tick in ticks if tick.terminated]:
+                        ticks.remove(tick)
+                        await tick.join()
+                    still_running = [((name, resource, config), schedule, lateness)
+                                     for (name, resource, config), schedule, lateness in due if resource in busy]
+                    for (name, _, _), schedule, _ in still_running:
+                        schedule.missed += 1
+                        if verbose:
+                            sys.stderr.write('Skipping {!r}: still sampling from a previous tick.\n'.format(name))
+                    due = [item for item in due if item not in still_running]
+                if due and lateness_writer is not None:
+                    await _log_lateness(lateness_writer, due)
+                resources = [(resource, config) for (_, resource, config), _, _ in due]
+                if concurrent and resources:
+                    ticks.append(await curio.spawn(_sample_concurrently, resources, headers, busy, done))
+                elif resources:
+                    await _sample_sequentially(resources, headers)
+                for (_, resource, _), schedule in scheduler:
+                    if resource.sampling_interval is not None and resource.sampling_interval != schedule.interval:
+                        schedule.set_interval(resource.sampling_interval)
+                # a sample ending in the meantime may change the interval of its resource, and SIGHUP requires a reload.
+                await curio.ignore_after(scheduler.time_to_next_deadline(), done.wait())
+                done.clear()
+        finally:
+            for server in servers:
+                await server.cancel()
+            for tick in ticks:
+                await tick.join()
+            for (_, resource, _), _ in scheduler:
+                await resource.close()
+            if lateness_writer is not None:
+                await lateness_writer.aclose()
+            if agent is not None:
+                await agent.aclose()
+                lost_rows = agent.dropped_rows + agent.pending_rows
+                if verbose and lost_rows:
+                    sys.stderr.write('{} rows could not be sent to the collector.\n'.format(lost_rows))
+            for stop_signal in stop_signals:
+                await stop_signal.cancel()
 
 
 def _make_parser():
     parent_parser = argparse.ArgumentParser(add_help=False)
-    parent_parser.add_argument('-f', '--config-file', type=parse_configuration_file, default={},
-                               help='A configuration file.')
+    parent_parser.add_argument('-f', '--config-file', default=None,
+                               help='A configuration file. It is read again when heimdallr receives SIGHUP.')
     parent_parser.add_argument('-c', '--config', type=parse_configuration_string, default={},
                                help='A configuration string.')
     parent_parser.add_argument('-i', '--interval', type=parse_interval, default='30s',
@@ -106,6 +419,30 @@ def _make_parser():
                                help='Do not write the header to the log files when starting.')
     parent_parser.add_argument('-b', '--backup-bad-output-dir', default=None, metavar='DIR',
                                help='Directory where the backup outputs will be saved.')
+    parent_parser.add_argument('--concurrent', action='store_true',
+                               help='Sample all the resources concurrently instead of one after the other.')
+    parent_parser.add_argument('--missed-ticks', choices=MISSED_TICKS_POLICIES, default=COALESCE,
+                               help='What to do when a resource misses one or more deadlines.')
+    parent_parser.add_argument('--lateness-log', default=None, metavar='FILE',
+                               help='CSV file where the lateness of every tick is logged.')
+    parent_parser.add_argument('-t', '--timeout', type=parse_interval, default=None,
+                               help='Default timeout for sampling a resource. Syntax is the same as --interval.')
+    parent_parser.add_argument('--parse-executor', choices=PARSE_EXECUTORS, default=None,
+                               help='Where large command outputs are parsed: inline, in a thread or in a process.')
+    parent_parser.add_argument('--socket', default=None, metavar='PATH',
+                               help='Serve the last samples of each resource on the Unix domain socket PATH.')
+    parent_parser.add_argument('--history', type=int, default=DEFAULT_HISTORY_SIZE, metavar='N',
+                               help='Number of samples of each resource kept in memory for --socket.')
+    parent_parser.add_argument('--metrics-address', default=None, metavar='[HOST]:PORT',
+                               help='Serve the latest values of the resources at http://HOST:PORT/metrics.')
+    parent_parser.add_argument('--agent', default=None, metavar='ADDRESS',
+                               help='Send the samples to the heimdallr collect server at [HOST]:PORT or unix:PATH.')
+    parent_parser.add_argument('--agent-host', default=None, metavar='NAME',
+                               help='Name of this host for --agent. Defaults to the host name.')
+    parent_parser.add_argument('--spool-rows', type=int, default=DEFAULT_SPOOL_ROWS, metavar='N',
+                               help='Maximum number of rows kept while the collector of --agent cannot be reached.')
+    parent_parser.add_argument('--profile', nargs='?', const='-', default=None, metavar='FILE',
+                               help='Profile heimdallr and write a summary to FILE, or to stderr, on exit.')
 
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(dest='command')
@@ -120,11 +457,136 @@ def _make_parser():
     launch_parser.add_argument('--keep-alive', action='store_true', help='Keep running task when monitor process exits')
     launch_parser.add_argument('cmdline', nargs='+', metavar='CMD', help='The command to launch and monitor.')
 
+    export_parser = subparsers.add_parser('export', help='Convert a binary log file to CSV.')
+    export_parser.add_argument('logfile', metavar='LOGFILE', help='The binary log file to convert.')
+    export_parser.add_argument('-o', '--output', default='-', help='The CSV file to write. Defaults to stdout.')
+    export_parser.add_argument('--no-header', action='store_false', dest='write_header',
+                               help='Do not write the header to the CSV file.')
+
+    query_parser = subparsers.add_parser('query', help='Print the rows of a log taken in a time range, as CSV.')
+    query_parser.add_argument('logfile', metavar='LOGFILE', help='The log file to read.')
+    query_parser.add_argument('-s', '--start', type=parse_time, default=None,
+                              help='Only rows taken from this time, e.g. 2024-01-01T02:00.')
+    query_parser.add_argument('-e', '--end', type=parse_time, default=None,
+                              help='Only rows taken until this time, included.')
+    query_parser.add_argument('-c', '--columns', type=as_list, default=None,
+                              help='Comma separated list of the columns to print.')
+    query_parser.add_argument('-w', '--where', type=parse_filter, action='append', default=[], metavar='COLUMN=PATTERN',
+                              help='Only rows whose COLUMN matches the shell-style PATTERN. Can be repeated.')
+    query_parser.add_argument('--fill', type=parse_interval, default=None, metavar='INTERVAL',
+                              help='Rebuild a sample every INTERVAL from a log written with record=changes.')
+    query_parser.add_argument('--labels', type=as_list, default=[],
+                              help='Comma separated list of the columns identifying a row of a sample, for --fill.')
+    query_parser.add_argument('--max-age', type=parse_interval, default=None, metavar='INTERVAL',
+                              help='With --fill, leave out the rows not written for longer than INTERVAL.')
+    query_parser.add_argument('-o', '--output', default='-', help='The CSV file to write. Defaults to stdout.')
+    query_parser.add_argument('--no-header', action='store_false', dest='write_header',
+                              help='Do not write the header to the CSV file.')
+
+    collect_parser = subparsers.add_parser('collect', help='Receive the samples sent by heimdallr agents.')
+    collect_parser.add_argument('address', metavar='ADDRESS',
+                                help='The address to listen on, [HOST]:PORT or unix:PATH.')
+    collect_parser.add_argument('-d', '--directory', default='.',
+                                help='Directory where the logs of each host are written. Defaults to the current one.')
+    collect_parser.add_argument('--format', choices=LOG_FORMATS, default='csv', help='The format of the logs.')
+    collect_parser.add_argument('-q', '--quiet', action='store_false', dest='verbose',
+                                help="Don't write the connections of the agents to stderr.")
+
+    plugins_parser = subparsers.add_parser('plugins', help='List the available plugins.')
+    plugins_parser.add_argument('--load', action='store_true',
+                                help='Import every plugin, reporting the ones that cannot be loaded.')
+
     return parser
 
 
+def list_plugins(plugins, load=False):
+    """Write the name, aliases and origin of each plugin to stdout. Return False if a plugin could not be loaded."""
+    success = True
+    for name in plugins:
+        status = ''
+        if load:
+            try:
+                plugins.load(name)
+                status = 'ok'
+            except PluginLoadError as e:
+                status = 'error: {0.__class__.__name__}: {0}'.format(e.__cause__)
+                success = False
+        line = '{:<26} {:<40} {}'.format(name, ', '.join(plugins.aliases(name)), plugins.source(name))
+        sys.stdout.write((line + '  ' + status if status else line).rstrip() + '\n')
+    return success
+
+
+def parse_time(text):
+    """Parse a local date and time in ISO format (e.g. `2024-01-01T02:00` or `2024-01-01 02:00:00`) into a timestamp."""
+    return datetime.fromisoformat(text).timestamp()
+
+
+def parse_filter(text):
+    """Parse a `COLUMN=PATTERN` filter into a pair."""
+    column, separator, pattern = text.partition('=')
+    if not separator:
+        raise ValueError(text)
+    return column, pattern
+
+
+def query(args):
+    """Write the rows of a log selected by a time range, columns and filters as CSV (see `heimdallr.logindex`).
+
+    With `--fill` the log is densified with `heimdallr.changes.densify`, reading it from `--max-age` before the
+    start, or from the beginning, to find the values at the start.
+
+    """
+    from .logindex import query_log
+    if args.fill is None:
+        rows = query_log(args.logfile, args.start, args.end, args.columns, dict(args.where))
+    else:
+        from .changes import densify
+        start = args.start - args.max_age if args.start is not None and args.max_age is not None else None
+        rows = densify(
+            query_log(args.logfile, start, args.end, args.columns, dict(args.where)),
+            args.fill, args.labels, args.start, args.end, args.max_age,
+        )
+    header = next(rows, None)
+    out_file = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        writer = csv.writer(out_file)
+        if header is not None and args.write_header:
+            writer.writerow(header)
+        writer.writerows(rows)
+    finally:
+        if out_file is not sys.stdout:
+            out_file.close()
+
+
+def export(args):
+    """Stream the rows of a binary log file to a CSV file."""
+    from .binlog import export_to_csv
+    if args.output == '-':
+        export_to_csv(args.logfile, sys.stdout, header=args.write_header)
+    else:
+        with open(args.output, 'w', newline='') as out_file:
+            export_to_csv(args.logfile, out_file, header=args.write_header)
+
+
+async def _collect(collector, address):
+    with suppress(KeyboardInterrupt):
+        try:
+            await collector.serve(address)
+        finally:
+            await collector.aclose()
+
+
+def collect(args):
+    """Receive the samples of the agents, writing them to the logs of each host (see `heimdallr.agent.Collector`)."""
+    curio.run(_collect, Collector(args.directory, {'format': args.format}, args.verbose), args.address)
+
+
 def monitor(configuration, global_configuration, plugins):
-    return curio.run(run, configuration, global_configuration, plugins)
+    profile = global_configuration.get('profile')
+    if profile is None:
+        return curio.run(run, configuration, global_configuration, plugins)
+    with profiling(profile):
+        return curio.run(run, configuration, global_configuration, plugins)
 
 
 def _run_subprocess(cmdline, in_filename, out_filename, err_filename, preexec_fn=lambda: None):
@@ -202,7 +664,7 @@ def launch(configuration, global_configuration, plugins):
             preexec_fn=os.setsid,
         )
         global_configuration['pid'] = proc.pid
-        kill_gently = create_gentle_killer(proc, verbose)
+        kill_gently = create_gentle_killer(proc, verbose, on_exit=close_all_writers)
         victim_id = os.getpgid(proc.pid)
         atexit.register(kill_gently, victim_id)
         signal.signal(signal.SIGTERM, lambda _: kill_gently(victim_id))
@@ -211,6 +673,36 @@ def launch(configuration, global_configuration, plugins):
     monitor(configuration, global_configuration, plugins)
 
 
+def _resources_configuration(args, file_configuration, plugins):
+    """Return the configuration of the resources, from the configuration file, `-c` and `-r`, in this order.
+
+    Raises `ValueError` if a resource has no `logfile` option or is unknown, and `PluginLoadError` if its plugin
+    cannot be imported.
+
+    """
+    configuration = {name: options for name, options in file_configuration.items() if name != 'global_configuration'}
+    configuration.update(args.config)
+
+    if not configuration:
+        for resource, logfile in args.resources:
+            configuration[resource] = {
+                'logfile': logfile,
+            }
+    else:
+        for resource, resource_config in configuration.items():
+            if 'logfile' not in resource_config:
+                raise ValueError('You must specify logfile parameter for resource {!r}'.format(resource))
+
+    for resource in configuration:
+        try:
+            plugins.load(resource)
+        except KeyError:
+            raise ValueError(
+                'Unknown resource {!r}. Run `heimdallr plugins` to list the available ones.'.format(resource)
+            ) from None
+    return configuration
+
+
 def main():
     plugins = load_plugins()
 
@@ -218,30 +710,55 @@ def main():
     args = parser.parse_args()
     if not args.command:
         parser.error("You must specify either launch or monitor.")
+    if args.command == 'export':
+        export(args)
+        return
+    if args.command == 'collect':
+        collect(args)
+        return
+    if args.command == 'plugins':
+        sys.exit(0 if list_plugins(plugins, args.load) else 1)
+    if args.command == 'query':
+        try:
+            query(args)
+        except ValueError as e:
+            parser.error(str(e))
+        return
 
     global_config = {
         'pid': getattr(args, 'pid', None),
         'backup_bad_output': args.backup_bad_output_dir,
         'interval': args.interval,
         'write_header': args.write_header,
+        'concurrent': args.concurrent,
+        'missed_ticks': args.missed_ticks,
+        'lateness_log': args.lateness_log,
+        'profile': args.profile,
+        'timeout': args.timeout,
+        'parse_executor': args.parse_executor,
+        'socket': args.socket,
+        'history': args.history,
+        'metrics_address': args.metrics_address,
+        'agent': args.agent,
+        'agent_host': args.agent_host,
+        'spool_rows': args.spool_rows,
         'verbose': args.verbose,
         'resources': {}
     }
-    configuration = args.config_file.copy()
-    global_config.update(configuration.pop('global_configuration', {}))
-
+    try:
+        file_configuration = parse_configuration_file(args.config_file)
+    except (OSError, configparser.Error) as e:
+        sys.exit('Cannot read the configuration file: {}'.format(e))
+    global_config.update(file_configuration.get('global_configuration', {}))
     global_config.update(args.config.pop('global_configuration', {}))
-    configuration.update(args.config)
-
-    if not configuration:
-        for resource, logfile in args.resources:
-            configuration[resource] = {
-                'logfile': logfile,
-            }
-    else:
-        for resource, resource_config in configuration.items():
-            if 'logfile' not in resource_config:
-                sys.exit('You must specify logfile parameter for resource {!r}'.format(resource))
+    try:
+        configuration = _resources_configuration(args, file_configuration, plugins)
+    except (ValueError, PluginLoadError) as e:
+        sys.exit(str(e))
+    if args.config_file is not None:
+        global_config['reload_configuration'] = lambda: _resources_configuration(
+            args, parse_configuration_file(args.config_file), plugins
+        )
 
     if args.command == 'launch':
         global_config.update({
@@ -259,22 +776,8 @@ def main():
 
 
 def load_plugins():
-    from . import plugins as builtin_plugins
-    plugins = {mod_name: getattr(builtin_plugins, mod_name) for mod_name in builtin_plugins.__all__}
-    try:
-        import pkg_resources
-        for entry_point in pkg_resources.iter_entry_points('heimdallr.plugins'):
-            try:
-                plugins[entry_point.name] = entry_point.load()
-            except Exception:
-                pass
-    except ImportError:
-        # no setuptools. Plugins are not supported.
-        pass
-    for mod in list(plugins.values()):
-        for alias in getattr(mod, 'aliases', ()):
-            plugins[alias] = mod
-    return plugins
+    """Return the registry of the available plugins. The plugins are imported only when they are looked up."""
+    return PluginRegistry()
 
 
 if __name__ == '__main__':
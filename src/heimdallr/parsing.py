@@ -0,0 +1,43 @@
+from curio.workers import run_in_thread, run_in_process
+
+INLINE = 'inline'
+THREAD = 'thread'
+PROCESS = 'process'
+
+PARSE_EXECUTORS = (INLINE, THREAD, PROCESS)
+DEFAULT_PARSE_THRESHOLD = 64 * 1024
+
+
+def check_parse_executor(executor):
+    if executor not in PARSE_EXECUTORS:
+        raise ValueError('Invalid parse executor {!r}. Valid executors: {}'.format(
+            executor, ', '.join(PARSE_EXECUTORS)
+        ))
+
+
+def select_parse_executor(config, size):
+    """Return the executor that parses an output of `size` characters: `inline`, `thread` or `process`.
+
+    The `parse_executor` option (`inline` by default) is used only for outputs of at least `parse_threshold`
+    characters (64 KiB by default). Smaller outputs are always parsed inline, since handing them to a worker would
+    cost more than parsing them.
+
+    """
+    executor = config.get('parse_executor', INLINE)
+    check_parse_executor(executor)
+    if size < config.get('parse_threshold', DEFAULT_PARSE_THRESHOLD):
+        return INLINE
+    return executor
+
+
+async def run_parser(executor, function, *args):
+    """Call `function(*args)` inline, in a worker thread or in a worker process, depending on `executor`.
+
+    In a worker process `function` and its arguments are pickled, and its result is pickled back.
+
+    """
+    if executor == THREAD:
+        return await run_in_thread(function, *args)
+    if executor == PROCESS:
+        return await run_in_process(function, *args)
+    return function(*args)
@@ -1,6 +1,22 @@
-from . import cpu_temperatures
-from . import disk_usage
-from . import nvidia_smi
-from . import top
+"""The builtin plugins, by module name, with their aliases.
 
-__all__ = [name for name in locals().keys() if not name.startswith('_')]
\ No newline at end of file
+The plugin modules are imported only when one of their resources is used (see `heimdallr.registry`), so their
+aliases are listed here rather than in an `aliases` attribute of each module, like plugins of other packages do.
+
+"""
+
+BUILTIN_PLUGINS = {
+    'cpu_temperatures': ('temps', 'temperatures'),
+    'disk_usage': ('disk',),
+    'files_size': ('files',),
+    'heimdallr_self': ('self', 'heimdallr-self'),
+    'native_cpu_temperatures': ('native-temps', 'native-temperatures'),
+    'native_disk_usage': ('native-disk',),
+    'native_files_size': ('native-files',),
+    'native_top': ('native-cpu-and-ram', 'native-cpu'),
+    'nvidia_smi': ('gpu', 'graphics-card'),
+    'process_tree': ('tree', 'proc-tree'),
+    'top': ('cpu-and-ram', 'cpu'),
+}
+
+__all__ = sorted(BUILTIN_PLUGINS)
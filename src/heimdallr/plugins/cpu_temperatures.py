@@ -6,6 +6,8 @@ from ..resource import SimpleCommandResource
 class CpuTemps(SimpleCommandResource):
     """Temperatures of the CPU cores"""
 
+    LABEL_COLUMNS = ('core',)
+
     SENSORS_REGEX = re.compile(
         r'''
             (?P<core>Core\s+\d+):\s*(?P<temp>[-+]?\d+\.\d+°C)\s*
@@ -36,4 +38,3 @@ class CpuTemps(SimpleCommandResource):
 
 
 create_resource = CpuTemps
-aliases = ('temps', 'temperatures')
\ No newline at end of file
@@ -7,13 +7,16 @@ from ..resource import MultiCommandResource
 
 class DiskUsage(MultiCommandResource):
 
+    COLUMN_NAMES = ['datetime', 'filesystem', 'type',
+                    'size', 'memory used', 'memory available', 'perc memory used',
+                    'num inodes', 'inodes used', 'inodes available', 'perc inodes used',
+                    'mount point'
+                    ]
+    LABEL_COLUMNS = ('filesystem', 'type', 'mount point')
+
     @property
     def column_names(self) -> List[str]:
-        return ['datetime', 'filesystem', 'type',
-                'size', 'memory used', 'memory available', 'perc memory used',
-                'num inodes', 'inodes used', 'inodes available', 'perc inodes used',
-                'mount point'
-                ]
+        return self.COLUMN_NAMES
 
     def make_cmdlines(self, config):
         memory_usage = ['df', '-hT']
@@ -62,4 +65,3 @@ class DiskUsage(MultiCommandResource):
 
 
 create_resource = DiskUsage
-aliases = ['disk']
\ No newline at end of file
@@ -7,6 +7,8 @@ from ..resource import SimpleCommandResource
 
 class FilesSize(SimpleCommandResource):
 
+    LABEL_COLUMNS = ('path',)
+
     def __init__(self, output_file):
         super().__init__(output_file, table_output=True)
 
@@ -26,4 +28,3 @@ class FilesSize(SimpleCommandResource):
 
 
 create_resource = FilesSize
-aliases = ['files']
\ No newline at end of file
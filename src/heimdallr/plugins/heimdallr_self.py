@@ -0,0 +1,99 @@
+import os
+import time
+from datetime import datetime
+from typing import List
+
+from .. import procfs
+from ..instrumentation import STATS, PHASES, COUNTERS, Histogram
+from ..resource import Resource
+from ..utils import to_local_str
+
+
+class HeimdallrSelf(Resource):
+    """The overhead of heimdallr itself.
+
+    Each sample writes one row for each phase of sampling each resource (see `heimdallr.instrumentation.PHASES`)
+    with the number of samples and the latency statistics, in seconds, of the phase since the previous sample.
+    The rows of the `total` phase contain also the number of parse failures, of backups of the bad outputs, of
+    restarts of streaming commands and of timeouts since the previous sample.
+
+    A final row, with resource `heimdallr` and phase `process`, contains the CPU time used by heimdallr and by the
+    commands it ran, the percentage of CPU used by heimdallr since the previous sample and its resident memory.
+
+    """
+
+    COLUMN_NAMES = [
+        'datetime', 'resource', 'phase', 'count', 'mean', 'p50', 'p90', 'p99', 'max',
+        'parse_failures', 'backups', 'restarts', 'timeouts', 'cpu_time', 'children_cpu_time', 'perc_cpu', 'rss',
+    ]
+    LABEL_COLUMNS = ('resource', 'phase')
+
+    def __init__(self, output_file, proc_root=procfs.PROC_ROOT):
+        super().__init__(output_file)
+        self._proc_root = proc_root
+        self._previous_histograms = {}
+        self._previous_counters = {}
+        self._previous_cpu_time = None
+        self._previous_time = None
+
+    @property
+    def column_names(self) -> List[str]:
+        return self.COLUMN_NAMES
+
+    @staticmethod
+    def _seconds(value):
+        return 'N/A' if value is None else '{:.6f}'.format(value)
+
+    async def fetch_data(self, config):
+        now = to_local_str(datetime.now())
+        histograms, counters = STATS.snapshot()
+        for resource in sorted({resource for resource, _ in histograms} | {resource for resource, _ in counters}):
+            for phase in PHASES:
+                key = (resource, phase)
+                if key not in histograms:
+                    continue
+                histogram = histograms[key]
+                window = histogram - self._previous_histograms.get(key, Histogram())
+                self._previous_histograms[key] = histogram
+                row = dict.fromkeys(self.COLUMN_NAMES, 'N/A')
+                row.update({
+                    'datetime': now,
+                    'resource': resource,
+                    'phase': phase,
+                    'count': window.count,
+                    'mean': self._seconds(window.mean),
+                    'p50': self._seconds(window.percentile(0.5)),
+                    'p90': self._seconds(window.percentile(0.9)),
+                    'p99': self._seconds(window.percentile(0.99)),
+                    'max': self._seconds(window.max if window.count else None),
+                })
+                if phase == 'total':
+                    for counter in COUNTERS:
+                        total = counters.get((resource, counter), 0)
+                        row[counter] = total - self._previous_counters.get((resource, counter), 0)
+                        self._previous_counters[resource, counter] = total
+                yield row
+        yield self._process_row(now)
+
+    def _process_row(self, now):
+        row = dict.fromkeys(self.COLUMN_NAMES, 'N/A')
+        row.update({'datetime': now, 'resource': 'heimdallr', 'phase': 'process'})
+        times = os.times()
+        cpu_time = times.user + times.system
+        row['cpu_time'] = '{:.2f}'.format(cpu_time)
+        row['children_cpu_time'] = '{:.2f}'.format(times.children_user + times.children_system)
+        current_time = time.monotonic()
+        if self._previous_cpu_time is not None and current_time > self._previous_time:
+            row['perc_cpu'] = '{:.1f}'.format(
+                100 * (cpu_time - self._previous_cpu_time) / (current_time - self._previous_time)
+            )
+        self._previous_cpu_time, self._previous_time = cpu_time, current_time
+        try:
+            statm = procfs.read_text(os.path.join(self._proc_root, 'self', 'statm'))
+            row['rss'] = int(statm.split()[1]) * procfs.PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            pass
+        return row
+
+
+create_resource = HeimdallrSelf
@@ -0,0 +1,121 @@
+import os
+import re
+from datetime import datetime
+from fnmatch import fnmatch
+from typing import List
+
+from ..resource import Resource
+from ..utils import to_local_str, as_list
+
+SYSFS_ROOT = '/sys'
+CPU_CHIPS = ('coretemp', 'k10temp', 'zenpower', 'cpu_thermal', 'soc_thermal')
+
+
+def _read_text(path):
+    try:
+        with open(path) as sysfs_file:
+            return sysfs_file.read().strip()
+    except OSError:
+        return None
+
+
+class TemperatureSensor:
+    """A `temp<N>` sensor of a hwmon device, with the file descriptors of its `_input`, `_max` and `_crit` files."""
+
+    def __init__(self, label, input_path):
+        self.label = label
+        prefix = input_path[:-len('_input')]
+        self._fds = []
+        for path in (input_path, prefix + '_max', prefix + '_crit'):
+            try:
+                self._fds.append(os.open(path, os.O_RDONLY))
+            except OSError:
+                self._fds.append(None)
+
+    @staticmethod
+    def _pread(fd):
+        if fd is None:
+            return 'N/A'
+        try:
+            millidegrees = int(os.pread(fd, 32, 0))
+        except (OSError, ValueError):
+            return 'N/A'
+        return '{:+.1f}°C'.format(millidegrees / 1000)
+
+    def read(self):
+        """Return the current, high and critical temperatures formatted like the output of `sensors`."""
+        return [self._pread(fd) for fd in self._fds]
+
+    def close(self):
+        for fd in self._fds:
+            if fd is not None:
+                os.close(fd)
+        self._fds = [None] * len(self._fds)
+
+
+def discover_sensors(sysfs_root=SYSFS_ROOT, chips=CPU_CHIPS) -> List[TemperatureSensor]:
+    """Find the temperature sensors of the hwmon devices whose name matches one of the `chips` patterns."""
+    hwmon_dir = os.path.join(sysfs_root, 'class', 'hwmon')
+    try:
+        devices = sorted(os.listdir(hwmon_dir), key=lambda name: [int(n) for n in re.findall(r'\d+', name)])
+    except OSError:
+        return []
+    sensors = []
+    for device in devices:
+        device_dir = os.path.join(hwmon_dir, device)
+        chip = _read_text(os.path.join(device_dir, 'name')) or device
+        if not any(fnmatch(chip, pattern) for pattern in chips):
+            continue
+        inputs = [name for name in os.listdir(device_dir) if re.fullmatch(r'temp\d+_input', name)]
+        for name in sorted(inputs, key=lambda name: int(re.search(r'\d+', name)[0])):
+            path = os.path.join(device_dir, name)
+            label = _read_text(path[:-len('_input')] + '_label') or '{} {}'.format(chip, name[:-len('_input')])
+            sensors.append(TemperatureSensor(label, path))
+    return sensors
+
+
+class NativeCpuTemps(Resource):
+    """Temperatures of the CPU cores, read from the hwmon devices in sysfs.
+
+    The sensors are discovered on the first sample and their files are kept open, so that every following sample
+    only needs one `pread` for each value. The `chips` option selects the hwmon devices by name, with shell-style
+    wildcards. By default only known CPU sensors are used, use `chips=*` to read every temperature sensor.
+
+    The `sysfs_root` option replaces `/sys`, e.g. to read the sysfs of a host from a container or a fake tree.
+
+    """
+
+    COLUMN_NAMES = ['datetime', 'core', 'temp', 'high_temp', 'crit_temp']
+    LABEL_COLUMNS = ('core',)
+
+    def __init__(self, output_file, sysfs_root=SYSFS_ROOT):
+        super().__init__(output_file)
+        self._sysfs_root = sysfs_root
+        self._sensors = None
+
+    @property
+    def column_names(self) -> List[str]:
+        return self.COLUMN_NAMES
+
+    async def fetch_data(self, config):
+        if self._sensors is None:
+            self._sensors = discover_sensors(
+                config.get('sysfs_root', self._sysfs_root), as_list(config.get('chips', CPU_CHIPS))
+            )
+        now = to_local_str(datetime.now())
+        for sensor in self._sensors:
+            temp, high_temp, crit_temp = sensor.read()
+            yield {'datetime': now, 'core': sensor.label, 'temp': temp, 'high_temp': high_temp, 'crit_temp': crit_temp}
+        if not self._sensors:
+            row_data = dict.fromkeys(self.COLUMN_NAMES, 'N/A')
+            row_data['datetime'] = now
+            yield row_data
+
+    async def close(self):
+        for sensor in self._sensors or ():
+            sensor.close()
+        self._sensors = None
+        await super().close()
+
+
+create_resource = NativeCpuTemps
@@ -0,0 +1,125 @@
+import os
+import select
+from datetime import datetime
+from fnmatch import fnmatch
+from typing import List
+
+from .disk_usage import DiskUsage
+from .. import procfs
+from ..resource import Resource
+from ..utils import to_local_str, as_list
+
+
+def _percentage(used, available):
+    total = used + available
+    return '{:.1f}%'.format(100 * used / total) if total else '-'
+
+
+class MountTable:
+    """The mount table read from a `mountinfo` file.
+
+    The table is re-read only when the kernel notifies a change in the mount table, which is signalled by
+    `poll` returning `POLLPRI` on the open `mountinfo` file.
+
+    """
+
+    def __init__(self, path):
+        self._file = open(path)
+        self._poller = select.poll()
+        self._poller.register(self._file, select.POLLPRI | select.POLLERR)
+        self._mounts = self._read()
+
+    def _read(self):
+        self._file.seek(0)
+        return procfs.parse_mountinfo(self._file.read())
+
+    @property
+    def mounts(self):
+        if self._poller.poll(0):
+            self._mounts = self._read()
+        return self._mounts
+
+    def close(self):
+        self._file.close()
+
+
+class NativeDiskUsage(Resource):
+    """Usage of the mounted filesystems, computed with `os.statvfs` on every mount point in `/proc/self/mountinfo`.
+
+    Sizes are exact byte counts. Filesystems with no blocks (e.g. `proc` or `sysfs`) are skipped, like `df` does.
+
+    The following options can be used to filter the mounts, with shell-style wildcards:
+
+     - `include_types`/`exclude_types`: filesystem types to include/exclude (e.g. `exclude_types=tmpfs overlay`).
+     - `include_mounts`/`exclude_mounts`: mount points to include/exclude (e.g. `exclude_mounts=/run/*`).
+
+    """
+
+    LABEL_COLUMNS = DiskUsage.LABEL_COLUMNS
+
+    def __init__(self, output_file, proc_root=procfs.PROC_ROOT):
+        super().__init__(output_file)
+        self._mountinfo_path = os.path.join(proc_root, 'self', 'mountinfo')
+        self._mount_table = None
+
+    @property
+    def column_names(self) -> List[str]:
+        return DiskUsage.COLUMN_NAMES
+
+    async def fetch_data(self, config):
+        for row in await self.run_in_thread(self.read_sample, config):
+            yield row
+
+    def read_sample(self, config):
+        """Call `os.statvfs` on all the mounts selected by the configuration. This may block on network mounts."""
+        if self._mount_table is None:
+            self._mount_table = MountTable(self._mountinfo_path)
+        now = to_local_str(datetime.now())
+        rows = []
+        for mount in self._mount_table.mounts:
+            if not self._is_selected(mount, config):
+                continue
+            try:
+                stat = os.statvfs(mount['mount_point'])
+            except OSError:
+                continue
+            if not stat.f_blocks:
+                continue
+            used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+            available = stat.f_bavail * stat.f_frsize
+            used_inodes = stat.f_files - stat.f_ffree
+            rows.append({
+                'datetime': now,
+                'filesystem': mount['source'],
+                'type': mount['type'],
+                'size': stat.f_blocks * stat.f_frsize,
+                'memory used': used,
+                'memory available': available,
+                'perc memory used': _percentage(used, available),
+                'num inodes': stat.f_files,
+                'inodes used': used_inodes,
+                'inodes available': stat.f_favail,
+                'perc inodes used': _percentage(used_inodes, stat.f_favail),
+                'mount point': mount['mount_point'],
+            })
+        return rows
+
+    @staticmethod
+    def _is_selected(mount, config):
+        for option, key in (('types', 'type'), ('mounts', 'mount_point')):
+            included = as_list(config.get('include_' + option))
+            excluded = as_list(config.get('exclude_' + option))
+            if included and not any(fnmatch(mount[key], pattern) for pattern in included):
+                return False
+            if any(fnmatch(mount[key], pattern) for pattern in excluded):
+                return False
+        return True
+
+    async def close(self):
+        if self._mount_table is not None:
+            self._mount_table.close()
+            self._mount_table = None
+        await super().close()
+
+
+create_resource = NativeDiskUsage
@@ -0,0 +1,172 @@
+import os
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Set
+
+from ..resource import Resource
+from ..utils import to_local_str
+
+
+class _CachedDirectory:
+    """The entries of a directory, which are valid as long as the directory's mtime does not change."""
+
+    __slots__ = ('mtime_ns', 'files', 'subdirs')
+
+    def __init__(self, mtime_ns, files, subdirs):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.subdirs = subdirs
+
+
+class DirectoryScanner:
+    """Computes the apparent size of a path, like `du -sb`, scanning it incrementally.
+
+    The names of the files and the subdirectories of each directory are cached together with the mtime of the
+    directory, and a directory is listed again only when its mtime changes. Since the mtime of a directory does not
+    change when one of its files grows in place, the files are still `lstat`-ed on every scan, which only saves
+    reading the unchanged directories. Like `du`, a file with many hard links is counted once, by its device and
+    inode numbers.
+
+    A scan can be interrupted when a deadline is reached. The next call to `scan` resumes from where the previous
+    one stopped.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.total = None
+        self._cache = {}
+        self._pending = None
+        self._visited = None
+        self._inodes = None
+        self._partial_total = 0
+        self._exists = False
+
+    @property
+    def partial_total(self):
+        return self._partial_total
+
+    def scan(self, deadline=None):
+        """Scan the path until the scan is complete or `time.monotonic()` reaches `deadline`.
+
+        Returns `True` if the scan was completed, in which case `total` contains the size of the path, or `None` if
+        the path does not exist.
+
+        """
+        if self._pending is None:
+            self._pending = [self.path]
+            self._visited = set()
+            self._inodes = set()
+            self._partial_total = 0
+            self._exists = False
+        while self._pending:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            path = self._pending.pop()
+            try:
+                path_stat = os.lstat(path)
+            except OSError:
+                continue
+            self._exists = True
+            if not stat.S_ISDIR(path_stat.st_mode):
+                self._add_file(path_stat)
+                continue
+            self._visited.add(path)
+            cached = self._cache.get(path)
+            if cached is None or cached.mtime_ns != path_stat.st_mtime_ns:
+                cached = self._cache[path] = self._list_directory(path, path_stat)
+            self._partial_total += path_stat.st_size
+            for name in cached.files:
+                try:
+                    self._add_file(os.lstat(os.path.join(path, name)))
+                except OSError:
+                    # the file was removed after the directory was listed.
+                    pass
+            self._pending.extend(os.path.join(path, name) for name in cached.subdirs)
+        self.total = self._partial_total if self._exists else None
+        self._cache = {path: self._cache[path] for path in self._visited}
+        self._pending = self._visited = self._inodes = None
+        return True
+
+    def _add_file(self, file_stat):
+        if file_stat.st_nlink > 1:
+            inode = (file_stat.st_dev, file_stat.st_ino)
+            if inode in self._inodes:
+                return
+            self._inodes.add(inode)
+        self._partial_total += file_stat.st_size
+
+    @staticmethod
+    def _list_directory(path, directory_stat):
+        files, subdirs = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        (subdirs if entry.is_dir(follow_symlinks=False) else files).append(entry.name)
+                    except OSError:
+                        # the entry was removed while we were scanning the directory.
+                        pass
+        except OSError:
+            pass
+        return _CachedDirectory(directory_stat.st_mtime_ns, files, subdirs)
+
+
+class NativeFilesSize(Resource):
+    """Size of files and directories, computed by scanning them with `os.scandir` instead of running `du`.
+
+    The paths listed in the `files` option are scanned in parallel by a pool of `workers` threads (4 by default).
+    If `time_budget` is given, each sample stops scanning after that many seconds and the scan is resumed in the
+    next sample. In this case the row reports the size computed by the last complete scan, or the partial size if
+    no scan was completed yet, and its `status` is `stale`. Rows of completed scans have status `exact`.
+
+    """
+
+    COLUMN_NAMES = ['datetime', 'path', 'size', 'status']
+    LABEL_COLUMNS = ('path',)
+    TEXT_COLUMNS = ('status',)
+
+    def __init__(self, output_file):
+        super().__init__(output_file)
+        self._scanners = {}
+        self._executor = None
+
+    @property
+    def column_names(self) -> List[str]:
+        return self.COLUMN_NAMES
+
+    @classmethod
+    def required_options(cls) -> Set[str]:
+        return {'files'}
+
+    async def fetch_data(self, config):
+        files = config['files']
+        paths = [files] if isinstance(files, str) else list(files)
+        self._scanners = {path: self._scanners.get(path) or DirectoryScanner(path) for path in paths}
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=config.get('workers', 4))
+        time_budget = config.get('time_budget')
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        scanners = list(self._scanners.values())
+        completed = await self.run_in_thread(self._scan_all, scanners, deadline)
+        now = to_local_str(datetime.now())
+        for scanner, is_complete in zip(scanners, completed):
+            if is_complete:
+                size, status = scanner.total if scanner.total is not None else 'N/A', 'exact'
+            else:
+                size, status = scanner.total if scanner.total is not None else scanner.partial_total, 'stale'
+            yield {'datetime': now, 'path': scanner.path, 'size': size, 'status': status}
+
+    def _scan_all(self, scanners, deadline):
+        return list(self._executor.map(lambda scanner: scanner.scan(deadline), scanners))
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        await super().close()
+
+
+create_resource = NativeFilesSize
@@ -0,0 +1,185 @@
+import os
+import pwd
+import struct
+import time
+from datetime import datetime
+from typing import List
+
+from .top import Top
+from .. import procfs
+from ..resource import Resource
+from ..utils import to_local_str
+
+UTMP_PATH = '/var/run/utmp'
+UTMP_RECORD_SIZE = 384
+UTMP_USER_PROCESS = 7
+
+
+def count_users(utmp_path=UTMP_PATH):
+    """Return the number of logged in users, as the number of `USER_PROCESS` records in the utmp file."""
+    try:
+        with open(utmp_path, 'rb') as utmp:
+            data = utmp.read()
+    except OSError:
+        return 'N/A'
+    return sum(
+        struct.unpack_from('<h', data, offset)[0] == UTMP_USER_PROCESS
+        for offset in range(0, len(data) - UTMP_RECORD_SIZE + 1, UTMP_RECORD_SIZE)
+    )
+
+
+def format_uptime(seconds):
+    """Format the system uptime like `top` does in its first line."""
+    minutes = int(seconds // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return '{} day{}'.format(days, 's' if days > 1 else '')
+    if hours:
+        return '{}:{:02d}'.format(hours, minutes)
+    return '{} min'.format(minutes)
+
+
+def format_cpu_time(ticks):
+    """Format the CPU time used by a process like the `TIME+` column of `top`."""
+    hundredths = ticks * 100 // procfs.CLOCK_TICKS
+    minutes, hundredths = divmod(hundredths, 60 * 100)
+    return '{}:{:02d}.{:02d}'.format(minutes, hundredths // 100, hundredths % 100)
+
+
+class NativeTop(Resource):
+    """Usage of CPU, Ram, swap etc. Implemented by reading the files under `/proc`.
+
+    The columns are the same as those of the `top` resource. CPU percentages are computed from the difference
+    between the CPU times read in consecutive samples, so the first sample reports the averages since boot
+    (for the whole system) or since the start of each process.
+
+    When the `pid` option is given only the files of that process are read.
+
+    """
+
+    TEXT_COLUMNS = Top.TEXT_COLUMNS
+    PROCESS_COLUMNS = Top.PROCESS_COLUMNS
+    PROCESS_SORT_COLUMNS = Top.PROCESS_SORT_COLUMNS
+
+    def __init__(self, output_file, proc_root=procfs.PROC_ROOT):
+        super().__init__(output_file)
+        self._proc_root = proc_root
+        self._previous_cpu_times = None
+        self._previous_proc_times = {}
+        self._previous_time = None
+        self._users = {}
+
+    @property
+    def column_names(self) -> List[str]:
+        regex = Top.TOP_REGEX
+        return ['datetime'] + sorted(regex.groupindex.keys(), key=regex.groupindex.get)
+
+    async def fetch_data(self, config):
+        yield await self.run_in_thread(self.read_sample, config)
+
+    def read_sample(self, config):
+        """Read all the information needed for a sample. This performs blocking reads on the `/proc` files."""
+        now = datetime.now()
+        info = {'datetime': to_local_str(now), 'time': now.strftime('%H:%M:%S')}
+        uptime = procfs.read_uptime(self._proc_root)
+        info['uptime'] = format_uptime(uptime)
+        info['num_users'] = count_users()
+        info['load_avg_1'], info['load_avg_2'], info['load_avg_3'] = procfs.read_loadavg(self._proc_root)
+        info.update(self._cpu_usage())
+        meminfo = procfs.read_meminfo(self._proc_root)
+        info.update(self._memory_usage(meminfo))
+
+        pid = config.get('pid')
+        pids = [pid] if pid is not None else procfs.list_pids(self._proc_root)
+        elapsed = time.monotonic() - self._previous_time if self._previous_time is not None else None
+        self._previous_time = time.monotonic()
+        procs = []
+        proc_times = {}
+        for pid in pids:
+            try:
+                stat = procfs.read_pid_stat(pid, self._proc_root)
+                procs.append(self._process_info(stat, meminfo['MemTotal'], uptime, elapsed))
+            except (OSError, ValueError, IndexError):
+                # the process exited while we were reading its files.
+                continue
+            proc_times[stat['pid']] = stat['utime'] + stat['stime']
+        self._previous_proc_times = proc_times
+
+        states = [proc.pop('state') for proc in procs]
+        info['num_tasks'] = len(procs)
+        info['num_running_tasks'] = states.count('R')
+        info['num_sleeping_tasks'] = states.count('S') + states.count('D') + states.count('I')
+        info['num_stopped_tasks'] = states.count('T') + states.count('t')
+        info['num_zombie_tasks'] = states.count('Z')
+        self.store_processes(info, procs, config)
+        return info
+
+    def _cpu_usage(self):
+        cpu_times = procfs.read_cpu_times(self._proc_root)
+        if self._previous_cpu_times is None:
+            deltas = cpu_times
+        else:
+            deltas = {name: value - self._previous_cpu_times.get(name, 0) for name, value in cpu_times.items()}
+        self._previous_cpu_times = cpu_times
+        total = sum(deltas.values()) or 1
+        columns = {
+            'user': 'user_cpu', 'system': 'system_cpu', 'nice': 'ni_cpu', 'idle': 'id_cpu',
+            'iowait': 'wa_cpu', 'irq': 'hi_cpu', 'softirq': 'si_cpu', 'steal': 'st_cpu',
+        }
+        return {column: '{:.1f}'.format(100 * deltas.get(name, 0) / total) for name, column in columns.items()}
+
+    @staticmethod
+    def _memory_usage(meminfo):
+        buff_cache = meminfo['Buffers'] + meminfo['Cached'] + meminfo.get('SReclaimable', 0)
+        return {
+            'ram_unit': 'KiB',
+            'ram_total': meminfo['MemTotal'],
+            'free_ram': meminfo['MemFree'],
+            'used_ram': meminfo['MemTotal'] - meminfo['MemFree'] - buff_cache,
+            'ram_buff_cache': buff_cache,
+            'swap_unit': 'KiB',
+            'swap_total': meminfo['SwapTotal'],
+            'swap_free': meminfo['SwapFree'],
+            'swap_used': meminfo['SwapTotal'] - meminfo['SwapFree'],
+            'avail': meminfo.get('MemAvailable', meminfo['MemFree']),
+        }
+
+    def _process_info(self, stat, mem_total, uptime, elapsed):
+        pid = stat['pid']
+        cpu_time = stat['utime'] + stat['stime']
+        previous_cpu_time = self._previous_proc_times.get(pid)
+        if previous_cpu_time is None or elapsed is None:
+            # first time we see this process: use the average since it started.
+            elapsed = uptime - stat['starttime'] / procfs.CLOCK_TICKS
+            previous_cpu_time = 0
+        perc_cpu = 100 * (cpu_time - previous_cpu_time) / procfs.CLOCK_TICKS / elapsed if elapsed > 0 else 0.0
+        with open(os.path.join(self._proc_root, str(pid), 'statm')) as statm:
+            shared_pages = int(statm.read().split()[2])
+        res_mem = stat['rss'] * procfs.PAGE_SIZE // 1024
+        return {
+            'pid': str(pid),
+            'state': stat['state'],
+            'perc_cpu': '{:.1f}'.format(perc_cpu),
+            'perc_mem': '{:.1f}'.format(100 * res_mem / mem_total),
+            'uptime': format_cpu_time(cpu_time),
+            'user': self._user_name(pid),
+            'priority': 'rt' if stat['priority'] < -99 else str(stat['priority']),
+            'nice': str(stat['nice']),
+            'virtual_mem': str(stat['vsize'] // 1024),
+            'res_mem': str(res_mem),
+            'shared_mem': str(shared_pages * procfs.PAGE_SIZE // 1024),
+            'command': stat['comm'],
+        }
+
+    def _user_name(self, pid):
+        uid = os.stat(os.path.join(self._proc_root, str(pid))).st_uid
+        if uid not in self._users:
+            try:
+                self._users[uid] = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                self._users[uid] = str(uid)
+        return self._users[uid]
+
+
+create_resource = NativeTop
@@ -6,6 +6,12 @@ from ..resource import SimpleCommandResource
 class NvidiaGpu(SimpleCommandResource):
     """Resource associated with the `nvidia-smi` command output."""
 
+    LABEL_COLUMNS = ('gpu_number', 'gpu_name')
+    TEXT_COLUMNS = (
+        'nvidia_smi_version', 'driver_version', 'cuda_version', 'persistence_m', 'bus_id', 'disp_a', 'ecc', 'gpu_perf',
+        'compute_m', 'proc_info',
+    )
+
     NVIDIA_SMI_REGEX = re.compile(
         r'''
             .*\s*
@@ -28,39 +34,51 @@ class NvidiaGpu(SimpleCommandResource):
                 (?P<gpu_util>\d+[%])\s*(?P<compute_m>\w+)\s*
             Processes:\s*
             GPU\s* Memory\s* GPU\s* PID\s* Type\s* Process\s* name\s* Usage\s*
-            (?P<proc_info>(?:\n|.)*)
+            (?P<proc_info>[\s\S]*)
         ''',
         flags=re.VERBOSE
     )
 
+    # the date printed at the beginning of each sample, e.g. `Mon Oct 15 10:15:32 2018`.
+    FRAME_START = re.compile(r'^\w{3} \w{3} [ \d]\d \d\d:\d\d:\d\d \d{4}', re.MULTILINE)
+
+    # table borders, leading and trailing vertical bars and blank lines, removed by `clean_output` in this order.
+    CLEANUP_REGEXES = (
+        re.compile(r'^[+|][+=-]+[|+]\n', re.MULTILINE),
+        re.compile(r'^\|\s*', re.MULTILINE),
+        re.compile(r'\s*\|$', re.MULTILINE),
+        re.compile(r'^\s*\n', re.MULTILINE),
+    )
+
+    PROC_REGEX = re.compile(
+        r'\s*(?P<gpu>\d+)\s*(?P<pid>\d+)\s*(?P<type>\w+)\s*(?P<name>.+)\s+(?P<mem_usage>\d+MiB)\s*'
+    )
+
+    PROCESS_COLUMNS = ('pid', 'gpu', 'mem_usage', 'type', 'name')
+    PROCESS_SORT_COLUMNS = {'mem': 'mem_usage'}
+
     def clean_output(self, output, config):
-        output = re.sub(r'^[+|][+=-]+[|+]\n', '', output, flags=re.MULTILINE)
-        output = re.sub(r'^\|\s*', '', output, flags=re.MULTILINE)
-        output = re.sub(r'\s*\|$', '', output, flags=re.MULTILINE)
-        return re.sub(r'^\s*\n', '', output, flags=re.MULTILINE)
+        for regex in self.CLEANUP_REGEXES:
+            output = regex.sub('', output)
+        return output
 
     def clean_data(self, info, config):
         pid = str(config.get('pid')) if 'pid' in config else None
-        procs = []
-        for line in info['proc_info'].splitlines():
-            proc_m = re.fullmatch(
-                r'\s*(?P<gpu>\d+)\s*(?P<pid>\d+)\s*(?P<type>\w+)\s*(?P<name>.+)\s+(?P<mem_usage>\d+MiB)\s*',
-                line
-            )
-            procs.append({k: v.strip() for k, v in proc_m.groupdict().items()})
-        proc_order = ('pid', 'gpu', 'mem_usage', 'type', 'name')
-        proc_info = '|'.join(
-            ','.join(proc[k] for k in proc_order) for proc in procs if pid is None or proc['pid'] == pid
-        )
-        info['proc_info'] = proc_info
+        fullmatch = self.PROC_REGEX.fullmatch
+        procs = [
+            {k: v.strip() for k, v in fullmatch(line).groupdict().items()} for line in info['proc_info'].splitlines()
+        ]
+        self.store_processes(info, [proc for proc in procs if pid is None or proc['pid'] == pid], config)
         yield info
 
     def make_cmdline(self, config):
         return ['nvidia-smi']
 
+    def make_streaming_cmdline(self, config):
+        return ['nvidia-smi', '-lms', str(int(config['interval'] * 1000))]
+
     def make_regex(self, config):
         return self.NVIDIA_SMI_REGEX
 
 
 create_resource = NvidiaGpu
-aliases = ('gpu', 'graphics-card')
@@ -0,0 +1,147 @@
+import time
+from datetime import datetime
+from typing import List
+
+from .. import procfs
+from ..resource import Resource
+from ..utils import to_local_str
+
+
+class ProcessTree(Resource):
+    """Resources used by a process and all its descendants, aggregated.
+
+    The root of the tree is the `pid` option or, if not given, the process monitored by heimdallr (e.g. the one
+    started by `heimdallr launch`). With `match=group` or `match=session` all the processes in the same process
+    group or session of the root are included as well, which catches also descendants that daemonized themselves.
+
+    The tree is maintained incrementally: each sample lists the pids in `/proc` but only reads the `stat` file of
+    pids that were not there in the previous sample, to find new members of the tree. Processes remain members
+    until they exit, even if they are re-parented outside the tree.
+
+    CPU time includes the time of the children that were waited for by members of the tree. The I/O counters,
+    memory and open file descriptors are those of the processes currently alive. The columns read from a file that
+    cannot be read for any member (e.g. `smaps_rollup` on kernels older than 4.14) are N/A.
+
+    """
+
+    COLUMN_NAMES = [
+        'datetime', 'root_pid', 'num_processes', 'num_threads', 'cpu_time', 'perc_cpu', 'rss', 'pss',
+        'read_bytes', 'write_bytes', 'read_chars', 'write_chars', 'open_fds',
+    ]
+
+    MATCH_MODES = ('tree', 'group', 'session')
+
+    def __init__(self, output_file, proc_root=procfs.PROC_ROOT):
+        super().__init__(output_file)
+        self._proc_root = proc_root
+        self._root = None
+        self._parents = {}
+        self._members = set()
+        self._previous_cpu_time = None
+        self._previous_time = None
+
+    @property
+    def column_names(self) -> List[str]:
+        return self.COLUMN_NAMES
+
+    async def fetch_data(self, config):
+        yield await self.run_in_thread(self.read_sample, config)
+
+    def read_sample(self, config):
+        """Update the tree and aggregate the resources of its members. This performs blocking reads on `/proc`."""
+        root_pid = config.get('pid', config.get('monitored_pid'))
+        if root_pid is None:
+            raise ValueError('You must provide the pid option for the process_tree resource when not launching a task')
+        match = config.get('match', 'tree')
+        if match not in self.MATCH_MODES:
+            raise ValueError('Invalid match mode {!r}. Valid modes: {}'.format(match, ', '.join(self.MATCH_MODES)))
+        row = dict.fromkeys(self.COLUMN_NAMES, 'N/A')
+        row['datetime'] = to_local_str(datetime.now())
+        row['root_pid'] = root_pid
+        if self._root != root_pid:
+            self._root, self._parents, self._members = root_pid, {}, set()
+            self._previous_cpu_time = None
+        stats = self._update_tree(match)
+        if not stats:
+            row['num_processes'] = 0
+            return row
+
+        totals = {}
+        for pid in list(stats):
+            # each file is read separately: one that cannot be read (the process exited, we are not allowed to read
+            # it, or the kernel does not provide it) only leaves its own columns out.
+            for read in (self._read_pss, self._read_io, self._read_fds):
+                try:
+                    values = read(pid)
+                except (OSError, ValueError):
+                    continue
+                for name, value in values.items():
+                    totals[name] = totals.get(name, 0) + value
+        totals['rss'] = sum(stat['rss'] for stat in stats.values()) * procfs.PAGE_SIZE
+        cpu_ticks = sum(stat['utime'] + stat['stime'] + stat['cutime'] + stat['cstime'] for stat in stats.values())
+        cpu_time = cpu_ticks / procfs.CLOCK_TICKS
+        now = time.monotonic()
+        if self._previous_cpu_time is not None and now > self._previous_time:
+            row['perc_cpu'] = '{:.1f}'.format(
+                100 * max(0.0, cpu_time - self._previous_cpu_time) / (now - self._previous_time)
+            )
+        self._previous_cpu_time, self._previous_time = cpu_time, now
+
+        row.update(totals)
+        row['num_processes'] = len(stats)
+        row['num_threads'] = sum(stat['num_threads'] for stat in stats.values())
+        row['cpu_time'] = '{:.2f}'.format(cpu_time)
+        return row
+
+    def _read_pss(self, pid):
+        return {'pss': procfs.read_pss(pid, self._proc_root) * 1024}
+
+    def _read_io(self, pid):
+        io = procfs.read_pid_io(pid, self._proc_root)
+        return {
+            'read_bytes': io.get('read_bytes', 0), 'write_bytes': io.get('write_bytes', 0),
+            'read_chars': io.get('rchar', 0), 'write_chars': io.get('wchar', 0),
+        }
+
+    def _read_fds(self, pid):
+        return {'open_fds': procfs.count_fds(pid, self._proc_root)}
+
+    def _update_tree(self, match):
+        """Update the members of the tree and return the `stat` of each of them, keyed by pid."""
+        pids = set(procfs.list_pids(self._proc_root))
+        self._parents = {pid: info for pid, info in self._parents.items() if pid in pids}
+        self._members &= pids
+        for pid in sorted(pids - self._parents.keys()):
+            try:
+                stat = procfs.read_pid_stat(pid, self._proc_root)
+            except (OSError, ValueError, IndexError):
+                continue
+            self._parents[pid] = (stat['ppid'], stat['pgrp'], stat['session'])
+
+        if self._root in self._parents:
+            self._members.add(self._root)
+            _, root_group, root_session = self._parents[self._root]
+            if match == 'group':
+                self._members.update(pid for pid, (_, group, _) in self._parents.items() if group == root_group)
+            elif match == 'session':
+                self._members.update(
+                    pid for pid, (_, _, session) in self._parents.items() if session == root_session
+                )
+        changed = True
+        while changed:
+            new_members = {pid for pid, (ppid, _, _) in self._parents.items() if ppid in self._members}
+            changed = not new_members <= self._members
+            self._members |= new_members
+
+        stats = {}
+        for pid in self._members:
+            try:
+                stat = procfs.read_pid_stat(pid, self._proc_root)
+            except (OSError, ValueError, IndexError):
+                continue
+            self._parents[pid] = (stat['ppid'], stat['pgrp'], stat['session'])
+            stats[pid] = stat
+        return stats
+
+
+create_resource = ProcessTree
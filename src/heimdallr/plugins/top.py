@@ -35,38 +35,43 @@ class Top(SimpleCommandResource):
                 (?P<swap_free>\d+)\s*free,\s*
                 (?P<swap_used>\d+)\s*used.\s*
                 (?P<avail>\d+)\s*avail\s*Mem\s*.*\s*
-            (?P<proc_info>(?:.|\n)+)
+            (?P<proc_info>[\s\S]+)
         ''', re.VERBOSE
     )
 
+    FRAME_START = re.compile(r'^top - ', re.MULTILINE)
+
+    TEXT_COLUMNS = ('time', 'uptime', 'ram_unit', 'swap_unit', 'proc_info')
+
+    PROCESS_COLUMNS = (
+        'pid', 'perc_cpu', 'perc_mem', 'uptime', 'user', 'priority', 'nice', 'virtual_mem', 'res_mem',
+        'shared_mem', 'command',
+    )
+    PROCESS_SORT_COLUMNS = {'cpu': 'perc_cpu', 'mem': 'perc_mem'}
+
+    PROC_REGEX = re.compile(
+        r'\s*(?P<pid>\S+)\s*(?P<user>\S+)\s*(?P<priority>\S+)\s*(?P<nice>\S+)\s*'
+        r'(?P<virtual_mem>\S+)\s*(?P<res_mem>\S+)\s*(?P<shared_mem>\S+)\s*\S+\s*'
+        r'(?P<perc_cpu>[\d,]+)\s*(?P<perc_mem>[\d,]+)\s*'
+        r'(?P<uptime>\S+)\s*(?P<command>.*)\s*'
+    )
+
     def clean_data(self, info, config):
         pid = str(config.get('pid')) if 'pid' in config else None
-        procs = []
-        for line in info['proc_info'].splitlines():
-            proc_m = re.fullmatch(
-                r'\s*(?P<pid>\S+)\s*(?P<user>\S+)\s*(?P<priority>\S+)\s*(?P<nice>\S+)\s*'
-                r'(?P<virtual_mem>\S+)\s*(?P<res_mem>\S+)\s*(?P<shared_mem>\S+)\s*\S+\s*'
-                r'(?P<perc_cpu>[\d,]+)\s*(?P<perc_mem>[\d,]+)\s*'
-                r'(?P<uptime>\S+)\s*(?P<command>.*)\s*',
-                line
-            )
-            procs.append(proc_m.groupdict())
-        proc_order = (
-            'pid', 'perc_cpu', 'perc_mem', 'uptime', 'user', 'priority', 'nice', 'virtual_mem', 'res_mem',
-            'shared_mem', 'command',
-        )
-        proc_info = '|'.join(
-            ','.join(proc[k] for k in proc_order) for proc in procs if pid is None or proc['pid'] == pid
-        )
-        info['proc_info'] = proc_info
+        fullmatch = self.PROC_REGEX.fullmatch
+        procs = [fullmatch(line).groupdict() for line in info['proc_info'].splitlines()]
+        self.store_processes(info, [proc for proc in procs if pid is None or proc['pid'] == pid], config)
         yield info
 
     def make_cmdline(self, config):
         return ['top', '-n', '1', '-b'] + (['-p', str(config['pid'])] if config.get('pid') is not None else [])
 
+    def make_streaming_cmdline(self, config):
+        pid_option = ['-p', str(config['pid'])] if config.get('pid') is not None else []
+        return ['top', '-b', '-d', str(config['interval'])] + pid_option
+
     def make_regex(self, config):
         return self.TOP_REGEX
 
 
 create_resource = Top
-aliases = ('cpu-and-ram', 'cpu')
\ No newline at end of file
@@ -0,0 +1,50 @@
+import heapq
+
+from .logwriter import create_log_writer
+from .utils import parse_number
+
+# key of the rows of a sample holding its processes, until they are written by a `ProcessLog`.
+PROCESSES = '_processes'
+
+
+def top_processes(processes, count, column):
+    """Return the `count` processes with the largest value of `column`, from the largest.
+
+    Values are converted with `heimdallr.utils.parse_number` and processes whose value is not a number come last.
+    The processes are selected with a heap of `count` elements, in O(n log count) time, instead of sorting them all.
+
+    """
+    def key(process):
+        value = parse_number(process.get(column))
+        return float('-inf') if value is None else value
+
+    return heapq.nlargest(count, processes, key=key)
+
+
+class ProcessLog:
+    """Long-format log of the processes of a resource, like `top` or `nvidia_smi`, with a row per process.
+
+    Each row has the `datetime` of the sample followed by the `columns` of the process, starting with its `pid`.
+    Unlike the `proc_info` column of the resource, the log can be queried and filtered by process with
+    `heimdallr query`, and the values are quoted like any other CSV value.
+
+    """
+
+    def __init__(self, logfile, columns, config=None):
+        self.fieldnames = ['datetime'] + list(columns)
+        self._writer = create_log_writer(logfile, self.fieldnames, config or {})
+
+    def writeheader(self):
+        self._writer.writeheader()
+
+    def add_sample(self, rows):
+        """Write the processes stored by `Resource.store_processes` in the `rows` of a sample, removing them."""
+        for row in rows:
+            processes = row.pop(PROCESSES, ())
+            self._writer.writerows(dict(process, datetime=row['datetime']) for process in processes)
+
+    async def commit(self):
+        await self._writer.commit()
+
+    async def aclose(self):
+        await self._writer.aclose()
@@ -0,0 +1,122 @@
+import os
+import re
+from typing import Dict, List
+
+PROC_ROOT = '/proc'
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# names of the fields of /proc/<pid>/stat that follow the command name, starting from field 3.
+PID_STAT_FIELDS = (
+    'state', 'ppid', 'pgrp', 'session', 'tty_nr', 'tpgid', 'flags', 'minflt', 'cminflt', 'majflt', 'cmajflt',
+    'utime', 'stime', 'cutime', 'cstime', 'priority', 'nice', 'num_threads', 'itrealvalue', 'starttime', 'vsize',
+    'rss',
+)
+
+# names of the fields of the `cpu` lines of /proc/stat.
+CPU_TIMES_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+
+
+def read_text(path):
+    with open(path) as proc_file:
+        return proc_file.read()
+
+
+def list_pids(proc_root=PROC_ROOT) -> List[int]:
+    """Return the pids of all the processes currently running."""
+    return [int(name) for name in os.listdir(proc_root) if name.isdigit()]
+
+
+def parse_pid_stat(text) -> Dict[str, object]:
+    """Parse the contents of `/proc/<pid>/stat`.
+
+    The command name is enclosed in parenthesis and may contain spaces and parenthesis itself, so the remaining
+    fields are those after the last closing parenthesis.
+
+    """
+    open_paren = text.index('(')
+    close_paren = text.rindex(')')
+    stat = {'pid': int(text[:open_paren]), 'comm': text[open_paren + 1:close_paren]}
+    values = text[close_paren + 2:].split()
+    stat['state'] = values[0]
+    for name, value in zip(PID_STAT_FIELDS[1:], values[1:]):
+        stat[name] = int(value)
+    return stat
+
+
+def read_pid_stat(pid, proc_root=PROC_ROOT):
+    return parse_pid_stat(read_text(os.path.join(proc_root, str(pid), 'stat')))
+
+
+def read_cpu_times(proc_root=PROC_ROOT) -> Dict[str, int]:
+    """Return the aggregated CPU times, in clock ticks, of the first line of `/proc/stat`."""
+    with open(os.path.join(proc_root, 'stat')) as stat_file:
+        values = stat_file.readline().split()[1:]
+    return dict(zip(CPU_TIMES_FIELDS, map(int, values)))
+
+
+def read_meminfo(proc_root=PROC_ROOT) -> Dict[str, int]:
+    """Return the contents of `/proc/meminfo` as a dict. Values are in KiB."""
+    meminfo = {}
+    for line in read_text(os.path.join(proc_root, 'meminfo')).splitlines():
+        name, _, value = line.partition(':')
+        meminfo[name] = int(value.split()[0])
+    return meminfo
+
+
+def read_loadavg(proc_root=PROC_ROOT) -> List[str]:
+    """Return the 1, 5 and 15 minutes load averages."""
+    return read_text(os.path.join(proc_root, 'loadavg')).split()[:3]
+
+
+def read_uptime(proc_root=PROC_ROOT) -> float:
+    """Return the number of seconds since boot."""
+    return float(read_text(os.path.join(proc_root, 'uptime')).split()[0])
+
+
+def _unescape_mount_field(field):
+    """Decode the octal escapes (e.g. `\\040` for a space) used in `/proc/<pid>/mountinfo`."""
+    return re.sub(r'\\([0-7]{3})', lambda match: chr(int(match[1], 8)), field)
+
+
+def parse_mountinfo(text) -> List[Dict[str, str]]:
+    """Parse the contents of `/proc/<pid>/mountinfo` into a list of dicts, one for each mount.
+
+    Each dict contains the `mount_point`, the filesystem `type` and the `source` of the mount.
+
+    """
+    mounts = []
+    for line in text.splitlines():
+        fields, _, super_fields = line.partition(' - ')
+        fields, super_fields = fields.split(), super_fields.split()
+        if len(fields) < 5 or len(super_fields) < 2:
+            continue
+        mounts.append({
+            'mount_point': _unescape_mount_field(fields[4]),
+            'type': super_fields[0],
+            'source': _unescape_mount_field(super_fields[1]),
+        })
+    return mounts
+
+
+def read_pid_io(pid, proc_root=PROC_ROOT) -> Dict[str, int]:
+    """Return the I/O counters of `/proc/<pid>/io`, in bytes."""
+    counters = {}
+    for line in read_text(os.path.join(proc_root, str(pid), 'io')).splitlines():
+        name, _, value = line.partition(':')
+        counters[name] = int(value)
+    return counters
+
+
+def read_pss(pid, proc_root=PROC_ROOT):
+    """Return the proportional set size of a process from `/proc/<pid>/smaps_rollup`, in KiB."""
+    with open(os.path.join(proc_root, str(pid), 'smaps_rollup')) as smaps:
+        for line in smaps:
+            if line.startswith('Pss:'):
+                return int(line.split()[1])
+    return 0
+
+
+def count_fds(pid, proc_root=PROC_ROOT):
+    """Return the number of file descriptors opened by a process."""
+    return len(os.listdir(os.path.join(proc_root, str(pid), 'fd')))
@@ -0,0 +1,130 @@
+import re
+import time
+
+import curio
+import curio.network
+
+from .utils import parse_number
+
+METRIC_PREFIX = 'heimdallr_'
+
+_INVALID_NAME_CHARACTERS = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _name(column):
+    return _INVALID_NAME_CHARACTERS.sub('_', column).lower()
+
+
+def _escape(label_value):
+    return label_value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class ResourceGauges:
+    """Converts the samples of a resource into gauges, keeping only the latest one.
+
+    Each numeric column becomes the gauge `heimdallr_<column>`, labelled with the name of the resource and with the
+    values of the `label_columns` of the row (e.g. the core or the filesystem). If the resource has no label columns
+    but writes more than one row per sample, the rows are told apart by a `row` label with their position. A label
+    column named `resource` is renamed `exported_resource`, like Prometheus does for clashing labels.
+
+    """
+
+    def __init__(self, registry, name, label_columns=()):
+        self.registry = registry
+        self.name = name
+        self.label_columns = list(label_columns)
+
+    def add_sample(self, columns, rows):
+        if not rows:
+            # the resource was not sampled (e.g. it is backing off after timeouts): keep the previous values.
+            return
+        label_columns = [column for column in self.label_columns if column in columns]
+        label_names = [
+            'exported_resource' if _name(column) == 'resource' else _name(column) for column in label_columns
+        ]
+        gauges = {}
+        for index, row in enumerate(rows):
+            labels = [('resource', self.name)]
+            labels.extend((label, str(row.get(column, ''))) for label, column in zip(label_names, label_columns))
+            if not label_columns and len(rows) > 1:
+                labels.append(('row', str(index)))
+            for column in columns:
+                if column == 'datetime' or column in label_columns:
+                    continue
+                value = parse_number(row.get(column))
+                if value is not None:
+                    # rows with the same labels (e.g. a filesystem mounted twice) would be duplicate series.
+                    gauges[METRIC_PREFIX + _name(column), tuple(labels)] = value
+        self.registry.update(self.name, [(metric, labels, value) for (metric, labels), value in gauges.items()])
+
+
+class MetricsRegistry:
+    """The latest gauges of all the resources, exposed in the Prometheus text format.
+
+    The values are converted when a sample is taken, so a scrape only formats the gauges that are already in memory:
+    it never triggers a new sample and never waits for one.
+
+    """
+
+    def __init__(self):
+        self._gauges = {}
+
+    def gauges(self, name, label_columns=()):
+        """Return the object that converts the samples of the resource `name` (see `ResourceGauges`)."""
+        return ResourceGauges(self, name, label_columns)
+
+    def update(self, resource, gauges):
+        """Replace the gauges of `resource` with `gauges`, a list of `(metric, labels, value)` triples."""
+        self._gauges[resource] = (time.time(), gauges)
+
+    def remove(self, resource):
+        """Remove the gauges of a resource that is not monitored anymore."""
+        self._gauges.pop(resource, None)
+
+    def render(self):
+        families = {}
+        for resource, (timestamp, gauges) in sorted(self._gauges.items()):
+            families.setdefault(METRIC_PREFIX + 'last_sample_timestamp_seconds', []).append(
+                ((('resource', resource),), timestamp)
+            )
+            for metric, labels, value in gauges:
+                families.setdefault(metric, []).append((labels, value))
+        lines = []
+        for metric in sorted(families):
+            lines.append('# TYPE {} gauge'.format(metric))
+            for labels, value in families[metric]:
+                label_text = ','.join('{}="{}"'.format(name, _escape(value)) for name, value in labels)
+                lines.append('{}{{{}}} {!r}'.format(metric, label_text, value))
+        return '\n'.join(lines) + '\n'
+
+    async def _serve_client(self, client, address):
+        stream = client.as_stream()
+        async with stream:
+            request_line = await stream.readline()
+            # the headers are not needed.
+            while True:
+                line = await stream.readline()
+                if not line or not line.strip():
+                    break
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', self.render().encode('utf-8')
+            else:
+                status, body = '404 Not Found', b'Not found. Metrics are exposed at /metrics\n'
+            headers = (
+                'HTTP/1.1 {}\r\n'
+                'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                'Content-Length: {}\r\n'
+                'Connection: close\r\n\r\n'
+            ).format(status, len(body))
+            await stream.write(headers.encode('ascii') + body)
+
+    async def serve(self, host, port):
+        """Serve the metrics over HTTP at `http://host:port/metrics`."""
+        await curio.network.tcp_server(host, port, self._serve_client)
+
+
+def parse_address(address):
+    """Parse a `[HOST]:PORT` address. The host defaults to all the interfaces."""
+    host, _, port = address.rpartition(':')
+    return host or '', int(port)
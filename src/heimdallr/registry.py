@@ -0,0 +1,125 @@
+import importlib
+from collections.abc import Mapping
+from contextlib import suppress
+
+ENTRY_POINTS_GROUP = 'heimdallr.plugins'
+
+
+class PluginLoadError(Exception):
+    """A plugin could not be imported."""
+
+
+def _plugin_entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        # python < 3.8. Plugins from other packages are not supported.
+        return []
+    found = entry_points()
+    if hasattr(found, 'select'):
+        return list(found.select(group=ENTRY_POINTS_GROUP))
+    return list(found.get(ENTRY_POINTS_GROUP, ()))
+
+
+class PluginRegistry(Mapping):
+    """The plugins by name and alias, imported only when they are first looked up.
+
+    The builtin plugins are registered with the aliases listed in `heimdallr.plugins.BUILTIN_PLUGINS`, without
+    importing them. Plugins of other packages, declared as entry points of the `heimdallr.plugins` group, are
+    discovered only when a name is not a builtin one or when all the plugins are listed, since enumerating the
+    installed packages is slow. Their aliases are declared by the `aliases` attribute of their module, so when a
+    name is not found anywhere else the plugins of other packages are imported to look for it among them.
+
+    Looking up a plugin imports its module and raises `PluginLoadError` if the import fails, and `KeyError` if
+    there is no plugin with that name.
+
+    """
+
+    def __init__(self, builtins=None):
+        if builtins is None:
+            from .plugins import BUILTIN_PLUGINS as builtins
+        self._sources = {}
+        self._aliases = {}
+        self._modules = {}
+        self._entry_points_loaded = False
+        self._entry_point_aliases_loaded = False
+        for name, aliases in builtins.items():
+            self._sources[name] = ('builtin', 'heimdallr.plugins.' + name)
+            for alias in aliases:
+                self._aliases.setdefault(alias, name)
+
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        for entry_point in _plugin_entry_points():
+            if entry_point.name not in self._sources:
+                self._sources[entry_point.name] = ('entry point', entry_point)
+
+    def _load_entry_point_aliases(self):
+        """Import the plugins of other packages to learn their aliases. Those that cannot be imported are skipped."""
+        if self._entry_point_aliases_loaded:
+            return
+        self._entry_point_aliases_loaded = True
+        for name, (kind, _) in list(self._sources.items()):
+            if kind == 'entry point':
+                with suppress(PluginLoadError):
+                    self.load(name)
+
+    def resolve(self, name):
+        """Return the name of the plugin called `name` or having `name` as alias."""
+        if name not in self._sources and name not in self._aliases:
+            self._load_entry_points()
+        if name not in self._sources and name not in self._aliases:
+            self._load_entry_point_aliases()
+        if name in self._sources:
+            return name
+        if name in self._aliases:
+            return self._aliases[name]
+        raise KeyError(name)
+
+    def source(self, name):
+        """Return where the plugin `name` comes from: `builtin` or the distribution that provides it."""
+        kind, target = self._sources[self.resolve(name)]
+        if kind == 'builtin':
+            return kind
+        distribution = getattr(target, 'dist', None)
+        return getattr(distribution, 'name', None) or target.value
+
+    def aliases(self, name):
+        """Return the aliases of the plugin `name` that are known without importing it."""
+        name = self.resolve(name)
+        return sorted(alias for alias, target in self._aliases.items() if target == name)
+
+    def load(self, name):
+        """Import the plugin `name` and return its module."""
+        name = self.resolve(name)
+        if name not in self._modules:
+            kind, target = self._sources[name]
+            try:
+                module = importlib.import_module(target) if kind == 'builtin' else target.load()
+            except Exception as e:
+                raise PluginLoadError('Cannot load plugin {!r}: {}: {}'.format(name, e.__class__.__name__, e)) from e
+            self._modules[name] = module
+            for alias in getattr(module, 'aliases', ()):
+                self._aliases.setdefault(alias, name)
+        return self._modules[name]
+
+    def __getitem__(self, name):
+        return self.load(name)
+
+    def __contains__(self, name):
+        try:
+            self.resolve(name)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        """Iterate over the names of all the plugins, including the ones of other packages, without their aliases."""
+        self._load_entry_points()
+        return iter(sorted(self._sources))
+
+    def __len__(self):
+        self._load_entry_points()
+        return len(self._sources)
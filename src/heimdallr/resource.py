@@ -1,12 +1,58 @@
 import os
+import time
+import threading
 import subprocess
 from abc import ABC, abstractmethod
 from datetime import datetime
 from typing import Iterable, Dict, List, Set
 
+import curio
 import curio.subprocess
 
-from .utils import to_local_str, AsyncDictCsvWriter
+from .changes import ALL, CHANGES, ChangeFilter, check_record_mode, parse_tolerances
+from .instrumentation import STATS, resource_name
+from .logwriter import create_log_writer, check_compression, log_format
+from .parsing import PROCESS, select_parse_executor, run_parser, check_parse_executor
+from .processlog import PROCESSES, ProcessLog, top_processes
+from .rollup import DEFAULT_PERCENTILES, Rollup, parse_rollups, parse_percentiles
+from .scheduler import AdaptiveInterval
+from .streaming import CommandStream
+from .utils import to_local_str, kill_process_group, as_list
+
+
+async def _run_command(cmdline, name):
+    """Run `cmdline` and return its standard output.
+
+    The command runs in a new session. If waiting for it is cancelled, e.g. because of a timeout, its whole process
+    group is killed and the processes are not waited for, since a process stuck in the kernel (e.g. on a stale NFS
+    mount) may never exit. They are reaped by the `subprocess` module once they terminate.
+
+    The time needed to start the process and the time spent waiting for its output are recorded as the `spawn` and
+    `exec` phases of the resource `name`.
+
+    """
+    with STATS.timed(name, 'spawn'):
+        process = curio.subprocess.Popen(cmdline, stdout=subprocess.PIPE, start_new_session=True)
+    try:
+        with STATS.timed(name, 'exec'):
+            stdout, _ = await process.communicate()
+            await process.wait()
+    except BaseException:
+        kill_process_group(process.pid)
+        raise
+    finally:
+        await process.stdout.close()
+    return stdout
+
+
+async def _backup_output(command_name, bad_output_dir, output, name):
+    """Save the `output` that could not be parsed into `bad_output_dir`, if given."""
+    STATS.increment(name, 'parse_failures')
+    if bad_output_dir:
+        path = os.path.join(bad_output_dir, 'bad_{}_{}.txt'.format(command_name, to_local_str(datetime.now())))
+        async with curio.file.aopen(path, 'wb') as bad_file:
+            await bad_file.write(output.encode('utf-8') or b'')
+        STATS.increment(name, 'backups')
 
 
 class Resource(ABC):
@@ -14,10 +60,50 @@ class Resource(ABC):
 
     All resources need to define the output file where the CSV will be saved.
 
+    `LABEL_COLUMNS` are the columns that identify a row of a sample, like the core of a CPU or the mount point of a
+    filesystem, when a resource writes more than one row per sample. `TEXT_COLUMNS` are the other columns whose
+    values are not numbers, like the status of a file, which are not summarized by rollups.
+
+    Resources that list the processes of the system, like `top`, define their `PROCESS_COLUMNS` and the
+    `PROCESS_SORT_COLUMNS` by which the processes can be selected, and store the processes of a sample with
+    `store_processes`.
+
     """
 
+    LABEL_COLUMNS = ()
+    TEXT_COLUMNS = ()
+    PROCESS_COLUMNS = ()
+    PROCESS_SORT_COLUMNS = {}
+
+    # the state that depends on the running heimdallr, which is not pickled.
+    _RUNTIME_ATTRIBUTES = (
+        '_writer', '_adaptive', '_rollups', '_process_log', '_changes', 'observers', '_thread_call_done',
+    )
+
     def __init__(self, output_file):
         self._output_file = output_file
+        self._writer = None
+        self._timeouts = 0
+        self._backoff_until = 0.0
+        self._adaptive = None
+        self.sampling_interval = None
+        self.observers = []
+        self._rollups = []
+        self._process_log = None
+        self._changes = None
+        self._thread_call_done = None
+
+    def __getstate__(self):
+        """Pickle the resource without its log writer and the rest of its runtime state.
+
+        Resources are pickled to parse their outputs in a worker process (see `heimdallr.parsing`), where only their
+        configuration is needed.
+
+        """
+        state = self.__dict__.copy()
+        for attribute in self._RUNTIME_ATTRIBUTES:
+            state[attribute] = None
+        return state
 
     @abstractmethod
     async def fetch_data(self, config):
@@ -40,17 +126,198 @@ class Resource(ABC):
         This method should NOT be overridden by subclasses. All the logic for fetching, parsing and combining data
         should be done inside the `fetch_data` method.
 
+        The rows of a sample are written with a single call to the writer of the resource, which is created on the
+        first call and kept open until `close` is called. The format of the log is selected by the `format` option
+        or by the extension of the log file (see `heimdallr.logwriter.log_format`).
+
+        The time spent writing the rows and the total time of the sample are recorded as the `write` and `total`
+        phases of the resource (see `heimdallr.instrumentation`).
+
+        If the `timeout` option is given, fetching the data is cancelled after that many seconds, killing the
+        commands that are still running, and a row of `N/A` values is written instead. The log then has an
+        additional `timed_out` column, telling these rows apart. After `max_timeouts` consecutive timeouts (3 by
+        default) the resource is not sampled for `timeout_backoff` seconds (60 by default), a delay that doubles
+        with each further timeout up to `max_timeout_backoff` seconds (1 hour by default), and a row of `N/A` values
+        is written at every tick in the meantime. A resource whose `run_in_thread` call is still running after a
+        timeout is not sampled again until the call returns: each tick counts as a further timeout.
+
+        If the `adaptive` option is true the interval of the resource is chosen after each sample depending on how
+        much its values changed (see `heimdallr.scheduler.AdaptiveInterval`) and is stored in `sampling_interval`.
+        The log then has an additional `interval` column, with the interval that preceded the sample.
+
+        If the `rollups` option is given, e.g. `rollups=1m:top.1m.csv 1h:top.1h.csv`, the rows are also summarized
+        over windows of the given length and the summaries are written to their own logs, grouping the rows by the
+        `labels` option or by `LABEL_COLUMNS` (see `heimdallr.rollup.Rollup`). With `raw_log=False` only the
+        summaries are written.
+
+        With the `record=changes` option a row is written only if it changed since the last row written for the same
+        `labels`, or if that row was written at least `heartbeat` seconds before. The `tolerances` option tells by
+        how much numeric columns can change before it counts (see `heimdallr.changes.ChangeFilter`). Observers and
+        rollups still get every row. Use `heimdallr.changes.densify` to read the log as if every row was written.
+
+        If the `process_log` option is given, the processes of a resource that lists them are written to that log,
+        one row per process, instead of the `proc_info` column (see `store_processes`).
+
+        The rows are also passed to the `add_sample` method of each object in `observers`, together with the
+        columns of the log, e.g. to keep them in a `heimdallr.history.SampleHistory`.
+
         """
-        missing_options = self.required_options() - config.keys()
-        if missing_options:
-            raise ValueError('You must provide a value for options: {}'.format(', '.join(missing_options)))
-        async with curio.file.aopen(self._output_file, 'a') as out_file:
-            writer = AsyncDictCsvWriter(out_file, self.column_names)
-            if header:
-                await writer.writeheader()
-            # noinspection PyTypeChecker
-            async for row in self.fetch_data(config):
-                await writer.writerow(row)
+        if self._writer is None:
+            self.check_config(config)
+        name = resource_name(self, config)
+        start = time.perf_counter()
+        timeout = config.get('timeout')
+        if config.get('adaptive') and self._adaptive is None:
+            self._adaptive = AdaptiveInterval.from_config(config)
+        if self._writer is None:
+            columns = list(self.column_names)
+            if timeout is not None:
+                columns.append('timed_out')
+            if self._adaptive is not None:
+                columns.append('interval')
+            self._writer = create_log_writer(self._output_file, columns, config)
+            labels = as_list(config.get('labels', self.LABEL_COLUMNS))
+            self._rollups = [
+                Rollup.from_config(window, logfile, columns, labels, config, self.LABEL_COLUMNS + self.TEXT_COLUMNS)
+                for window, logfile in parse_rollups(config.get('rollups'))
+            ]
+            if config.get('record', ALL) == CHANGES:
+                self._changes = ChangeFilter.from_config(labels, config)
+            if config.get('process_log'):
+                self._process_log = ProcessLog(config['process_log'], self.PROCESS_COLUMNS, config)
+        raw_log = config.get('raw_log', True)
+        if header:
+            if raw_log:
+                self._writer.writeheader()
+            for rollup in self._rollups:
+                rollup.writeheader()
+            if self._process_log is not None:
+                self._process_log.writeheader()
+        if timeout is None:
+            rows = await self._fetch_rows(config)
+        elif time.monotonic() < self._backoff_until:
+            rows = [self._timed_out_row()]
+        elif self.busy:
+            # the thread of a sample that timed out is stuck: a new sample would only queue up behind it.
+            rows = self._timed_out(config, name)
+        else:
+            rows = await self._fetch_rows_with_timeout(config, timeout, name)
+        if self._process_log is not None:
+            self._process_log.add_sample(rows)
+        if self._adaptive is not None:
+            rows = [dict(row, interval=self._adaptive.interval) for row in rows]
+            # timed out samples tell nothing about how the values are changing.
+            if rows and not any(row.get('timed_out') for row in rows):
+                self.sampling_interval = self._adaptive.update(rows)
+        for observer in self.observers:
+            observer.add_sample(self._writer.fieldnames, rows)
+        with STATS.timed(name, 'write'):
+            if raw_log:
+                self._writer.writerows(rows if self._changes is None else self._changes.filter(rows, time.time()))
+                await self._writer.commit()
+            for rollup in self._rollups:
+                rollup.add_sample(rows)
+                await rollup.commit()
+            if self._process_log is not None:
+                await self._process_log.commit()
+        STATS.record(name, 'total', time.perf_counter() - start)
+
+    async def _fetch_rows(self, config):
+        # noinspection PyTypeChecker
+        return [row async for row in self.fetch_data(config)]
+
+    async def _fetch_rows_with_timeout(self, config, timeout, name):
+        try:
+            rows = await curio.timeout_after(timeout, self._fetch_rows(config))
+        except curio.TaskTimeout:
+            return self._timed_out(config, name)
+        self._timeouts = 0
+        return [dict(row, timed_out=False) for row in rows]
+
+    def _timed_out_row(self):
+        row = dict.fromkeys(self.column_names, 'N/A')
+        row.update({'datetime': to_local_str(datetime.now()), 'timed_out': True})
+        return row
+
+    def _timed_out(self, config, name):
+        """Count a timeout, starting the backoff after `max_timeouts` of them, and return the rows of the sample."""
+        STATS.increment(name, 'timeouts')
+        self._timeouts += 1
+        max_timeouts = config.get('max_timeouts', 3)
+        if self._timeouts >= max_timeouts:
+            backoff = config.get('timeout_backoff', 60.0) * 2 ** min(self._timeouts - max_timeouts, 32)
+            self._backoff_until = time.monotonic() + min(backoff, config.get('max_timeout_backoff', 3600.0))
+        return [self._timed_out_row()]
+
+    @property
+    def busy(self):
+        """Whether the last call of `run_in_thread` is still running, even if waiting for it was cancelled."""
+        return self._thread_call_done is not None and not self._thread_call_done.is_set()
+
+    async def run_in_thread(self, function, *args):
+        """Call `function(*args)` in a new daemon thread and return its result.
+
+        Resources that collect their data with blocking calls, like `os.statvfs` on a network mount, use a thread of
+        their own instead of curio's shared pool, which also writes the logs, so that a call that never returns
+        cannot stall the other resources nor heimdallr's exit. A thread cannot be stopped: when waiting for the call
+        is cancelled, e.g. by the `timeout` option, it keeps running and the resource is `busy` until it returns.
+
+        """
+        done = self._thread_call_done = curio.UniversalEvent()
+        outcome = []
+
+        def call():
+            try:
+                outcome.append((function(*args), None))
+            except BaseException as e:
+                outcome.append((None, e))
+            finally:
+                done.set()
+
+        threading.Thread(target=call, name='heimdallr-' + type(self).__name__, daemon=True).start()
+        await done.wait()
+        result, error = outcome[0]
+        if error is not None:
+            raise error
+        return result
+
+    def store_processes(self, info, processes, config):
+        """Store the `processes` of a sample, dicts with the `PROCESS_COLUMNS` as keys, into its row `info`.
+
+        With the `top_processes` option only that many processes are kept, those with the largest CPU or memory usage
+        depending on the `top_by` option (one of the keys of `PROCESS_SORT_COLUMNS`, by default the first one), so
+        that the size of the logs does not grow with the number of processes.
+
+        With the `process_log` option the processes are written to that log by `monitor` and `proc_info` is left
+        empty, otherwise they are joined into `proc_info`, separating processes with `|` and values with `,`.
+
+        """
+        count = config.get('top_processes')
+        if count is not None:
+            top_by = config.get('top_by', next(iter(self.PROCESS_SORT_COLUMNS)))
+            if top_by not in self.PROCESS_SORT_COLUMNS:
+                raise ValueError('Invalid top_by {!r}. Valid values: {}'.format(
+                    top_by, ', '.join(self.PROCESS_SORT_COLUMNS)
+                ))
+            processes = top_processes(processes, int(count), self.PROCESS_SORT_COLUMNS[top_by])
+        if config.get('process_log'):
+            info[PROCESSES] = processes
+            info['proc_info'] = ''
+        else:
+            info['proc_info'] = '|'.join(','.join(proc[k] for k in self.PROCESS_COLUMNS) for proc in processes)
+
+    async def close(self):
+        """Flush and close the log file of the resource, its rollups and its process log."""
+        if self._writer is not None:
+            await self._writer.aclose()
+            self._writer = None
+        for rollup in self._rollups:
+            await rollup.aclose()
+        self._rollups = []
+        if self._process_log is not None:
+            await self._process_log.aclose()
+            self._process_log = None
+        self._changes = None
 
     @classmethod
     def required_options(cls) -> Set[str]:
@@ -61,6 +328,37 @@ class Resource(ABC):
         """
         return set()
 
+    def check_config(self, config):
+        """Raise ValueError if an option of the configuration `config` is missing or invalid.
+
+        This is done by `monitor` before the first sample, and can be used to check a new configuration before
+        replacing the current one. No file is opened.
+
+        """
+        missing_options = self.required_options() - config.keys()
+        if missing_options:
+            raise ValueError('You must provide a value for options: {}'.format(', '.join(missing_options)))
+        log_format(self._output_file, config)
+        check_compression(config.get('compress'))
+        if config.get('parse_executor') is not None:
+            check_parse_executor(config['parse_executor'])
+        if config.get('adaptive'):
+            AdaptiveInterval.from_config(config)
+        if parse_rollups(config.get('rollups')):
+            parse_percentiles(config.get('rollup_percentiles', DEFAULT_PERCENTILES))
+        record = config.get('record', ALL)
+        check_record_mode(record)
+        if record == CHANGES:
+            parse_tolerances(config.get('tolerances'))
+        if config.get('process_log') and not self.PROCESS_COLUMNS:
+            raise ValueError('The resource {} does not list processes'.format(resource_name(self, config)))
+        if config.get('top_processes') is not None and self.PROCESS_SORT_COLUMNS:
+            top_by = config.get('top_by', next(iter(self.PROCESS_SORT_COLUMNS)))
+            if top_by not in self.PROCESS_SORT_COLUMNS:
+                raise ValueError('Invalid top_by {!r}. Valid values: {}'.format(
+                    top_by, ', '.join(self.PROCESS_SORT_COLUMNS)
+                ))
+
 
 class NullResource(Resource):
     """A null resource. This is use as a placeholder when no resource is given."""
@@ -100,12 +398,23 @@ class SimpleCommandResource(Resource):
     In both cases the dict object generated by `fetch_data` will be the result of `match.groupdict()` with
     the addition of the special column `datetime` which will always contain the current time.
 
+    Resources whose command can run continuously, printing a new sample every few seconds (e.g. `top -b -d 5`),
+    can also be sampled in streaming mode, enabled by the `stream` option. They must define the `FRAME_START` regex,
+    matching the beginning of each sample in the output, and the `make_streaming_cmdline` method. In streaming mode
+    the command is started only once and each tick parses the most recent sample printed by the command (see
+    `heimdallr.streaming.CommandStream`).
+
     """
 
+    FRAME_START = None
+
+    _RUNTIME_ATTRIBUTES = Resource._RUNTIME_ATTRIBUTES + ('_stream',)
+
     def __init__(self, output_file, table_output=False):
         super().__init__(output_file)
         self._column_names = None
         self._table_output = table_output
+        self._stream = None
 
     @property
     def column_names(self):
@@ -126,40 +435,96 @@ class SimpleCommandResource(Resource):
          - to avoid losing data in unexpected circumstances in production
         By default no output is saved.
 
+        If the `stream` option is true the output is read from the long-lived command returned by
+        `make_streaming_cmdline` instead. The options `frame_timeout`, `restart_delay` and `max_restart_delay`
+        are passed to `heimdallr.streaming.CommandStream`. If the command does not print a new sample within
+        `interval` seconds no row is written.
+
         """
+        if config.get('stream'):
+            async for data in self._fetch_streamed_data(config):
+                yield data
+            return
         cmdline = self.make_cmdline(config)
-        result = await curio.subprocess.run(cmdline, stdout=subprocess.PIPE)
-        async for data in self._generic_parse(result.stdout.decode('utf-8'), config, cmdline[0]):
+        output = await _run_command(cmdline, resource_name(self, config))
+        async for data in self._generic_parse(output.decode('utf-8'), config, cmdline[0]):
             yield data
 
-    @staticmethod
-    async def _backup_output(command_name, bad_output_dir, output):
-        if bad_output_dir:
-            path = os.path.join(bad_output_dir, 'bad_{}_{}.txt'.format(command_name, to_local_str(datetime.now())))
-            with curio.file.aopen(path, 'wb') as bad_file:
-                await bad_file.write(output.encode('utf-8') or b'')
+    async def _fetch_streamed_data(self, config):
+        name = resource_name(self, config)
+        if self._stream is None:
+            cmdline = self.make_streaming_cmdline(config)
+            if cmdline is None or self.FRAME_START is None:
+                raise ValueError('The resource {!r} does not support streaming'.format(name))
+            self._stream = CommandStream(
+                cmdline,
+                self.FRAME_START,
+                name,
+                frame_timeout=config.get('frame_timeout', 0.25),
+                restart_delay=config.get('restart_delay', 1.0),
+                max_restart_delay=config.get('max_restart_delay', 60.0),
+            )
+            await self._stream.start()
+        with STATS.timed(name, 'exec'):
+            frame = await self._stream.next_frame(timeout=config.get('interval'))
+        if frame is not None:
+            async for data in self._generic_parse(frame, config, self._stream.cmdline[0]):
+                yield data
+
+    async def close(self):
+        if self._stream is not None:
+            await self._stream.close()
+            self._stream = None
+        await super().close()
 
     async def _generic_parse(self, output, config, command_name='command'):
-        cleaned_output = self.clean_output(output, config)
-        regex = self.make_regex(config)
-        if self._table_output:
-            info = {'datetime': to_local_str(datetime.now()), 'values': []}
-            for match in regex.finditer(cleaned_output):
-                res = match.groupdict()
-                info['values'].append(res)
-            if not info['values']:
-                await self._backup_output(command_name, config.get('backup_bad_output_dir'), output)
+        name = resource_name(self, config)
+        executor = select_parse_executor(config, len(output))
+        if executor == PROCESS:
+            # the phases timed in the worker process are lost, the whole call is recorded as parsing.
+            with STATS.timed(name, 'parse'):
+                rows, parsed = await run_parser(executor, self.parse_output, output, config)
         else:
-            match = regex.fullmatch(cleaned_output)
-            if match:
-                info = match.groupdict()
-            else:
-                info = dict.fromkeys(self.column_names, 'N/A')
-                await self._backup_output(command_name, config.get('backup_bad_output_dir'), output)
-            info['datetime'] = to_local_str(datetime.now())
-        for data in self.clean_data(info, config):
+            rows, parsed = await run_parser(executor, self.parse_output, output, config)
+        if not parsed:
+            await _backup_output(command_name, config.get('backup_bad_output_dir'), output, name)
+        for data in rows:
             yield data
 
+    def parse_output(self, output, config):
+        """Clean `output`, match it with the regex and turn the result into rows with `clean_data`.
+
+        Returns the rows and whether the regex matched. Large outputs may be parsed in a worker thread or process,
+        depending on the `parse_executor` and `parse_threshold` options (see `heimdallr.parsing`), so this method
+        and the ones it calls must not change the state of the resource.
+
+        """
+        name = resource_name(self, config)
+        # `clean_output` and `clean_data` are recorded as a single sample of the `clean` phase.
+        start = time.perf_counter()
+        cleaned_output = self.clean_output(output, config)
+        clean_time = time.perf_counter() - start
+        with STATS.timed(name, 'parse'):
+            regex = self.make_regex(config)
+            if self._table_output:
+                info = {'datetime': to_local_str(datetime.now()), 'values': []}
+                for match in regex.finditer(cleaned_output):
+                    res = match.groupdict()
+                    info['values'].append(res)
+                parsed = bool(info['values'])
+            else:
+                match = regex.fullmatch(cleaned_output)
+                if match:
+                    info = match.groupdict()
+                else:
+                    info = dict.fromkeys(self.column_names, 'N/A')
+                info['datetime'] = to_local_str(datetime.now())
+                parsed = match is not None
+        start = time.perf_counter()
+        rows = list(self.clean_data(info, config))
+        STATS.record(name, 'clean', clean_time + time.perf_counter() - start)
+        return rows, parsed
+
     def clean_output(self, output, config):
         """This method should return clean `output` and return a string that will be matched
         with the regex.
@@ -182,6 +547,14 @@ class SimpleCommandResource(Resource):
     def make_regex(self, config):
         """Return the regex to parse the output for this configuration."""
 
+    def make_streaming_cmdline(self, config):
+        """Return the command line that prints a sample every `config['interval']` seconds, for streaming mode.
+
+        By default streaming is not supported and None is returned.
+
+        """
+        return None
+
 
 class MultiCommandResource(Resource):
     """Base class for resources that are defined by running multiple commands and parsing their result with a regex.
@@ -221,38 +594,66 @@ class MultiCommandResource(Resource):
         By default no output is saved.
 
         """
+        name = resource_name(self, config)
         results = []
+        clean_time = 0.0
         for cmdline, (regex, table_output) in zip(self.make_cmdlines(config), self.make_regexes(config)):
-            result = (await curio.subprocess.run(cmdline, stdout=subprocess.PIPE)).stdout.decode('utf-8')
-            results.append(await self._generic_parse(result, config, regex, table_output, command_name=cmdline[0]))
-        for data in self.combine_results(results, config):
+            result = (await _run_command(cmdline, name)).decode('utf-8')
+            info, output_clean_time = await self._generic_parse(
+                result, config, regex, table_output, command_name=cmdline[0]
+            )
+            results.append(info)
+            clean_time += output_clean_time
+        # cleaning the outputs and combining the results are recorded as a single sample of the `clean` phase.
+        start = time.perf_counter()
+        rows = list(self.combine_results(results, config))
+        STATS.record(name, 'clean', clean_time + time.perf_counter() - start)
+        for data in rows:
             yield data
 
-    @staticmethod
-    async def _backup_output(command_name, bad_output_dir, output):
-        if bad_output_dir:
-            path = os.path.join(bad_output_dir, 'bad_{}_{}.txt'.format(command_name, to_local_str(datetime.now())))
-            with curio.file.aopen(path, 'wb') as bad_file:
-                await bad_file.write(output.encode('utf-8') or b'')
-
     async def _generic_parse(self, output, config, regex, table_output, command_name='command'):
-        cleaned_output = self.clean_output(output, command_name, config)
-        if table_output:
-            info = {'datetime': to_local_str(datetime.now()), 'values': []}
-            for match in regex.finditer(cleaned_output):
-                res = match.groupdict()
-                info['values'].append(res)
-            if not info['values']:
-                await self._backup_output(command_name, config.get('backup_bad_output_dir'), output)
+        name = resource_name(self, config)
+        executor = select_parse_executor(config, len(output))
+        arguments = (output, config, regex, table_output, command_name)
+        if executor == PROCESS:
+            # the phases timed in the worker process are lost, the whole call is recorded as parsing.
+            with STATS.timed(name, 'parse'):
+                info, parsed, _ = await run_parser(executor, self.parse_output, *arguments)
+            clean_time = 0.0
         else:
-            match = regex.fullmatch(cleaned_output)
-            if match:
-                info = match.groupdict()
+            info, parsed, clean_time = await run_parser(executor, self.parse_output, *arguments)
+        if not parsed:
+            await _backup_output(command_name, config.get('backup_bad_output_dir'), output, name)
+        return info, clean_time
+
+    def parse_output(self, output, config, regex, table_output, command_name):
+        """Clean the `output` of a command and match it with its regex.
+
+        Returns the parsed data, whether the regex matched and the time spent cleaning the output, which is recorded
+        together with the time of `combine_results`. Like `SimpleCommandResource.parse_output`, this method may run
+        in a worker thread or process.
+
+        """
+        name = resource_name(self, config)
+        start = time.perf_counter()
+        cleaned_output = self.clean_output(output, command_name, config)
+        clean_time = time.perf_counter() - start
+        with STATS.timed(name, 'parse'):
+            if table_output:
+                info = {'datetime': to_local_str(datetime.now()), 'values': []}
+                for match in regex.finditer(cleaned_output):
+                    res = match.groupdict()
+                    info['values'].append(res)
+                parsed = bool(info['values'])
             else:
-                info = dict.fromkeys(self.column_names, 'N/A')
-                await self._backup_output(command_name, config.get('backup_bad_output_dir'), output)
-            info['datetime'] = to_local_str(datetime.now())
-        return info
+                match = regex.fullmatch(cleaned_output)
+                if match:
+                    info = match.groupdict()
+                else:
+                    info = dict.fromkeys(self.column_names, 'N/A')
+                info['datetime'] = to_local_str(datetime.now())
+                parsed = match is not None
+        return info, parsed, clean_time
 
     def clean_output(self, output, command_name, config):
         """This method should return clean `output` and return a string that will be matched
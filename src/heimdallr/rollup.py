@@ -0,0 +1,190 @@
+import time
+import random
+from datetime import datetime
+
+from .logwriter import create_log_writer
+from .utils import parse_number, parse_interval, to_local_str, as_list
+
+DEFAULT_PERCENTILES = (50, 95)
+DEFAULT_RESERVOIR_SIZE = 1024
+
+
+def parse_rollups(rollups):
+    """Parse the `rollups` option into a list of `(window, logfile)` pairs, sorted by window.
+
+    The option is either a dict `{window: logfile}` or a string of `window:logfile` pairs separated by whitespace or
+    commas (e.g. `1m:top.1m.csv 1h:top.1h.csv`). Windows are numbers of seconds or intervals like `5m`.
+
+    """
+    if isinstance(rollups, dict):
+        pairs = rollups.items()
+    else:
+        pairs = [rollup.split(':', maxsplit=1) for rollup in as_list(rollups)]
+    parsed = []
+    for window, logfile in pairs:
+        try:
+            window = parse_interval(window) if isinstance(window, str) else float(window)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid rollup window {!r}'.format(window)) from None
+        if window <= 0:
+            raise ValueError('Rollup windows must be positive, got {!r}'.format(window))
+        parsed.append((window, logfile))
+    return sorted(parsed)
+
+
+def parse_percentiles(percentiles):
+    """Parse the `rollup_percentiles` option, a list or a string of numbers between 0 and 100, into a list."""
+    try:
+        parsed = [float(p) for p in as_list(percentiles)]
+    except (TypeError, ValueError):
+        raise ValueError('Invalid rollup percentiles {!r}'.format(percentiles)) from None
+    if not all(0 <= p <= 100 for p in parsed):
+        raise ValueError('Rollup percentiles must be between 0 and 100, got {!r}'.format(percentiles))
+    return parsed
+
+
+class Summary:
+    """Running aggregates of the values of a column: count, minimum, maximum, mean and approximate percentiles.
+
+    The percentiles are computed from a uniform sample of at most `reservoir_size` values (reservoir sampling), so
+    they are exact as long as fewer values were added and the memory used is bounded anyway.
+
+    """
+
+    __slots__ = ('count', 'min', 'max', 'sum', '_reservoir', '_reservoir_size')
+
+    def __init__(self, reservoir_size=DEFAULT_RESERVOIR_SIZE):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+        self._reservoir = []
+        self._reservoir_size = reservoir_size
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self._reservoir) < self._reservoir_size:
+            self._reservoir.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < self._reservoir_size:
+                self._reservoir[index] = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentiles(self, percentiles):
+        """Return the given percentiles (e.g. 95 for the 95th) with the nearest-rank method."""
+        values = sorted(self._reservoir)
+        return [values[min(len(values) - 1, max(0, int(len(values) * p / 100 + 0.5) - 1))] for p in percentiles]
+
+
+class Rollup:
+    """Summaries of the samples of a resource over fixed windows of `window` seconds, written to their own log.
+
+    Windows are aligned to the Unix epoch (e.g. every minute, on the minute). The rows are grouped by the values of
+    their `label_columns`, like the core or the filesystem, and every other column of the resource, except the
+    `text_columns` whose values are not numbers, is summarized: once a window is over a row is written for each
+    group, with the start and end of the window, the labels, the number of samples and, for each column, its
+    minimum, maximum, mean and `percentiles`. Values are converted with `heimdallr.utils.parse_number`, and values
+    that are not numbers (e.g. `N/A`) are ignored.
+
+    A window is written when the first sample of a later window is added, or when the rollup is closed.
+
+    """
+
+    def __init__(self, window, logfile, columns, label_columns=(), percentiles=DEFAULT_PERCENTILES,
+                 reservoir_size=DEFAULT_RESERVOIR_SIZE, config=None, text_columns=()):
+        self.window = window
+        self.label_columns = [column for column in label_columns if column in columns]
+        self.value_columns = [
+            column for column in columns
+            if column != 'datetime' and column not in self.label_columns and column not in text_columns
+        ]
+        self.percentiles = list(percentiles)
+        self.statistics = ['min', 'max', 'mean'] + ['p{:g}'.format(p) for p in self.percentiles]
+        self.fieldnames = ['window_start', 'window_end'] + self.label_columns + ['samples'] + [
+            '{}_{}'.format(column, statistic) for column in self.value_columns for statistic in self.statistics
+        ]
+        self.reservoir_size = reservoir_size
+        self._current_window = None
+        self._groups = {}
+        self._writer = create_log_writer(logfile, self.fieldnames, config or {})
+
+    @classmethod
+    def from_config(cls, window, logfile, columns, label_columns, config, text_columns=()):
+        """Create a rollup using the `rollup_percentiles` and `rollup_reservoir` options of a resource.
+
+        The writer of the rollup uses the same format, flushing and rotation options of the log of the resource.
+
+        """
+        return cls(
+            window,
+            logfile,
+            columns,
+            label_columns,
+            percentiles=parse_percentiles(config.get('rollup_percentiles', DEFAULT_PERCENTILES)),
+            reservoir_size=config.get('rollup_reservoir', DEFAULT_RESERVOIR_SIZE),
+            config=config,
+            text_columns=text_columns,
+        )
+
+    def writeheader(self):
+        self._writer.writeheader()
+
+    def add_sample(self, rows, timestamp=None):
+        """Add the rows of a sample taken at `timestamp` (defaults to now), writing the previous window if over."""
+        timestamp = time.time() if timestamp is None else timestamp
+        window = int(timestamp // self.window)
+        if window != self._current_window:
+            self._write_window()
+            self._current_window = window
+        for row in rows:
+            key = tuple(str(row.get(column, '')) for column in self.label_columns)
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = [0, {column: Summary(self.reservoir_size) for column in self.value_columns}]
+            group[0] += 1
+            for column, summary in group[1].items():
+                value = parse_number(row.get(column))
+                if value is not None:
+                    summary.add(value)
+
+    @staticmethod
+    def _format(value):
+        return 'N/A' if value is None else round(value, 6)
+
+    def _write_window(self):
+        if self._current_window is None or not self._groups:
+            return
+        start = self._current_window * self.window
+        window_start = to_local_str(datetime.fromtimestamp(start))
+        window_end = to_local_str(datetime.fromtimestamp(start + self.window))
+        rows = []
+        for key, (samples, summaries) in self._groups.items():
+            row = {'window_start': window_start, 'window_end': window_end, 'samples': samples}
+            row.update(zip(self.label_columns, key))
+            for column, summary in summaries.items():
+                if summary.count:
+                    statistics = [summary.min, summary.max, summary.mean] + summary.percentiles(self.percentiles)
+                else:
+                    statistics = [None] * len(self.statistics)
+                row.update(
+                    ('{}_{}'.format(column, name), self._format(value))
+                    for name, value in zip(self.statistics, statistics)
+                )
+            rows.append(row)
+        self._writer.writerows(rows)
+        self._groups = {}
+
+    async def commit(self):
+        await self._writer.commit()
+
+    async def aclose(self):
+        """Write the current window, even if it is not over yet, and close the log."""
+        self._write_window()
+        await self._writer.aclose()
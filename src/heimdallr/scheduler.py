@@ -0,0 +1,195 @@
+import math
+import time
+from typing import List, Tuple
+
+from .utils import as_list, parse_number
+
+SKIP = 'skip'
+CATCH_UP = 'catch-up'
+COALESCE = 'coalesce'
+
+MISSED_TICKS_POLICIES = (SKIP, CATCH_UP, COALESCE)
+
+
+class Schedule:
+    """The absolute deadlines of a single resource.
+
+    The deadlines lie on the grid `start + k * interval`, so the time spent sampling never accumulates into drift.
+    The `policy` decides what happens when one or more deadlines were missed because sampling took too long:
+
+     - `skip`: the missed ticks are dropped and the resource waits for the next deadline.
+     - `catch-up`: every missed tick is run, back to back, until the resource is on time again.
+     - `coalesce`: all the missed ticks are merged into a single tick run immediately.
+
+    """
+
+    def __init__(self, interval, policy=COALESCE, start=None):
+        if interval <= 0:
+            raise ValueError('The interval must be positive, got {!r}'.format(interval))
+        if policy not in MISSED_TICKS_POLICIES:
+            raise ValueError('Invalid missed ticks policy {!r}. Valid policies: {}'.format(
+                policy, ', '.join(MISSED_TICKS_POLICIES)
+            ))
+        self.interval = interval
+        self.policy = policy
+        self.start = time.monotonic() if start is None else start
+        self._index = 0
+        self.missed = 0
+
+    @property
+    def deadline(self):
+        """The next deadline of the resource."""
+        return self.start + self._index * self.interval
+
+    def is_due(self, now):
+        return self.deadline <= now
+
+    def advance(self, now):
+        """Move past the current deadline, which must be due at `now`.
+
+        Returns a pair `(run, lateness)` where `run` tells whether a tick should be run now and `lateness` is the
+        number of seconds elapsed since the deadline of that tick.
+
+        """
+        lateness = now - self.deadline
+        missed = math.floor(lateness / self.interval)
+        if self.policy == CATCH_UP:
+            self._index += 1
+            return True, lateness
+        run = self.policy == COALESCE or missed == 0
+        self._index += missed + 1
+        self.missed += missed if run else missed + 1
+        return run, lateness
+
+    def set_interval(self, interval):
+        """Change the interval. The next deadline becomes the previous one plus the new interval."""
+        if interval <= 0:
+            raise ValueError('The interval must be positive, got {!r}'.format(interval))
+        self.start = self.deadline - self.interval + interval
+        self._index = 0
+        self.interval = interval
+
+
+class Scheduler:
+    """Keeps track of the deadlines of a group of items, each with its own `Schedule`."""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._schedules = []
+
+    def add(self, item, interval, policy=COALESCE):
+        self._schedules.append((item, Schedule(interval, policy, start=self._clock())))
+
+    def remove(self, item):
+        self._schedules = [(other, schedule) for other, schedule in self._schedules if other is not item]
+
+    def __iter__(self):
+        return iter(self._schedules)
+
+    def next_deadline(self):
+        return min(schedule.deadline for _, schedule in self._schedules)
+
+    def time_to_next_deadline(self):
+        return max(0, self.next_deadline() - self._clock())
+
+    def pop_due(self) -> List[Tuple[object, Schedule, float]]:
+        """Return the items that must be sampled now, as triples `(item, schedule, lateness)`."""
+        now = self._clock()
+        due = []
+        for item, schedule in self._schedules:
+            if schedule.is_due(now):
+                run, lateness = schedule.advance(now)
+                if run:
+                    due.append((item, schedule, lateness))
+        return due
+
+
+def parse_thresholds(thresholds):
+    """Parse the `thresholds` option of adaptive sampling into a dict `{column: (threshold, relative)}`.
+
+    The option is either a dict or a string of `column:threshold` pairs separated by whitespace or commas.
+    Thresholds ending with `%` are relative to the previous value of the column, the others are absolute. They are
+    converted with `heimdallr.utils.parse_number`, like the values, so `gpu_ram_usage:100MiB` is in bytes.
+
+    """
+    if isinstance(thresholds, dict):
+        pairs = thresholds.items()
+    else:
+        pairs = [item.rsplit(':', 1) for item in as_list(thresholds)]
+    parsed = {}
+    for column, threshold in pairs:
+        threshold = str(threshold).strip()
+        relative = threshold.endswith('%')
+        value = parse_number(threshold)
+        if value is None:
+            raise ValueError('Invalid threshold {!r} for column {!r}'.format(threshold, column))
+        parsed[column.strip()] = (value / 100 if relative else value, relative)
+    return parsed
+
+
+class AdaptiveInterval:
+    """Chooses the sampling interval of a resource depending on how much its values change.
+
+    The values of the columns in `thresholds` (see `parse_thresholds`) are compared with reference values, taken
+    from the first sample and then from each sample in which a change was detected. If any of them moved by more
+    than its threshold, or the number of rows changed, the interval drops to `min_interval`. Otherwise it is
+    multiplied by `factor`, up to `max_interval`. Rows are compared by position and values that are not numbers
+    are ignored.
+
+    """
+
+    def __init__(self, min_interval, max_interval, thresholds, factor=2.0):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError('Invalid adaptive intervals: min_interval={!r}, max_interval={!r}'.format(
+                min_interval, max_interval
+            ))
+        if not thresholds:
+            raise ValueError('Adaptive sampling requires the thresholds option')
+        if factor <= 1:
+            raise ValueError('The adaptive factor must be greater than 1, got {!r}'.format(factor))
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.thresholds = parse_thresholds(thresholds)
+        self.factor = factor
+        self.interval = min_interval
+        self._reference = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the adaptive interval of a resource from its options.
+
+        These are `min_interval` (the `interval` of the resource by default), `max_interval` (60 seconds by
+        default), `thresholds` and `adaptive_factor` (2 by default).
+
+        """
+        return cls(
+            config.get('min_interval', config.get('interval')),
+            config.get('max_interval', 60.0),
+            config.get('thresholds'),
+            config.get('adaptive_factor', 2.0),
+        )
+
+    def _values(self, rows):
+        return [{column: parse_number(row.get(column)) for column in self.thresholds} for row in rows]
+
+    def _changed(self, values):
+        if len(values) != len(self._reference):
+            return True
+        for new_row, old_row in zip(values, self._reference):
+            for column, (threshold, relative) in self.thresholds.items():
+                new, old = new_row[column], old_row[column]
+                if new is None or old is None:
+                    continue
+                if abs(new - old) > (threshold * abs(old) if relative else threshold):
+                    return True
+        return False
+
+    def update(self, rows):
+        """Update the interval with the rows of a new sample and return it."""
+        values = self._values(rows)
+        if self._reference is None or self._changed(values):
+            self._reference = values
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.factor, self.max_interval)
+        return self.interval
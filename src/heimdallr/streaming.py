@@ -0,0 +1,120 @@
+import sys
+import codecs
+import subprocess
+
+import curio
+import curio.subprocess
+
+from .instrumentation import STATS
+from .utils import kill_process_group
+
+
+class CommandStream:
+    """A long-lived command, like `top -b -d 5`, whose output is split into frames.
+
+    The command is started by `start` and its output is read incrementally by a background task. A new frame begins
+    wherever the `frame_start` regex matches, so a frame is complete once the next one starts or once no output was
+    received for `frame_timeout` seconds. Text that precedes the first frame start is discarded.
+
+    When the command exits, or cannot be started, it is restarted after `restart_delay` seconds. The delay doubles
+    after each restart up to `max_restart_delay` seconds and goes back to `restart_delay` as soon as the command
+    produces a frame.
+
+    """
+
+    def __init__(self, cmdline, frame_start, name, frame_timeout=0.25, restart_delay=1.0, max_restart_delay=60.0):
+        self.cmdline = cmdline
+        self.frame_start = frame_start
+        self.name = name
+        self.frame_timeout = frame_timeout
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.frames = 0
+        self.restarts = 0
+        self._frame = None
+        self._new_frame = curio.Event()
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = await curio.spawn(self._run, daemon=True)
+
+    async def next_frame(self, timeout=None):
+        """Return the most recent frame that was not returned yet, waiting up to `timeout` seconds for one.
+
+        Returns None if no new frame was received in time.
+
+        """
+        if not self._new_frame.is_set():
+            if timeout is None:
+                await self._new_frame.wait()
+            else:
+                # `Event.wait` returns None, so the event tells whether the wait ended because of a new frame.
+                await curio.ignore_after(timeout, self._new_frame.wait())
+                if not self._new_frame.is_set():
+                    return None
+        self._new_frame.clear()
+        return self._frame
+
+    async def _emit(self, frame):
+        self._frame = frame.rstrip() + '\n'
+        self.frames += 1
+        await self._new_frame.set()
+
+    async def _split(self, buffer):
+        """Emit the complete frames in `buffer` and return the rest."""
+        starts = [match.start() for match in self.frame_start.finditer(buffer)]
+        if not starts:
+            # this is garbage preceding the first frame, but its last line may be the beginning of a frame start.
+            return buffer[buffer.rfind('\n') + 1:]
+        for start, end in zip(starts, starts[1:]):
+            await self._emit(buffer[start:end])
+        return buffer[starts[-1]:]
+
+    async def _read_frames(self, process):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        buffer = ''
+        while True:
+            chunk = await curio.ignore_after(self.frame_timeout, process.stdout.read(65536))
+            if chunk is None or not chunk:
+                # a pause in the output, or the end of it, completes the current frame.
+                if self.frame_start.match(buffer):
+                    await self._emit(buffer)
+                    buffer = ''
+                if chunk is not None:
+                    return
+                continue
+            buffer = await self._split(buffer + decoder.decode(chunk))
+
+    async def _run(self):
+        delay = self.restart_delay
+        while True:
+            frames = self.frames
+            try:
+                with STATS.timed(self.name, 'spawn'):
+                    process = curio.subprocess.Popen(self.cmdline, stdout=subprocess.PIPE, start_new_session=True)
+            except OSError as e:
+                # e.g. a missing command or too many open files: it is retried like a command that exited.
+                sys.stderr.write('Cannot start the command of {}: {}: {}\n'.format(
+                    self.name, e.__class__.__name__, e
+                ))
+                process = None
+            if process is not None:
+                try:
+                    await self._read_frames(process)
+                    await process.wait()
+                finally:
+                    if process.poll() is None:
+                        kill_process_group(process.pid)
+                    await process.stdout.close()
+            if self.frames > frames:
+                delay = self.restart_delay
+            self.restarts += 1
+            STATS.increment(self.name, 'restarts')
+            await curio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+
+    async def close(self):
+        if self._task is not None:
+            await self._task.cancel()
+            self._task = None
@@ -1,6 +1,7 @@
 import datetime as dt
 import io
 import os
+import re
 import csv
 import signal
 import sys
@@ -13,12 +14,65 @@ import curio
 
 LOCAL_TIMEZONE = datetime.now(dt.timezone.utc).astimezone().tzinfo
 
+_NUMBER_WITH_UNIT = re.compile(r'\s*([-+]?\d+(?:[.,]\d+)?)\s*(°C|[A-Za-z%]*)\s*')
+# sizes printed by `df -h`, `nvidia-smi` etc. are converted to bytes. Other units are simply dropped.
+_SIZE_MULTIPLIERS = {
+    prefix + suffix: 1024 ** power
+    for power, prefix in enumerate(('K', 'M', 'G', 'T', 'P'), start=1)
+    for suffix in ('', 'iB')
+}
+
 
 def to_local_str(date: datetime):
     """Convert a datetime into a string with local timezone."""
     return date.replace(tzinfo=LOCAL_TIMEZONE).strftime('%Y-%m-%dT%H:%M:%S%Z')
 
 
+def split_unit(text):
+    """Split a value like `45C`, `+44.0°C` or `7,8G` into its number and its unit, as strings, or return None."""
+    match = _NUMBER_WITH_UNIT.fullmatch(text)
+    return (match[1], match[2]) if match else None
+
+
+def parse_number(value):
+    """Convert a value like `45C`, `+44.0°C`, `80%`, `4,1` or `7,8G` into a float, or return None.
+
+    Sizes with a binary suffix (`K`, `M`, `G`, ..., `KiB`, `MiB`, ...) are converted to bytes.
+
+    """
+    if isinstance(value, (bool, int, float)):
+        return float(value)
+    parts = split_unit(str(value)) if value is not None else None
+    if parts is None:
+        return None
+    number, unit = parts
+    return float(number.replace(',', '.')) * _SIZE_MULTIPLIERS.get(unit, 1)
+
+
+def parse_interval(interval):
+    """Parse a time interval into the equivalent number of seconds:
+
+        >>> parse_interval("5s")
+        5
+        >>> parse_interval("2m")
+        120
+        >>> parse_interval("1.5h")
+        5472.0
+
+    """
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smh])', interval)
+    return float(match[1]) * ({'s': 1, 'm': 60, 'h': 60 * 60}[match[2]])
+
+
+def as_list(value):
+    """Convert an option value into a list. Strings are split on whitespace and commas."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return value.replace(',', ' ').split()
+    return list(value)
+
+
 def _pid_exists(pid):
     """Return True if a process with the given pid exists. False otherwise."""
     try:
@@ -44,8 +98,20 @@ def name_of_temporary_file(verbose=False):
                 sys.stderr.write(msg.format(tmp_filename, e))
 
 
-def create_gentle_killer(proc, verbose):
-    """Returns a function that will try to kill the given process and corresponding process group."""
+def kill_process_group(pgid):
+    """Kill the process group `pgid` with SIGKILL, ignoring errors if it no longer exists."""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def create_gentle_killer(proc, verbose, on_exit=None):
+    """Returns a function that will try to kill the given process and corresponding process group.
+
+    If given, `on_exit` is called without arguments right before terminating the current process.
+
+    """
     proc_pid = proc.pid
     if verbose:
         log = sys.stderr.write
@@ -87,6 +153,11 @@ def create_gentle_killer(proc, verbose):
                     )
                     log(msg.format(e, proc_pid))
         finally:
+            if on_exit is not None:
+                try:
+                    on_exit()
+                except Exception as e:
+                    log("got an exception on exit: {0.__class__.__name__}: {0}\n".format(e))
             log('Exiting main process.\n')
             sys.exit(1)
 
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+import curio
+
+from heimdallr.agent import AgentSink, Collector
+from heimdallr.logwriter import list_segments
+
+
+async def _send(directory, config, samples):
+    """Send each sample `(resource, columns, rows)` from an agent to a collector and return the agent."""
+    socket_path = os.path.join(directory, 'collector.sock')
+    collector = Collector(directory, config)
+    server = await curio.spawn(collector.serve, 'unix:' + socket_path)
+    while not os.path.exists(socket_path):
+        await curio.sleep(0.01)
+    agent = AgentSink('unix:' + socket_path, host='node', flush_interval=0.01)
+    await agent.start()
+    try:
+        for resource, columns, rows in samples:
+            agent.add(resource, columns, [dict(zip(columns, row)) for row in rows])
+            while agent.pending_rows:
+                await curio.sleep(0.01)
+    finally:
+        await agent.aclose()
+        await server.cancel()
+        await collector.aclose()
+    return agent
+
+
+class CollectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = self._tmp_dir.name
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_changed_columns_rotate_the_log(self):
+        samples = [('disk', ['a', 'b'], [[1, 2]]), ('disk', ['a', 'b', 'c'], [[3, 4, 5]])]
+        curio.run(_send, self.directory, {}, samples)
+        path = os.path.join(self.directory, 'node', 'disk.csv')
+        segments = list_segments(path)
+        self.assertEqual(len(segments), 1)
+        with open(segments[0]) as segment:
+            self.assertEqual(segment.read().splitlines(), ['a,b', '1,2'])
+        with open(path) as log_file:
+            self.assertEqual(log_file.read().splitlines(), ['a,b,c', '3,4,5'])
+
+    def test_changed_columns_of_a_binary_log(self):
+        samples = [('disk', ['a', 'b'], [[1, 2]]), ('disk', ['a', 'b', 'c'], [[3, 4, 5]])]
+        agent = curio.run(_send, self.directory, {'format': 'binary'}, samples)
+        self.assertEqual(agent.rejected_rows, 0)
+        self.assertEqual(len(list_segments(os.path.join(self.directory, 'node', 'disk.hlog'))), 1)
+
+    def test_samples_that_cannot_be_written_are_rejected(self):
+        os.makedirs(os.path.join(self.directory, 'node'))
+        with open(os.path.join(self.directory, 'node', 'bad.hlog'), 'wb') as log_file:
+            log_file.write(b'not a log')
+        samples = [('bad', ['a'], [[1], [2]]), ('disk', ['a'], [[3]])]
+        agent = curio.run(_send, self.directory, {'format': 'binary'}, samples)
+        self.assertEqual(agent.rejected_rows, 2)
+        self.assertEqual(agent.pending_rows, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'node', 'disk.hlog')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import io
+import os
+import csv
+import tempfile
+import unittest
+
+from heimdallr.binlog import BinaryLogWriter, export_to_csv
+
+
+class BinaryLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp_dir.name, 'log.hlog')
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _round_trip(self, rows):
+        writer = BinaryLogWriter(self.path, ['datetime', 'value'])
+        writer.writerows([{'datetime': date, 'value': value} for date, value in rows])
+        writer.close()
+        out = io.StringIO()
+        export_to_csv(self.path, out)
+        return list(csv.reader(io.StringIO(out.getvalue())))
+
+    def test_timestamps_keep_their_timezone(self):
+        rows = [
+            ('2026-01-15T12:00:00CEST', '45C'),
+            ('2026-07-15T12:00:00EDT', '4,1'),
+            # a time skipped by the change to daylight saving time in Europe.
+            ('2026-03-29T02:30:00CET', '1234MiB'),
+            ('2026-01-15T12:00:00', 'N/A'),
+            ('2026-02-30T12:00:00UTC', '-7'),
+        ]
+        self.assertEqual(self._round_trip(rows), [['datetime', 'value']] + [list(row) for row in rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+from heimdallr.history import HistoryStore, SampleHistory
+
+
+class SampleHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.history = SampleHistory(size=3)
+        for value in range(5):
+            self.history.add_sample(['value'], [{'value': value}], timestamp=value)
+
+    def test_last_samples(self):
+        self.assertEqual([time for time, _ in self.history.samples(last=2)], [3, 4])
+        self.assertEqual([time for time, _ in self.history.samples(last=10)], [2, 3, 4])
+        self.assertEqual(self.history.samples(last=0), [])
+        self.assertEqual(len(self.history.samples()), 3)
+
+    def test_negative_count(self):
+        with self.assertRaises(ValueError):
+            self.history.samples(last=-1)
+        store = HistoryStore()
+        store.histories['disk'] = self.history
+        self.assertIn('error', store.handle({'command': 'latest', 'resource': 'disk', 'count': -1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import os
+import tempfile
+import unittest
+
+from heimdallr.logwriter import CsvLogWriter
+
+
+class CsvLogWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.writer = CsvLogWriter(os.path.join(self._tmp_dir.name, 'log.csv'), ['time', 'name'])
+
+    def tearDown(self):
+        self.writer.close()
+        self._tmp_dir.cleanup()
+
+    def test_pending_bytes_count_the_encoded_rows(self):
+        self.writer.writeheader()
+        self.writer.writerows([{'time': '2020-01-01T00:00:00', 'name': 'café'}] * 3)
+        encoded = self.writer._buffer.getvalue().encode(self.writer._encoding)
+        self.assertEqual(self.writer.pending_bytes, len(encoded))
+        self.writer.flush()
+        self.assertEqual(self.writer.pending_bytes, 0)
+        with open(self.writer.path, 'rb') as log_file:
+            self.assertEqual(log_file.read(), encoded)
+
+
+if __name__ == '__main__':
+    unittest.main()
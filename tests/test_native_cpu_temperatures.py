@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+import curio
+
+from heimdallr.plugins.native_cpu_temperatures import NativeCpuTemps
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as sysfs_file:
+        sysfs_file.write(text + '\n')
+
+
+async def _sample(resource, config):
+    return [row async for row in resource.fetch_data(config)]
+
+
+class NativeCpuTempsTest(unittest.TestCase):
+    """Read the temperatures from a fake sysfs tree, given by the `sysfs_root` option."""
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.sysfs_root = self._tmp_dir.name
+        hwmon = os.path.join(self.sysfs_root, 'class', 'hwmon')
+        _write(os.path.join(hwmon, 'hwmon0', 'name'), 'acpitz')
+        _write(os.path.join(hwmon, 'hwmon0', 'temp1_input'), '27800')
+        _write(os.path.join(hwmon, 'hwmon2', 'name'), 'coretemp')
+        _write(os.path.join(hwmon, 'hwmon2', 'temp1_label'), 'Package id 0')
+        _write(os.path.join(hwmon, 'hwmon2', 'temp1_input'), '45000')
+        _write(os.path.join(hwmon, 'hwmon2', 'temp1_max'), '80000')
+        _write(os.path.join(hwmon, 'hwmon2', 'temp1_crit'), '100000')
+        _write(os.path.join(hwmon, 'hwmon2', 'temp10_input'), '47500')
+        _write(os.path.join(hwmon, 'hwmon2', 'temp2_label'), 'Core 0')
+        _write(os.path.join(hwmon, 'hwmon2', 'temp2_input'), '44000')
+        _write(os.path.join(hwmon, 'hwmon2', 'temp2_max'), '80000')
+        self.resource = NativeCpuTemps(os.devnull)
+
+    def tearDown(self):
+        curio.run(self.resource.close)
+        self._tmp_dir.cleanup()
+
+    def test_known_cpu_chips(self):
+        rows = curio.run(_sample, self.resource, {'sysfs_root': self.sysfs_root})
+        self.assertEqual(
+            [(row['core'], row['temp'], row['high_temp'], row['crit_temp']) for row in rows],
+            [
+                ('Package id 0', '+45.0°C', '+80.0°C', '+100.0°C'),
+                ('Core 0', '+44.0°C', '+80.0°C', 'N/A'),
+                ('coretemp temp10', '+47.5°C', 'N/A', 'N/A'),
+            ]
+        )
+
+    def test_all_chips(self):
+        rows = curio.run(_sample, self.resource, {'sysfs_root': self.sysfs_root, 'chips': '*'})
+        self.assertEqual([row['core'] for row in rows], ['acpitz temp1', 'Package id 0', 'Core 0', 'coretemp temp10'])
+
+    def test_values_are_read_again_on_each_sample(self):
+        config = {'sysfs_root': self.sysfs_root}
+        curio.run(_sample, self.resource, config)
+        _write(os.path.join(self.sysfs_root, 'class', 'hwmon', 'hwmon2', 'temp2_input'), '61250')
+        rows = curio.run(_sample, self.resource, config)
+        self.assertEqual(rows[1]['temp'], '+61.2°C')
+
+    def test_missing_sysfs(self):
+        rows = curio.run(_sample, self.resource, {'sysfs_root': os.path.join(self.sysfs_root, 'missing')})
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['core'], 'N/A')
+
+
+if __name__ == '__main__':
+    unittest.main()
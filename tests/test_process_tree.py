@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from heimdallr.plugins.process_tree import ProcessTree
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as proc_file:
+        proc_file.write(text + '\n')
+
+
+def _write_process(proc_root, pid, ppid, fds):
+    """Write the `stat`, `io` and `fd` of a fake process, without `smaps_rollup` as on kernels older than 4.14."""
+    directory = os.path.join(proc_root, str(pid))
+    _write(os.path.join(directory, 'stat'), '{} (worker) S {} {} {} 0 -1 0 0 0 0 0 10 5 0 0 20 0 1 0 0 0 3'.format(
+        pid, ppid, pid, pid
+    ))
+    _write(os.path.join(directory, 'io'), 'rchar: 100\nwchar: 50\nread_bytes: 4096\nwrite_bytes: 0')
+    os.makedirs(os.path.join(directory, 'fd'))
+    for fd in range(fds):
+        _write(os.path.join(directory, 'fd', str(fd)), '')
+
+
+class ProcessTreeTest(unittest.TestCase):
+    """Read the resources of a tree of processes from a fake `/proc`."""
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.proc_root = self._tmp_dir.name
+        _write_process(self.proc_root, 10, 1, fds=3)
+        _write_process(self.proc_root, 11, 10, fds=2)
+        self.resource = ProcessTree(os.devnull, proc_root=self.proc_root)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_a_missing_file_only_blanks_its_own_columns(self):
+        row = self.resource.read_sample({'pid': 10})
+        self.assertEqual(row['num_processes'], 2)
+        self.assertEqual(row['pss'], 'N/A')
+        self.assertEqual(row['read_bytes'], 8192)
+        self.assertEqual(row['write_chars'], 100)
+        self.assertEqual(row['open_fds'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
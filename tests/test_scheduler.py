@@ -0,0 +1,25 @@
+import unittest
+
+from heimdallr.scheduler import AdaptiveInterval, parse_thresholds
+
+
+class AdaptiveIntervalTest(unittest.TestCase):
+
+    def test_thresholds_with_units(self):
+        self.assertEqual(
+            parse_thresholds('gpu_ram_usage:100MiB gpu_util:10 temp:5%'),
+            {'gpu_ram_usage': (100 * 2 ** 20, False), 'gpu_util': (10.0, False), 'temp': (0.05, True)},
+        )
+        with self.assertRaises(ValueError):
+            parse_thresholds('gpu_util:fast')
+
+    def test_absolute_threshold_on_a_column_with_units(self):
+        adaptive = AdaptiveInterval(1, 8, 'gpu_ram_usage:100MiB')
+        self.assertEqual(adaptive.update([{'gpu_ram_usage': '1000MiB'}]), 1)
+        self.assertEqual(adaptive.update([{'gpu_ram_usage': '1050MiB'}]), 2)
+        self.assertEqual(adaptive.update([{'gpu_ram_usage': '1090MiB'}]), 4)
+        self.assertEqual(adaptive.update([{'gpu_ram_usage': '1101MiB'}]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import io
+import re
+import sys
+import contextlib
+import time
+import unittest
+
+import curio
+
+from heimdallr.streaming import CommandStream
+
+FRAME_START = re.compile(r'^frame ', re.MULTILINE)
+
+
+def _stub(script):
+    """Return the command line of a stub command running the Python `script`."""
+    return [sys.executable, '-u', '-c', 'import sys, time\n' + script]
+
+
+async def _next_frames(cmdline, timeouts):
+    """Start a stream of `cmdline` and return the result of `next_frame` for each of the `timeouts`."""
+    stream = CommandStream(cmdline, FRAME_START, 'stub', frame_timeout=0.05)
+    await stream.start()
+    try:
+        return [await stream.next_frame(timeout=timeout) for timeout in timeouts]
+    finally:
+        await stream.close()
+
+
+class CommandStreamTest(unittest.TestCase):
+
+    def test_frame_arriving_during_the_wait(self):
+        start = time.monotonic()
+        frames = curio.run(_next_frames, _stub("time.sleep(0.3)\nprint('frame 1')\ntime.sleep(10)"), [5, 0.2])
+        self.assertEqual(frames, ['frame 1\n', None])
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_every_tick_gets_a_new_frame(self):
+        script = "for i in range(100):\n    print('frame', i)\n    time.sleep(0.2)"
+        frames = curio.run(_next_frames, _stub(script), [2, 2, 2, 2])
+        self.assertNotIn(None, frames)
+        numbers = [int(frame.split()[1]) for frame in frames]
+        self.assertEqual(numbers, sorted(set(numbers)))
+
+    def test_no_frame(self):
+        frames = curio.run(_next_frames, _stub('time.sleep(10)'), [0.2])
+        self.assertEqual(frames, [None])
+
+    def test_command_that_cannot_be_started(self):
+        async def run():
+            stream = CommandStream(['/nonexistent/command'], FRAME_START, 'stub', restart_delay=0.05)
+            await stream.start()
+            try:
+                frame = await stream.next_frame(timeout=0.3)
+                return frame, stream.restarts, stream._task.terminated
+            finally:
+                await stream.close()
+
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            frame, restarts, terminated = curio.run(run)
+        self.assertIsNone(frame)
+        self.assertGreaterEqual(restarts, 2)
+        self.assertFalse(terminated)
+        self.assertIn('Cannot start the command of stub', stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()